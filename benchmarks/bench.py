@@ -0,0 +1,171 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Las mediciones tienen que ver el trabajo real, no la caché de texto de una corrida anterior
+os.environ.setdefault("CERTIKEEPER_CACHE_TEXTO", "")
+
+RUTA_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+TAMANOS = [10, 100, 1000, 10000, 50000]
+TAMANOS_RAPIDOS = [10, 100, 1000]
+
+def rss_maximo_mb():
+    """Pico de memoria residente de este proceso y sus hijos, en MB."""
+    propio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Linux lo da en KB y macOS en bytes
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return max(propio, hijos) / divisor
+
+def medir_lote(directorio, workers, comprimir):
+    """
+    Procesa un lote ya generado como lo hace el CLI y devuelve las mediciones: ingesta,
+    clasificación, ZIP y Excel, más el detalle por etapa de Rendimiento.
+    """
+    from core.archivos import extraer_pdfs_de_archivo
+    from core.empaquetado import crear_zip_organizado
+    from core.procesamiento import armar_registros, clasificar_fuentes
+    from core.rendimiento import Rendimiento
+    from core.reporte import crear_reporte_excel
+
+    medicion = Rendimiento()
+    rutas = sorted(os.path.join(directorio, nombre) for nombre in os.listdir(directorio))
+    fuentes = []
+    with medicion.etapa("Ingesta"):
+        for ruta in rutas:
+            pdfs, _ = extraer_pdfs_de_archivo(os.path.basename(ruta), ruta)
+            fuentes.extend(pdfs)
+    with medicion.etapa("Clasificación"):
+        paginas_por_fuente, _ = clasificar_fuentes(fuentes, workers, rendimiento=medicion)
+    paginas = [pagina for paginas_fuente in paginas_por_fuente for pagina in paginas_fuente]
+    with medicion.etapa("Registros"):
+        tabla = armar_registros(paginas)
+    with tempfile.TemporaryFile() as destino:
+        with medicion.etapa("ZIP"):
+            crear_zip_organizado(tabla.renombrados, destino, comprimir, medicion)
+    with medicion.etapa("Excel"):
+        crear_reporte_excel(tabla.log, tabla.resumen)
+    medicion.cerrar()
+
+    etapas = {nombre: round(m[1], 4) for nombre, m in medicion.etapas.items()}
+    return {
+        "paginas": len(paginas),
+        "exitosos": tabla.exitosos,
+        "segundos": round(medicion.total, 4),
+        "paginas_s": round(len(paginas) / medicion.total, 1) if medicion.total else 0.0,
+        "rss_mb": round(rss_maximo_mb(), 1),
+        "etapas": {nombre: etapas[nombre] for nombre in ("Ingesta", "Clasificación", "Registros", "ZIP", "Excel")},
+        "detalle": etapas
+    }
+
+def medir_en_subproceso(directorio, workers, comprimir):
+    """Cada tamaño corre en un proceso nuevo para que el pico de memoria sea solo el suyo."""
+    comando = [sys.executable, "-m", "benchmarks.bench", "--medir", directorio, "-w", str(workers)]
+    if comprimir:
+        comando.append("--comprimir")
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    salida = subprocess.run(comando, cwd=raiz, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+def comparar(resultados, baseline, tolerancia):
+    """Devuelve las regresiones: menos páginas/s o más memoria que el baseline, más allá de la tolerancia."""
+    regresiones = []
+    for tamano, actual in resultados.items():
+        anterior = baseline.get("resultados", {}).get(tamano)
+        if anterior is None:
+            continue
+        if actual["paginas_s"] < anterior["paginas_s"] * (1 - tolerancia):
+            regresiones.append(f"{tamano} páginas: {actual['paginas_s']} páginas/s (baseline {anterior['paginas_s']})")
+        if actual["rss_mb"] > anterior["rss_mb"] * (1 + tolerancia):
+            regresiones.append(f"{tamano} páginas: {actual['rss_mb']} MB (baseline {anterior['rss_mb']})")
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark del procesamiento con lotes sintéticos: páginas/s, pico de memoria y tiempo por etapa."
+    )
+    parser.add_argument("--tamanos", type=int, nargs="+", help=f"Páginas por lote (por defecto {TAMANOS})")
+    parser.add_argument("--rapido", action="store_true", help=f"Solo {TAMANOS_RAPIDOS}, para CI")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Procesos en paralelo (1 = secuencial)")
+    parser.add_argument("--comprimir", action="store_true", help="Comprimir las entradas del ZIP")
+    parser.add_argument("--repeticiones", type=int, default=1, help="Se queda con la mejor de N corridas")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--lotes", help="Directorio donde conservar los lotes generados para reutilizarlos entre corridas")
+    parser.add_argument("--baseline", default=RUTA_BASELINE, help="Archivo JSON con los resultados de referencia")
+    parser.add_argument("--guardar", action="store_true", help="Guardar los resultados como nuevo baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Regresión máxima aceptada (0.25 = 25%%)")
+    parser.add_argument("--medir", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.medir:
+        print(json.dumps(medir_lote(args.medir, max(1, args.workers), args.comprimir)))
+        return 0
+
+    from benchmarks.generador import generar_lote
+
+    tamanos = args.tamanos or (TAMANOS_RAPIDOS if args.rapido else TAMANOS)
+    resultados = {}
+    print(f"{'Páginas':>8} {'Páginas/s':>10} {'RSS (MB)':>9}  {'Ingesta':>8} {'Clasif.':>8} {'ZIP':>8} {'Excel':>8}")
+    for tamano in tamanos:
+        if args.lotes:
+            directorio = os.path.join(args.lotes, f"lote_{tamano}_{args.semilla}")
+        else:
+            directorio = tempfile.mkdtemp(prefix="certikeeper_bench_")
+        try:
+            inicio = time.perf_counter()
+            if not (args.lotes and os.path.isdir(directorio) and os.listdir(directorio)):
+                generar_lote(tamano, directorio, args.semilla)
+            generacion = time.perf_counter() - inicio
+            corridas = [medir_en_subproceso(directorio, args.workers, args.comprimir) for _ in range(max(1, args.repeticiones))]
+        finally:
+            if not args.lotes:
+                shutil.rmtree(directorio, ignore_errors=True)
+        mejor = max(corridas, key=lambda r: r["paginas_s"])
+        mejor["rss_mb"] = min(r["rss_mb"] for r in corridas)
+        resultados[str(tamano)] = mejor
+        etapas = mejor["etapas"]
+        print(
+            f"{mejor['paginas']:>8} {mejor['paginas_s']:>10.1f} {mejor['rss_mb']:>9.1f}  "
+            f"{etapas['Ingesta']:>8.3f} {etapas['Clasificación']:>8.3f} {etapas['ZIP']:>8.3f} {etapas['Excel']:>8.3f}"
+            f"   (generación {generacion:.1f} s)"
+        )
+
+    if args.guardar:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "maquina": {
+                    "python": platform.python_version(),
+                    "sistema": platform.platform(),
+                    "cpus": os.cpu_count()
+                },
+                "workers": args.workers,
+                "comprimir": args.comprimir,
+                "resultados": resultados
+            }, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"💾 Baseline guardado en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️ No hay baseline para comparar (usa --guardar)")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("workers") != args.workers or baseline.get("comprimir") != args.comprimir:
+        print("⚠️ El baseline se midió con otros workers o compresión: la comparación es orientativa")
+    regresiones = comparar(resultados, baseline, args.tolerancia)
+    for regresion in regresiones:
+        print(f"❌ Regresión: {regresion}")
+    if not regresiones:
+        print(f"✅ Sin regresiones frente al baseline (tolerancia {args.tolerancia:.0%})")
+    return 1 if regresiones else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import os
+import random
+import zipfile
+from io import BytesIO
+
+import fitz
+
+from core.reglas import base_abrev, claves_ot, claves_sap, cursos_rampa, cursos_validos
+
+# =========================
+# GENERADOR DE CERTIFICADOS SINTÉTICOS
+# =========================
+NOMBRES = ["JUAN", "MARIA", "JOSE", "ANA", "LUIS", "CARMEN", "PEDRO", "LUZ", "ANDRES", "SOFIA", "DIEGO", "PAULA"]
+SEGUNDOS_NOMBRES = ["CARLOS", "FERNANDA", "DAVID", "ISABEL", "MIGUEL", "VICTORIA"]
+APELLIDOS = ["PEREZ", "GOMEZ", "RAMIREZ", "CASTILLO", "TORRES", "ROJAS", "MORENO", "VARGAS", "OSPINA", "QUINTERO"]
+PARTICULAS = ["DE", "DEL", "DE LA", "DE LOS"]
+CIUDADES_DESCONOCIDAS = ["BOGOTA", "MEDELLIN"]
+
+def nombre_aleatorio(rng):
+    """Nombres de 2 a 5 palabras, con segundos nombres y partículas como los reales."""
+    partes = [rng.choice(NOMBRES)]
+    if rng.random() < 0.4:
+        partes.append(rng.choice(SEGUNDOS_NOMBRES))
+    if rng.random() < 0.15:
+        partes.append(rng.choice(PARTICULAS))
+    partes.append(rng.choice(APELLIDOS))
+    if rng.random() < 0.6:
+        partes.append(rng.choice(APELLIDOS))
+    return " ".join(partes)
+
+def escribir_certificado(page, rng):
+    """
+    Dibuja un certificado en la página con una de varias disposiciones del bloque
+    NOMBRE DEL ALUMNO; alrededor del 5% no tiene nombre (para ejercitar los errores).
+    """
+    curso = rng.choice(list(cursos_validos) + cursos_rampa + ["CURSO DE INDUCCIÓN"])
+    ciudad = rng.choice(list(base_abrev) + CIUDADES_DESCONOCIDAS)
+    cargo = rng.choice(claves_ot + claves_sap + ["INSTRUCTOR", ""])
+    nombre = nombre_aleatorio(rng)
+    identificacion = rng.randint(10_000_000, 1_999_999_999)
+
+    page.insert_text((72, 72), "CERTIFICADO DE ASISTENCIA", fontsize=18)
+    page.insert_text((72, 110), f"CURSO: {curso}", fontsize=12)
+    disposicion = rng.random()
+    if disposicion < 0.05:
+        page.insert_text((72, 150), "PARTICIPANTE REGISTRADO", fontsize=12)
+    elif disposicion < 0.35:
+        page.insert_text((72, 150), f"NOMBRE DEL ALUMNO: {nombre}", fontsize=12)
+        page.insert_text((72, 170), f"IDENTIFICACIÓN: {identificacion}", fontsize=12)
+    elif disposicion < 0.6:
+        page.insert_text((72, 150), f"NOMBRE ALUMNO {nombre} IDENTIFICACIÓN {identificacion}", fontsize=10)
+    elif disposicion < 0.8:
+        page.insert_text((72, 150), "Nombre del alumno", fontsize=12)
+        page.insert_text((72, 170), nombre.title(), fontsize=14)
+    else:
+        # Etiqueta y nombre en bloques separados, en columnas
+        page.insert_text((72, 150), "NOMBRE DEL ALUMNO:", fontsize=12)
+        page.insert_text((260, 150), nombre, fontsize=12)
+        page.insert_text((72, 190), f"IDENTIFICACIÓN {identificacion}", fontsize=12)
+    page.insert_text((72, 230), f"BASE {ciudad}", fontsize=12)
+    if cargo:
+        page.insert_text((72, 250), f"CARGO: {cargo}", fontsize=12)
+    page.insert_text((72, 300), f"FECHA: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024", fontsize=10)
+
+def generar_pdf(paginas, rng):
+    doc = fitz.open()
+    for _ in range(paginas):
+        escribir_certificado(doc.new_page(), rng)
+    datos = doc.tobytes(garbage=1, deflate=True)
+    doc.close()
+    return datos
+
+def generar_lote(paginas_totales, directorio, semilla=0, max_paginas_por_pdf=50, anidamiento=2):
+    """
+    Escribe en `directorio` un lote de unos `paginas_totales` certificados repartidos en PDF
+    sueltos, un ZIP y ZIP anidados hasta `anidamiento` niveles. Con la misma semilla el lote
+    es idéntico. Devuelve la lista de rutas generadas.
+    """
+    rng = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    pdfs = []
+    restantes = paginas_totales
+    while restantes > 0:
+        # De vez en cuando una nómina grande, para que se reparta entre procesos
+        tope = 500 if paginas_totales >= 2000 and rng.random() < 0.05 else max_paginas_por_pdf
+        paginas = min(restantes, rng.randint(1, tope))
+        pdfs.append((f"certificados_{len(pdfs):05d}.pdf", generar_pdf(paginas, rng)))
+        restantes -= paginas
+
+    # Un tercio suelto, un tercio en un ZIP y el resto en ZIP anidados
+    tercio = max(1, len(pdfs) // 3)
+    sueltos, en_zip, anidados = pdfs[:tercio], pdfs[tercio:2 * tercio], pdfs[2 * tercio:]
+    rutas = []
+    for nombre, datos in sueltos:
+        ruta = os.path.join(directorio, nombre)
+        with open(ruta, "wb") as f:
+            f.write(datos)
+        rutas.append(ruta)
+    if en_zip:
+        ruta = os.path.join(directorio, "lote.zip")
+        with zipfile.ZipFile(ruta, "w") as zipf:
+            for nombre, datos in en_zip:
+                zipf.writestr(f"carpeta/{nombre}", datos)
+        rutas.append(ruta)
+    if anidados:
+        contenido = None
+        for nivel in range(max(1, anidamiento), 0, -1):
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, "w") as zipf:
+                for nombre, datos in anidados[nivel - 1::max(1, anidamiento)]:
+                    zipf.writestr(nombre, datos)
+                if contenido is not None:
+                    zipf.writestr(f"nivel_{nivel + 1}.zip", contenido)
+            contenido = buffer.getvalue()
+        ruta = os.path.join(directorio, "anidado.zip")
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+        rutas.append(ruta)
+    return rutas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera un lote de certificados sintéticos (PDF y ZIP).")
+    parser.add_argument("paginas", type=int, help="Número aproximado de páginas del lote")
+    parser.add_argument("-o", "--salida", default="lote_sintetico", help="Directorio de salida")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--anidamiento", type=int, default=2, help="Niveles de ZIP anidados")
+    args = parser.parse_args(argv)
+    rutas = generar_lote(args.paginas, args.salida, args.semilla, anidamiento=args.anidamiento)
+    for ruta in rutas:
+        print(ruta)
+
+if __name__ == "__main__":
+    main()
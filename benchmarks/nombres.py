@@ -0,0 +1,195 @@
+import argparse
+import random
+import re
+import sys
+import time
+
+from benchmarks.generador import nombre_aleatorio
+from core.nombres import MotorNombres, cargar_lexico
+
+# =========================
+# IMPLEMENTACIÓN ANTERIOR (REFERENCIA)
+# =========================
+# Copia tal cual de las funciones de core/clasificacion.py antes de MotorNombres: el
+# microbenchmark comprueba que el motor devuelve exactamente lo mismo.
+def referencia_detectar_nombre(texto):
+    patrones = [
+        r"NOMBRE\s+DEL\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})\s+IDENTIFICACIÓN",
+        r"NOMBRE\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})\s+IDENTIFICACIÓN",
+        r"NOMBRE\s+DEL\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})"
+    ]
+    for patron in patrones:
+        coincidencias = re.findall(patron, texto)
+        for match in coincidencias:
+            posible = match.strip()
+            if len(posible.split()) >= 2:
+                return posible
+    return ""
+
+def referencia_primer_nombre_apellido(nombre_completo):
+    """
+    Extrae el primer nombre y primer apellido de un nombre completo.
+    REGLA PRINCIPAL: En nombres de 4 palabras, el apellido SIEMPRE es la 3ra palabra.
+    Para otros casos, detecta partículas y nombres compuestos.
+    """
+    if not nombre_completo: 
+        return None, None
+    
+    # Limpiar el texto
+    limpio = " ".join(nombre_completo.replace("\n", " ").replace("-", " ").split())
+    partes = limpio.split()
+    
+    # Validar que hay al menos 2 palabras
+    if len(partes) < 2: 
+        return None, None
+    
+    # CASO ESPECIAL: Nombres de 4 palabras - apellido SIEMPRE es la 3ra palabra
+    if len(partes) == 4:
+        return partes[0], partes[2]
+    
+    # Partículas que indican que la siguiente palabra es parte del apellido
+    particulas = {"DE", "DEL", "DE LOS", "DE LA", "Y", "LA", "LAS", "LOS", "VAN", "VON", "MC", "MAC"}
+    
+    # Nombres compuestos comunes que NO son apellidos
+    nombres_compuestos = {
+        "MARIA", "JOSE", "JUAN", "LUIS", "CARLOS", "JORGE", "JESUS", 
+        "FRANCISCO", "MIGUEL", "ANGEL", "PEDRO", "DANIEL", "DAVID",
+        "FERNANDO", "PABLO", "RAFAEL", "JAVIER", "ANTONIO", "MANUEL",
+        "RICARDO", "ROBERTO", "SANTIAGO", "ANDRES", "DIEGO", "ALEJANDRO",
+        "ANA", "CARMEN", "ROSA", "LUZ", "SOL", "ALBA", "CLARA", "SOFIA",
+        "ISABEL", "LUCIA", "PAULA", "CLAUDIA", "PATRICIA", "MONICA",
+        "GLORIA", "TERESA", "ADRIANA", "NATALIA", "CRISTINA", "BEATRIZ",
+        "ELIZABETH", "GABRIELA", "MARCELA", "SANDRA", "LAURA", "DIANA",
+        "MARTHA", "PILAR", "ROCIO", "SILVIA", "VICTORIA", "VIVIANA"
+    }
+    
+    # Primer nombre siempre es la primera palabra
+    primer_nombre = partes[0]
+    
+    # Buscar el primer apellido (para nombres de 2, 3, 5+ palabras)
+    primer_apellido = None
+    i = 1
+    
+    while i < len(partes):
+        palabra_actual = partes[i]
+        
+        # Verificar partículas de 2 palabras primero
+        if i < len(partes) - 1:
+            dos_palabras = f"{palabra_actual} {partes[i+1]}"
+            if dos_palabras in particulas:
+                i += 2
+                continue
+        
+        # Verificar partículas de 1 palabra
+        if palabra_actual in particulas:
+            i += 1
+            continue
+        
+        # Verificar si es un nombre compuesto (segundo nombre)
+        if palabra_actual in nombres_compuestos:
+            i += 1
+            continue
+        
+        # Si la palabra tiene menos de 2 caracteres, probablemente sea inicial
+        if len(palabra_actual) < 2:
+            i += 1
+            continue
+        
+        # Si llegamos aquí, es el primer apellido
+        primer_apellido = palabra_actual
+        break
+    
+    # Fallback: si no encontramos apellido, usar la segunda palabra
+    if not primer_apellido and len(partes) >= 2:
+        primer_apellido = partes[1]
+    
+    return primer_nombre, primer_apellido
+
+# =========================
+# MICROBENCHMARK
+# =========================
+def textos_de_prueba(alumnos, cursos_por_alumno, semilla=0):
+    """
+    Texto de página (en mayúsculas) de `alumnos` alumnos con `cursos_por_alumno`
+    certificados cada uno, en las disposiciones del generador de lotes, más casos límite.
+    """
+    rng = random.Random(semilla)
+    nombres = [nombre_aleatorio(rng) for _ in range(alumnos)]
+    nombres += ["ANA", "JUAN CARLOS DE LA ROSA", "MARIA-JOSE PEREZ", "LUIS A GOMEZ", "JOSE DE LOS RIOS VARGAS TORRES"]
+    textos = []
+    for nombre in nombres:
+        for _ in range(cursos_por_alumno):
+            identificacion = rng.randint(10_000_000, 1_999_999_999)
+            relleno = "TEXTO DEL CERTIFICADO " * rng.randint(5, 60)
+            disposicion = rng.choice([
+                f"NOMBRE DEL ALUMNO: {nombre}\nIDENTIFICACIÓN: {identificacion}\n",
+                f"NOMBRE ALUMNO {nombre} IDENTIFICACIÓN {identificacion}\n",
+                f"NOMBRE DEL ALUMNO\n{nombre}\n",
+                f"NOMBRE DEL ALUMNO:\n{nombre}\nIDENTIFICACIÓN {identificacion}\n",
+                "PARTICIPANTE REGISTRADO\n"
+            ])
+            textos.append(f"CERTIFICADO DE ASISTENCIA\n{relleno}\n{disposicion}BASE CALI\nFECHA: 01/02/2024\n")
+    rng.shuffle(textos)
+    return textos
+
+def medir(funcion, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compara MotorNombres con la implementación anterior: mismo resultado y tiempo por página."
+    )
+    parser.add_argument("--alumnos", type=int, default=2000)
+    parser.add_argument("--cursos", type=int, default=5, help="Certificados por alumno")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    textos = textos_de_prueba(args.alumnos, args.cursos, args.semilla)
+
+    def referencia():
+        resultados = []
+        for texto in textos:
+            completo = referencia_detectar_nombre(texto)
+            resultados.append((completo, *referencia_primer_nombre_apellido(completo)))
+        return resultados
+
+    def por_pagina():
+        # Motor nuevo por cada medición, para no arrancar con la memoria de la anterior
+        motor = MotorNombres(cargar_lexico())
+        resultados = []
+        for texto in textos:
+            completo = motor.detectar(texto)
+            resultados.append((completo, *motor.analizar(completo)))
+        return resultados
+
+    def por_lote():
+        return MotorNombres(cargar_lexico()).extraer_lote(textos)
+
+    t_ref, esperado = medir(referencia, args.repeticiones)
+    t_pagina, obtenido_pagina = medir(por_pagina, args.repeticiones)
+    t_lote, obtenido_lote = medir(por_lote, args.repeticiones)
+
+    print(f"{len(textos)} páginas, {args.alumnos} alumnos")
+    print(f"  {'Anterior':<22} {t_ref * 1e6 / len(textos):>8.1f} µs/página")
+    for nombre, tiempo in (("MotorNombres (página)", t_pagina), ("MotorNombres (lote)", t_lote)):
+        print(f"  {nombre:<22} {tiempo * 1e6 / len(textos):>8.1f} µs/página   x{t_ref / tiempo:.1f}")
+    distintos = [
+        (texto, a, b, c) for texto, a, b, c in zip(textos, esperado, obtenido_pagina, obtenido_lote)
+        if not a == b == c
+    ]
+    if distintos:
+        for texto, a, b, c in distintos[:5]:
+            print(f"❌ {a} · {b} · {c}\n{texto}")
+        print(f"❌ {len(distintos)} páginas con resultado distinto")
+        return 1
+    print("✅ Mismo resultado que la implementación anterior en todas las páginas")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
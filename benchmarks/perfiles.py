@@ -0,0 +1,86 @@
+import argparse
+import random
+import sys
+import time
+
+import fitz
+
+from benchmarks.generador import escribir_certificado
+from core.empaquetado import PERFILES_PDF, generar_pdfs_paginas
+
+# =========================
+# BENCHMARK DE PERFILES DE PDF
+# =========================
+def generar_fuente(paginas, semilla=0):
+    """
+    PDF de `paginas` certificados como los reales: cada página lleva incrustada la misma
+    fuente y el mismo logo (JPEG), que el PDF de origen guarda una sola vez.
+    """
+    rng = random.Random(semilla)
+    logo = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 400, 200), 0)
+    logo.set_rect(logo.irect, (225, 232, 245))
+    for x in range(0, 400, 3):
+        for y in range(0, 200, 3):
+            logo.set_pixel(x, y, (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    logo_jpeg = logo.tobytes("jpeg")
+    fuente = fitz.Font("tiro").buffer
+    doc = fitz.open()
+    for _ in range(paginas):
+        page = doc.new_page()
+        page.insert_image(fitz.Rect(340, 20, 540, 120), stream=logo_jpeg)
+        page.insert_font(fontname="F0", fontbuffer=fuente)
+        page.insert_text((72, 700), "Firma del instructor · Certificado expedido por la academia", fontname="F0", fontsize=9)
+        escribir_certificado(page, rng)
+    datos = doc.tobytes(garbage=3, deflate=True)
+    doc.close()
+    return datos
+
+def medir(doc, grupos, perfil, repeticiones):
+    """Mejor tiempo (s) y bytes totales de generar los PDF de todos los grupos de páginas."""
+    mejor, total = float("inf"), 0
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        total = sum(len(pdf) for grupo in grupos for pdf in generar_pdfs_paginas(doc, grupo, perfil))
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Tiempo y tamaño por página de cada perfil de PDF, con y sin compartir recursos por alumno."
+    )
+    parser.add_argument("pdfs", nargs="*", help="PDF propios a medir (por defecto, certificados sintéticos)")
+    parser.add_argument("--paginas", type=int, default=200, help="Páginas del PDF sintético")
+    parser.add_argument("--cursos", type=int, default=3, help="Páginas seguidas de cada alumno")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    if args.pdfs:
+        docs = [fitz.open(ruta) for ruta in args.pdfs]
+    else:
+        docs = [fitz.open(stream=generar_fuente(args.paginas, args.semilla), filetype="pdf")]
+    paginas = sum(len(doc) for doc in docs)
+    cursos = max(1, args.cursos)
+
+    print(f"{paginas} páginas, {cursos} seguidas por alumno")
+    print(f"  {'Perfil':<12} {'Recursos':<11} {'ms/página':>10} {'KB/página':>10}")
+    for perfil in PERFILES_PDF:
+        for compartir in (False, True):
+            tiempo = tamano = 0
+            for doc in docs:
+                indices = list(range(len(doc)))
+                if compartir:
+                    grupos = [indices[i:i + cursos] for i in range(0, len(indices), cursos)]
+                else:
+                    grupos = [[i] for i in indices]
+                segundos, total = medir(doc, grupos, perfil, args.repeticiones)
+                tiempo += segundos
+                tamano += total
+            print(
+                f"  {perfil:<12} {'compartidos' if compartir else 'por página':<11} "
+                f"{tiempo * 1000 / paginas:>10.2f} {tamano / 1024 / paginas:>10.1f}"
+            )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
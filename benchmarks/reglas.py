@@ -0,0 +1,200 @@
+import argparse
+import random
+import sys
+import time
+
+from benchmarks.generador import nombre_aleatorio
+from core.reglas import MotorReglas, base_abrev, claves_ot, claves_sap, cursos_rampa, cursos_validos
+
+# =========================
+# IMPLEMENTACIÓN ANTERIOR (REFERENCIA)
+# =========================
+# Copia de las funciones detectar_* de core/clasificacion.py antes de MotorReglas, con las
+# tablas como parámetro para poder probarlas también con tablas generadas: el
+# microbenchmark comprueba que el motor devuelve exactamente lo mismo.
+def referencia_detectar_curso(texto, cursos):
+    for linea in texto.splitlines():
+        for clave in cursos:
+            if clave in linea:
+                return cursos[clave]
+    return "CURSO"
+
+def referencia_detectar_base(texto, bases):
+    for base in bases:
+        if base in texto:
+            return base
+    return "XXX"
+
+def referencia_detectar_tipo(texto, ot, sap):
+    texto = texto.upper()
+    for palabra in ot:
+        if palabra in texto:
+            return "OT"
+    for palabra in sap:
+        if palabra in texto:
+            return "SAP"
+    return "SAP"
+
+def referencia_curso_rampa(texto, rampa):
+    curso_detectado = None
+    for c in rampa:
+        if c in texto:
+            curso_detectado = c
+            break
+    return curso_detectado
+
+def referencia_clasificar(texto, tablas):
+    """(base, curso_rampa, curso, tipo) como MotorReglas.clasificar, con las funciones anteriores."""
+    bases, cursos, rampa, ot, sap = tablas
+    return (
+        referencia_detectar_base(texto, bases),
+        referencia_curso_rampa(texto, rampa),
+        referencia_detectar_curso(texto, cursos),
+        referencia_detectar_tipo(texto, ot, sap)
+    )
+
+# =========================
+# CORPUS
+# =========================
+TABLAS_REALES = (list(base_abrev), cursos_validos, cursos_rampa, claves_ot, claves_sap)
+# Todos los separadores de línea de str.splitlines(), más espacios
+SEPARADORES = [" ", " ", " ", "\n", "\r\n", "\r", "\x0b", "\x0c", "\x1c", "\x1d", "\x1e", "\x85", " ", " "]
+
+def tablas_aleatorias(rng):
+    """
+    Tablas pequeñas sobre un alfabeto de 3 letras, para forzar lo que con las reales casi
+    no pasa: claves que son prefijo, sufijo o parte de otras y coincidencias solapadas.
+    """
+    def claves(n):
+        return list(dict.fromkeys(
+            "".join(rng.choice("ABC ") for _ in range(rng.randint(1, 5))).strip() or "A"
+            for _ in range(n)
+        ))
+    cursos = {clave: f"C{i}" for i, clave in enumerate(claves(rng.randint(1, 8)))}
+    return (claves(rng.randint(1, 6)), cursos, claves(rng.randint(0, 3)), claves(rng.randint(0, 4)), claves(rng.randint(0, 4)))
+
+def texto_aleatorio(rng, tablas, alfabeto):
+    """Claves enteras, cortadas o pegadas entre sí, letras sueltas y separadores de línea."""
+    bases, cursos, rampa, ot, sap = tablas
+    claves = list(bases) + list(cursos) + list(rampa) + list(ot) + list(sap)
+    partes = []
+    for _ in range(rng.randint(0, 25)):
+        azar = rng.random()
+        if azar < 0.45 and claves:
+            partes.append(rng.choice(claves))
+        elif azar < 0.65 and claves:
+            clave = rng.choice(claves)
+            corte = rng.randint(0, len(clave))
+            partes.append(clave[:corte] if rng.random() < 0.5 else clave[corte:])
+        elif azar < 0.8:
+            partes.append("".join(rng.choice(alfabeto) for _ in range(rng.randint(1, 4))))
+        else:
+            partes.append(rng.choice(SEPARADORES))
+        if rng.random() < 0.5:
+            partes.append(rng.choice(SEPARADORES))
+    return "".join(partes)
+
+def texto_de_certificado(rng):
+    """Página como las que extrae fitz de un certificado real, con las claves de las tablas reales."""
+    curso = rng.choice(list(cursos_validos) + cursos_rampa + ["CURSO DE INDUCCIÓN"])
+    ciudad = rng.choice(list(base_abrev) + ["BOGOTA", "MEDELLIN"])
+    cargo = rng.choice(claves_ot + claves_sap + ["INSTRUCTOR", ""])
+    relleno = "TEXTO DEL CERTIFICADO " * rng.randint(5, 60)
+    return (
+        f"CERTIFICADO DE ASISTENCIA\nCURSO: {curso}\nNOMBRE DEL ALUMNO: {nombre_aleatorio(rng)}\n"
+        f"{relleno}\nBASE {ciudad}\nCARGO: {cargo}\nFECHA: 01/02/2024\n"
+    )
+
+def tablas_ampliadas(extra):
+    """Tablas reales con `extra` cursos y extra/4 bases más, para ver cómo escala cada implementación."""
+    bases, cursos, rampa, ot, sap = TABLAS_REALES
+    cursos = {**cursos, **{f"CURSO AVANZADO {i} DE OPERACION": f"AVANZADO {i}" for i in range(extra)}}
+    return (bases + [f"CIUDAD {i}" for i in range(extra // 4)], cursos, rampa, ot, sap)
+
+def curso_al_final(texto, rng):
+    """El mismo certificado con la línea del curso al final, tras 40 líneas más: el peor caso de detectar_curso."""
+    lineas = texto.split("\n")
+    curso = lineas.pop(1)
+    relleno = [f"LINEA DE RELLENO {rng.randint(0, 999)}" for _ in range(40)]
+    return "\n".join(lineas[:2] + relleno + lineas[2:] + [curso])
+
+# =========================
+# MICROBENCHMARK
+# =========================
+def medir(funcion, repeticiones):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Compara MotorReglas con las funciones detectar_* anteriores: mismo resultado y tiempo por página."
+    )
+    parser.add_argument("--paginas", type=int, default=10000, help="Certificados sintéticos para medir el tiempo")
+    parser.add_argument("--textos", type=int, default=20000, help="Textos aleatorios con las tablas reales")
+    parser.add_argument("--tablas", type=int, default=500, help="Juegos de tablas generadas")
+    parser.add_argument("--por-tabla", type=int, default=100, help="Textos aleatorios por juego de tablas")
+    parser.add_argument("--claves-extra", type=int, default=200, help="Cursos añadidos a las tablas en la segunda medición")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--semilla", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.semilla)
+    alfabeto_real = sorted({c for clave in sum((list(t) for t in TABLAS_REALES), []) for c in clave})
+    casos = [(TABLAS_REALES, texto_de_certificado(rng)) for _ in range(args.paginas)]
+    casos += [(TABLAS_REALES, texto_aleatorio(rng, TABLAS_REALES, alfabeto_real)) for _ in range(args.textos)]
+    for _ in range(args.tablas):
+        tablas = tablas_aleatorias(rng)
+        casos += [(tablas, texto_aleatorio(rng, tablas, "ABC")) for _ in range(args.por_tabla)]
+
+    # Se comprueban los dos caminos del motor: la búsqueda directa (la que usa con tablas
+    # pequeñas) y el trie (forzado con max_claves_directa=0)
+    motores = {}
+    distintos = []
+    for tablas, texto in casos:
+        if id(tablas) not in motores:
+            motores[id(tablas)] = (MotorReglas(*tablas), MotorReglas(*tablas, max_claves_directa=0))
+        esperado = referencia_clasificar(texto, tablas)
+        for motor in motores[id(tablas)]:
+            obtenido = motor.clasificar(texto)
+            if esperado != obtenido:
+                distintos.append((tablas, texto, esperado, obtenido))
+
+    # Tiempo solo sobre los certificados sintéticos, que se parecen a las páginas reales: tal
+    # cual con las tablas reales y, con tablas ampliadas, con el curso al final de la página
+    paginas = [texto for _, texto in casos[:args.paginas]]
+    ampliadas = tablas_ampliadas(args.claves_extra)
+    escenarios = [
+        ("Tablas reales", TABLAS_REALES, paginas),
+        (f"+{args.claves_extra} cursos, curso al final", ampliadas, [curso_al_final(texto, rng) for texto in paginas])
+    ]
+
+    print(f"{len(casos)} textos comparados, {len(paginas)} páginas medidas")
+    for titulo, tablas, textos in escenarios:
+        if not textos:
+            continue
+        t_ref, esperado = medir(lambda: [referencia_clasificar(texto, tablas) for texto in textos], args.repeticiones)
+        motor = MotorReglas(*tablas)
+        print(f"  {titulo} ({len(motor._prefijos)} claves, MotorReglas usa {'búsqueda directa' if motor.directa else 'trie'})")
+        print(f"    {'Anterior':<22} {t_ref * 1e6 / len(textos):>8.1f} µs/página")
+        for nombre, motor in (
+            ("MotorReglas", motor),
+            ("MotorReglas (directa)", MotorReglas(*tablas, max_claves_directa=float("inf"))),
+            ("MotorReglas (trie)", MotorReglas(*tablas, max_claves_directa=0)),
+        ):
+            t_motor, obtenido = medir(lambda: [motor.clasificar(texto) for texto in textos], args.repeticiones)
+            distintos += [(tablas, texto, a, b) for texto, a, b in zip(textos, esperado, obtenido) if a != b]
+            print(f"    {nombre:<22} {t_motor * 1e6 / len(textos):>8.1f} µs/página   x{t_ref / t_motor:.1f}")
+    if distintos:
+        for tablas, texto, esperado, obtenido in distintos[:5]:
+            print(f"❌ {esperado} · {obtenido}\n{tablas}\n{texto!r}")
+        print(f"❌ {len(distintos)} textos con resultado distinto")
+        return 1
+    print("✅ Mismo resultado que la implementación anterior en todos los textos")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
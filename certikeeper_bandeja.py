@@ -0,0 +1,59 @@
+import argparse
+import signal
+import sys
+from functools import partial
+
+from core.bandeja import MAX_ARCHIVOS_POR_LOTE, SEGUNDOS_ESTABLE, BandejaEntrada
+from core.empaquetado import COMPARTIR_RECURSOS, PERFIL_PDF, PERFILES_PDF
+from core.procesamiento import workers_por_defecto
+from db.escritor import EscritorHistorial, historial_habilitado, registrar_en_historial
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Vigila una carpeta de entrada y organiza en disco los certificados PDF/ZIP que van llegando."
+    )
+    parser.add_argument("entrada", help="Carpeta donde se dejan los PDF y ZIP")
+    parser.add_argument("salida", help="Carpeta donde se escriben base/PAX|RAMPA|INSTRUCTORES|OTROS|Repetidos")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=workers_por_defecto(),
+        help="Procesos en paralelo (1 = secuencial; por defecto CERTIKEEPER_WORKERS o los núcleos disponibles)"
+    )
+    parser.add_argument("--intervalo", type=float, default=2.0, help="Segundos entre revisiones de la carpeta")
+    parser.add_argument(
+        "--estable", type=float, default=SEGUNDOS_ESTABLE,
+        help="Segundos sin cambios para considerar que un archivo terminó de copiarse"
+    )
+    parser.add_argument("--lote", type=int, default=MAX_ARCHIVOS_POR_LOTE, help="Máximo de archivos por lote")
+    parser.add_argument(
+        "--perfil-pdf", choices=list(PERFILES_PDF), default=PERFIL_PDF,
+        help="Cómo se guarda el PDF de cada certificado: rapido, equilibrado o minimo (por defecto CERTIKEEPER_PERFIL_PDF)"
+    )
+    parser.add_argument(
+        "--compartir-recursos", action="store_true", default=COMPARTIR_RECURSOS,
+        help="Extraer juntas las páginas seguidas de un mismo PDF y alumno, compartiendo fuentes e imágenes"
+    )
+    parser.add_argument("--una-vez", action="store_true", help="Procesar lo que haya en la carpeta y terminar")
+    args = parser.parse_args(argv)
+
+    escritor, al_clasificar = None, None
+    if historial_habilitado():
+        escritor = EscritorHistorial()
+        al_clasificar = partial(registrar_en_historial, escritor)
+
+    bandeja = BandejaEntrada(
+        args.entrada, args.salida, max(1, args.workers), args.intervalo, al_clasificar,
+        args.estable, args.lote, args.perfil_pdf, args.compartir_recursos
+    )
+    # SIGTERM (p. ej. al detener el servicio) termina igual que Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        bandeja.ejecutar(una_vez=args.una_vez)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if escritor is not None and not escritor.esperar(timeout=30):
+            print(f"⚠️ {escritor.pendientes} registros de historial quedan pendientes para el próximo inicio")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from core.archivos import extraer_pdfs_de_archivo
+from core.empaquetado import COMPARTIR_RECURSOS, PERFIL_PDF, PERFILES_PDF, crear_zip_organizado
+from core.procesamiento import armar_registros, clasificar_fuentes, workers_por_defecto
+from core.rendimiento import Rendimiento, perfil_opcional
+from core.reporte import escribir_reporte_excel
+
+EXTENSIONES = (".pdf", ".zip")
+
+def buscar_entradas(rutas):
+    """Expande los directorios (recursivamente) a sus PDF y ZIP; los archivos se usan tal cual."""
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            for carpeta, _, nombres in sorted(os.walk(ruta)):
+                for nombre in sorted(nombres):
+                    if nombre.lower().endswith(EXTENSIONES):
+                        archivos.append(os.path.join(carpeta, nombre))
+        elif os.path.isfile(ruta) and ruta.lower().endswith(EXTENSIONES):
+            archivos.append(ruta)
+        else:
+            print(f"⚠️ Se ignora: {ruta}", file=sys.stderr)
+    return archivos
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Procesa certificados PDF/ZIP sin la interfaz web y guarda el ZIP organizado y el reporte Excel."
+    )
+    parser.add_argument("entradas", nargs="+", help="Directorios, PDF o ZIP a procesar")
+    parser.add_argument("-o", "--salida", default=".", help="Directorio donde se guardan el ZIP y el Excel")
+    parser.add_argument(
+        "-w", "--workers", type=int, default=workers_por_defecto(),
+        help="Procesos en paralelo (1 = secuencial; por defecto CERTIKEEPER_WORKERS o los núcleos disponibles)"
+    )
+    parser.add_argument("--comprimir", action="store_true", help="Comprimir las entradas del ZIP (deflate)")
+    parser.add_argument(
+        "--perfil-pdf", choices=list(PERFILES_PDF), default=PERFIL_PDF,
+        help="Cómo se guarda el PDF de cada certificado: rapido, equilibrado o minimo (por defecto CERTIKEEPER_PERFIL_PDF)"
+    )
+    parser.add_argument(
+        "--compartir-recursos", action="store_true", default=COMPARTIR_RECURSOS,
+        help="Extraer juntas las páginas seguidas de un mismo PDF y alumno, compartiendo fuentes e imágenes"
+    )
+    parser.add_argument("--rendimiento", action="store_true", help="Mostrar el tiempo de cada etapa al terminar")
+    args = parser.parse_args(argv)
+
+    with perfil_opcional():
+        return procesar(args)
+
+def procesar(args):
+    medicion = Rendimiento()
+    inicio = time.perf_counter()
+    archivos = buscar_entradas(args.entradas)
+
+    fuentes = []
+    bytes_leidos = 0
+    for ruta in archivos:
+        bytes_leidos += os.path.getsize(ruta)
+        # Se pasa la ruta: los ZIP se recorren miembro a miembro sin cargarlos en memoria
+        with medicion.etapa("Lectura de archivos", tamano=os.path.getsize(ruta)):
+            pdfs, error = extraer_pdfs_de_archivo(os.path.basename(ruta), ruta)
+        if error is not None:
+            print(f"⚠️ Error al leer ZIP: {ruta}", file=sys.stderr)
+        fuentes.extend(pdfs)
+
+    if not fuentes:
+        print("❌ No se encontraron PDFs válidos", file=sys.stderr)
+        return 1
+
+    def al_avanzar(fraccion, paginas_hechas, nombre_pagina):
+        if sys.stderr.isatty():
+            print(f"\r{fraccion:6.1%} · {paginas_hechas} páginas", end="", file=sys.stderr, flush=True)
+
+    with medicion.etapa("Clasificación (total)"):
+        paginas_por_fuente, fuentes_con_error = clasificar_fuentes(
+            fuentes, max(1, args.workers), al_avanzar, rendimiento=medicion
+        )
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    for nombre_base in fuentes_con_error:
+        print(f"⚠️ Error al procesar: {nombre_base}", file=sys.stderr)
+    t_clasificacion = time.perf_counter() - inicio
+
+    paginas = [pagina for paginas_fuente in paginas_por_fuente for pagina in paginas_fuente]
+    with medicion.etapa("Registros", paginas=len(paginas)):
+        tabla = armar_registros(paginas)
+
+    os.makedirs(args.salida, exist_ok=True)
+    marca = datetime.now().strftime('%Y%m%d_%H%M%S')
+    ruta_zip = os.path.join(args.salida, f"certificados_{marca}.zip")
+    ruta_excel = os.path.join(args.salida, f"reporte_{marca}.xlsx")
+    with medicion.etapa("ZIP (total)", paginas=tabla.exitosos):
+        crear_zip_organizado(
+            tabla.renombrados, ruta_zip, args.comprimir, medicion, args.perfil_pdf, args.compartir_recursos
+        )
+    with medicion.etapa("Excel", paginas=len(tabla)):
+        escribir_reporte_excel(tabla.log, ruta_excel, tabla.resumen)
+    medicion.cerrar()
+    medicion.registrar(archivos=len(archivos), paginas=len(paginas), bytes=bytes_leidos, workers=max(1, args.workers))
+
+    total = time.perf_counter() - inicio
+    print(f"📦 {ruta_zip}")
+    print(f"📊 {ruta_excel}")
+    print(
+        f"Archivos: {len(archivos)} · PDFs: {len(fuentes)} · Páginas: {len(paginas)} · "
+        f"Exitosos: {tabla.exitosos} · Errores: {tabla.errores}"
+    )
+    print(
+        f"Tiempo: {total:.1f} s (clasificación {t_clasificacion:.1f} s) · "
+        f"{len(paginas) / total if total else 0:.1f} páginas/s · "
+        f"{bytes_leidos / total / 1024 / 1024 if total else 0:.1f} MB/s · workers: {max(1, args.workers)}"
+    )
+    if args.rendimiento:
+        for fila in medicion.filas():
+            print(
+                f"  {fila['Etapa']:<30} {fila['Tiempo (s)']:>8.3f} s  CPU {fila['CPU (s)']:>8.3f} s  "
+                f"{fila['Llamadas']:>6} llamadas  {fila['Páginas']:>6} páginas  {fila['MB']:>8.2f} MB"
+            )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,21 @@
 import streamlit as st
-import fitz
-import re
+import os
 import pandas as pd
-from zipfile import ZipFile
-from io import BytesIO
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
+from functools import partial
+from core.archivos import UMBRAL_DISCO, ArchivoTemporal, volcar_a_disco
+from core.cache import CacheProcesamiento, clave_archivo
+from core.empaquetado import COMPARTIR_RECURSOS, PERFIL_PDF, PERFILES_PDF, escribir_zip_temporal, firma_zip
+from core.miniaturas import VECINOS_MINIATURAS, CacheMiniaturas
+from core.procesamiento import armar_registros, workers_por_defecto
+from core.reglas import base_abrev, cursos_rampa, cursos_validos
+from core.rendimiento import Rendimiento
+from core.reporte import FORMATOS_REPORTE, PARQUET_DISPONIBLE, crear_reporte
+from core.trabajos import FALLIDO, HORAS_CADUCIDAD_TRABAJOS, TERMINADO, GestorTrabajos
+from db.escritor import EscritorHistorial, historial_habilitado, registrar_en_historial
+from db.models import create_tables
+from db.queries import obtener_historial_pagina, registrar_rendimiento
 
 # =========================
 # CONFIGURACIÓN DE PÁGINA
@@ -210,279 +221,297 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # =========================
-# DICCIONARIOS BASE
+# FUNCIONES AUXILIARES DE LA INTERFAZ
 # =========================
-base_abrev = {
-    "SAN ANDRES": "ADZ",
-    "ARMENIA": "AXM",
-    "CALI": "CLO",
-    "BARRANQUILLA": "BAQ",
-    "BUCARAMANGA": "BGA",
-    "SANTA MARTA": "SMR",
-    "CARTAGENA": "CTG",
-    "PEREIRA": "PEI"
-}
+TAMANO_PAGINA_HISTORIAL = 50
+# Con CERTIKEEPER_RENDIMIENTO_HISTORIAL=1 las mediciones de cada lote se guardan junto al historial
+GUARDAR_RENDIMIENTO = os.getenv("CERTIKEEPER_RENDIMIENTO_HISTORIAL") == "1"
 
-cursos_validos = {
-    "SMS ESP": "SMS ESP",
-    "SEGURIDAD EN RAMPA PAX": "SEGURIDAD EN RAMPA",
-    "SEGURIDAD EN RAMPA OT": "SEGURIDAD EN RAMPA",
-    "FACTORES HUMANOS": "FACTORES HUMANOS",
-    "ER 201": "ER 201",
-    "EQUIPAJES": "EQUIPAJES",
-    "DESPACHO CENTRALIZADO": "DESPACHO",
+def obtener_cache_procesamiento():
+    if "cache_procesamiento" not in st.session_state:
+        st.session_state["cache_procesamiento"] = CacheProcesamiento()
+    return st.session_state["cache_procesamiento"]
 
-    # ATENCIÓN A PASAJEROS (todas las variantes posibles)
-    "ATENCIÓN A PASAJEROS": "ATENCIÓN A PASAJEROS",
-    "ATENCION A PASAJEROS": "ATENCIÓN A PASAJEROS",
-    "ATENCIÓN A PASAJERO": "ATENCIÓN A PASAJEROS",
-    "ATENCION A PASAJERO": "ATENCIÓN A PASAJEROS",
-    "ATENCION PASAJEROS": "ATENCIÓN A PASAJEROS",
-    "ATENCIÓN PASAJEROS": "ATENCIÓN A PASAJEROS",
+@st.cache_resource
+def obtener_escritor_historial():
+    """Un único hilo escritor por servidor, compartido por todas las sesiones."""
+    return EscritorHistorial()
 
-    "BRS": "BRS",
-    "MODELO DE EXPERIENCIA": "MODELO DE EXPERIENCIA",
-    "PROCESOS PARA LA ATENCION DE AERONAVE": "PROCESOS PARA LA ATENCION DE AERONAVE"
-}
+@st.cache_resource
+def obtener_gestor_trabajos():
+    """Un único gestor por servidor: todas las sesiones comparten su cola y su pool de procesos."""
+    al_clasificar, al_medir = None, None
+    if historial_habilitado():
+        al_clasificar = partial(registrar_en_historial, obtener_escritor_historial())
+        if GUARDAR_RENDIMIENTO:
+            al_medir = guardar_rendimiento
+    return GestorTrabajos(al_clasificar=al_clasificar, al_medir=al_medir)
 
+def guardar_rendimiento(trabajo):
+    """Guarda en rendimiento_lotes las mediciones de un lote terminado."""
+    create_tables()
+    medicion = trabajo.rendimiento
+    registrar_rendimiento(
+        trabajo.id,
+        datetime.fromtimestamp(trabajo.terminado),
+        len(trabajo.log) if trabajo.log is not None else 0,
+        medicion.etapas.get("Lectura de archivos", [0, 0, 0, 0, 0])[4],
+        medicion.total,
+        medicion.etapas
+    )
 
-# =========================
-# FUNCIONES DE PROCESAMIENTO
-# =========================
-def obtener_texto_con_ocr(pdf_bytes):
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-    texto = "".join([page.get_text() for page in doc])
-    doc.close()
-    return texto.upper()
+def mostrar_rendimiento(rendimiento_interfaz):
+    """Panel con las mediciones del último lote terminado, del último ZIP descargado y de esta recarga."""
+    gestor = obtener_gestor_trabajos()
+    trabajos = [gestor.obtener(i) for i in st.session_state.get("trabajos", [])]
+    terminados = [t for t in trabajos if t is not None and t.estado == TERMINADO]
+    with st.expander("📈 Rendimiento", expanded=False):
+        if terminados:
+            ultimo = terminados[-1]
+            paginas = len(ultimo.log) if ultimo.log is not None else 0
+            st.markdown(
+                f"**Último lote** `{ultimo.id}` · {ultimo.rendimiento.total:.1f} s · "
+                f"{paginas / ultimo.rendimiento.total if ultimo.rendimiento.total else 0:.1f} páginas/s · "
+                f"workers: {ultimo.workers}"
+            )
+            st.caption("Con varios procesos, los tiempos de cada etapa son la suma de todos ellos")
+            st.dataframe(pd.DataFrame(ultimo.rendimiento.filas()), use_container_width=True, hide_index=True)
+        medicion_zip = st.session_state.get("zip_en_disco", {}).get("rendimiento")
+        if medicion_zip is not None:
+            st.markdown(f"**Último ZIP descargado** · {medicion_zip.total:.1f} s")
+            st.dataframe(pd.DataFrame(medicion_zip.filas()), use_container_width=True, hide_index=True)
+        medicion_reporte = st.session_state.get("reportes", {}).get("rendimiento")
+        if medicion_reporte is not None:
+            st.markdown(f"**Último reporte generado** · {medicion_reporte.total:.2f} s")
+            st.dataframe(pd.DataFrame(medicion_reporte.filas()), use_container_width=True, hide_index=True)
+        st.markdown(f"**Esta recarga** · {rendimiento_interfaz.total:.2f} s")
+        st.dataframe(pd.DataFrame(rendimiento_interfaz.filas()), use_container_width=True, hide_index=True)
 
-def detectar_curso(texto):
-    for linea in texto.splitlines():
-        for clave in cursos_validos:
-            if clave in linea:
-                return cursos_validos[clave]
-    return "CURSO"
+def agregar_trabajo_a_sesion(id_trabajo):
+    """Guarda el trabajo en la sesión y en la URL, para poder volver a verlo tras una desconexión."""
+    ids = st.session_state.setdefault("trabajos", [])
+    if id_trabajo not in ids:
+        ids.append(id_trabajo)
+    st.query_params["trabajos"] = ",".join(ids)
 
-def detectar_base(texto):
-    for base in base_abrev:
-        if base in texto:
-            return base
-    return "XXX"
+def mostrar_trabajo(trabajo):
+    st.markdown(f"**{trabajo.estado}** · `{trabajo.id}` · {', '.join(trabajo.nombres)}")
+    if trabajo.activo:
+        st.progress(trabajo.fraccion)
+        if trabajo.paginas_hechas:
+            st.caption(f"**{trabajo.paginas_hechas}** páginas · `{trabajo.pagina_actual}`")
+    elif trabajo.estado == FALLIDO:
+        st.error(f"❌ {trabajo.error}")
+        if st.button("🔁 Reintentar", key=f"reintentar_{trabajo.id}"):
+            # Sin trabajo asociado, los archivos se vuelven a enviar en la próxima ejecución
+            trabajo_por_archivo = st.session_state.get("trabajo_por_archivo", {})
+            for clave in [c for c, t in trabajo_por_archivo.items() if t == trabajo.id]:
+                del trabajo_por_archivo[clave]
+            st.rerun()
+    else:
+        caduca = datetime.fromtimestamp(trabajo.terminado) + timedelta(hours=HORAS_CADUCIDAD_TRABAJOS)
+        st.caption(
+            f"{trabajo.exitosos} exitosos · {trabajo.errores} errores · "
+            f"{trabajo.rendimiento.total:.1f} s · descargable hasta el {caduca.strftime('%d/%m/%Y %H:%M')}"
+        )
+        col_t1, col_t2 = st.columns(2)
+        with col_t1:
+            st.download_button(
+                "📦 ZIP del trabajo",
+                trabajo.leer_zip,
+                file_name=f"certificados_{trabajo.id}.zip",
+                mime="application/zip",
+                key=f"zip_{trabajo.id}",
+                use_container_width=True
+            )
+        with col_t2:
+            st.download_button(
+                "📊 Excel del trabajo",
+                trabajo.leer_excel,
+                file_name=f"reporte_{trabajo.id}.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key=f"excel_{trabajo.id}",
+                use_container_width=True
+            )
+    for aviso in trabajo.avisos:
+        st.warning(aviso)
 
-def detectar_tipo(texto):
-    texto = texto.upper()
-    claves_ot = ["OT", "OPERACIONES TERRESTRES", "AGENTE DE RAMPA", "OPERADOR DE RAMPA", "OPERARIO", "OPERACIÓN TERRESTRE"]
-    claves_sap = ["SAP", "PAX", "PASAJEROS", "SERVICIO AL PASAJERO", "ATENCIÓN A PASAJEROS", "CHECK IN", "PASAJERO"]
-    for palabra in claves_ot:
-        if palabra in texto:
-            return "OT"
-    for palabra in claves_sap:
-        if palabra in texto:
-            return "SAP"
-    return "SAP"
+@st.fragment(run_every=1)
+def seguir_trabajos(trabajos):
+    """Se vuelve a dibujar cada segundo mientras haya trabajos en curso; al terminar recarga la página."""
+    for trabajo in trabajos:
+        mostrar_trabajo(trabajo)
+    if not any(trabajo.activo for trabajo in trabajos):
+        st.rerun()
 
-def detectar_nombre_con_flexibilidad(texto):
-    patrones = [
-        r"NOMBRE\s+DEL\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})\s+IDENTIFICACIÓN",
-        r"NOMBRE\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})\s+IDENTIFICACIÓN",
-        r"NOMBRE\s+DEL\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})"
-    ]
-    for patron in patrones:
-        coincidencias = re.findall(patron, texto)
-        for match in coincidencias:
-            posible = match.strip()
-            if len(posible.split()) >= 2:
-                return posible
-    return ""
+def mostrar_trabajos(gestor, expandido=False):
+    """Trabajos de esta sesión (o de la URL), del más reciente al más antiguo."""
+    if "trabajos" not in st.session_state:
+        st.session_state["trabajos"] = [i for i in st.query_params.get("trabajos", "").split(",") if i]
+    ids = st.session_state["trabajos"]
+    trabajos = [gestor.obtener(i) for i in ids]
+    # Los caducados desaparecen de la sesión y de la URL
+    if None in trabajos:
+        ids[:] = [i for i, trabajo in zip(ids, trabajos) if trabajo is not None]
+        trabajos = [trabajo for trabajo in trabajos if trabajo is not None]
+        st.query_params["trabajos"] = ",".join(ids)
+    if not trabajos:
+        return
+    trabajos.reverse()
+    activos = any(trabajo.activo for trabajo in trabajos)
+    with st.expander(f"⏳ Trabajos ({len(trabajos)})", expanded=expandido or activos):
+        if activos:
+            seguir_trabajos(trabajos)
+        else:
+            for trabajo in trabajos:
+                mostrar_trabajo(trabajo)
 
-def extraer_primer_nombre_apellido(nombre_completo):
+def mostrar_historial():
     """
-    Extrae el primer nombre y primer apellido de un nombre completo.
-    REGLA PRINCIPAL: En nombres de 4 palabras, el apellido SIEMPRE es la 3ra palabra.
-    Para otros casos, detecta partículas y nombres compuestos.
+    Historial de envíos con filtros, cargado por páginas: no consulta la base hasta que se
+    pulsa Buscar, y cada "Cargar más" trae solo la página siguiente usando el cursor.
     """
-    if not nombre_completo: 
-        return None, None
-    
-    # Limpiar el texto
-    limpio = " ".join(nombre_completo.replace("\n", " ").replace("-", " ").split())
-    partes = limpio.split()
-    
-    # Validar que hay al menos 2 palabras
-    if len(partes) < 2: 
-        return None, None
-    
-    # CASO ESPECIAL: Nombres de 4 palabras - apellido SIEMPRE es la 3ra palabra
-    if len(partes) == 4:
-        return partes[0], partes[2]
-    
-    # Partículas que indican que la siguiente palabra es parte del apellido
-    particulas = {"DE", "DEL", "DE LOS", "DE LA", "Y", "LA", "LAS", "LOS", "VAN", "VON", "MC", "MAC"}
-    
-    # Nombres compuestos comunes que NO son apellidos
-    nombres_compuestos = {
-        "MARIA", "JOSE", "JUAN", "LUIS", "CARLOS", "JORGE", "JESUS", 
-        "FRANCISCO", "MIGUEL", "ANGEL", "PEDRO", "DANIEL", "DAVID",
-        "FERNANDO", "PABLO", "RAFAEL", "JAVIER", "ANTONIO", "MANUEL",
-        "RICARDO", "ROBERTO", "SANTIAGO", "ANDRES", "DIEGO", "ALEJANDRO",
-        "ANA", "CARMEN", "ROSA", "LUZ", "SOL", "ALBA", "CLARA", "SOFIA",
-        "ISABEL", "LUCIA", "PAULA", "CLAUDIA", "PATRICIA", "MONICA",
-        "GLORIA", "TERESA", "ADRIANA", "NATALIA", "CRISTINA", "BEATRIZ",
-        "ELIZABETH", "GABRIELA", "MARCELA", "SANDRA", "LAURA", "DIANA",
-        "MARTHA", "PILAR", "ROCIO", "SILVIA", "VICTORIA", "VIVIANA"
-    }
-    
-    # Primer nombre siempre es la primera palabra
-    primer_nombre = partes[0]
-    
-    # Buscar el primer apellido (para nombres de 2, 3, 5+ palabras)
-    primer_apellido = None
-    i = 1
-    
-    while i < len(partes):
-        palabra_actual = partes[i]
-        
-        # Verificar partículas de 2 palabras primero
-        if i < len(partes) - 1:
-            dos_palabras = f"{palabra_actual} {partes[i+1]}"
-            if dos_palabras in particulas:
-                i += 2
-                continue
-        
-        # Verificar partículas de 1 palabra
-        if palabra_actual in particulas:
-            i += 1
-            continue
-        
-        # Verificar si es un nombre compuesto (segundo nombre)
-        if palabra_actual in nombres_compuestos:
-            i += 1
-            continue
-        
-        # Si la palabra tiene menos de 2 caracteres, probablemente sea inicial
-        if len(palabra_actual) < 2:
-            i += 1
-            continue
-        
-        # Si llegamos aquí, es el primer apellido
-        primer_apellido = palabra_actual
-        break
-    
-    # Fallback: si no encontramos apellido, usar la segunda palabra
-    if not primer_apellido and len(partes) >= 2:
-        primer_apellido = partes[1]
-    
-    return primer_nombre, primer_apellido
-
-def extraer_info(pdf_bytes):
-    texto = obtener_texto_con_ocr(pdf_bytes)
-    base = detectar_base(texto)
+    st.markdown("### Historial de envíos")
+    estado = st.session_state.setdefault("historial", {"filtros": None, "filas": [], "cursor": None, "fin": True})
+    
+    col_h1, col_h2, col_h3 = st.columns(3)
+    with col_h1:
+        bases_hist = st.multiselect("Base", sorted(set(base_abrev.values()) | {"XXX"}), key="hist_base")
+    with col_h2:
+        cursos_hist = st.multiselect("Curso", sorted(set(cursos_validos.values()) | set(cursos_rampa) | {"CURSO"}), key="hist_curso")
+    with col_h3:
+        rango = st.date_input("Fechas", value=(), key="hist_fechas")
+    
+    desde = datetime.combine(rango[0], datetime.min.time()) if len(rango) >= 1 else None
+    hasta = datetime.combine(rango[-1], datetime.min.time()) + timedelta(days=1) if len(rango) >= 1 else None
+    filtros = dict(base=bases_hist, curso=cursos_hist, desde=desde, hasta=hasta)
+    
+    def cargar_pagina():
+        try:
+            filas, cursor = obtener_historial_pagina(
+                TAMANO_PAGINA_HISTORIAL, estado["cursor"], **estado["filtros"]
+            )
+        except Exception:
+            st.error("No se pudo consultar el historial")
+            return
+        estado["filas"].extend(filas)
+        estado["cursor"] = cursor
+        estado["fin"] = cursor is None
+    
+    if st.button("🔎 Buscar", key="hist_buscar"):
+        estado.update(filtros=filtros, filas=[], cursor=None, fin=False)
+        cargar_pagina()
+    
+    if estado["filtros"] is None:
+        st.info("💡 Elige los filtros y pulsa Buscar")
+        return
+    if estado["filtros"] != filtros:
+        st.caption("Los filtros cambiaron: pulsa Buscar para actualizar")
+    
+    st.dataframe(pd.DataFrame(estado["filas"]), use_container_width=True, height=400, hide_index=True)
+    st.caption(f"{len(estado['filas'])} registros cargados")
+    if not estado["fin"] and st.button("⬇️ Cargar más", key="hist_mas"):
+        cargar_pagina()
+        st.rerun()
 
-    curso_detectado = None
-    for c in ["SEGURIDAD EN RAMPA PAX", "SEGURIDAD EN RAMPA OT"]:
-        if c in texto:
-            curso_detectado = c
-            break
+def zip_en_disco(renombrados_info, firma, comprimir, perfil, compartir_recursos):
+    """
+    Devuelve la función que usa el botón de descarga: escribe el ZIP en un archivo temporal
+    solo cuando se pide y lo reutiliza mientras la firma (nombres y contenidos) no cambie.
+    El archivo es un ArchivoTemporal guardado en la sesión, así que se borra al reemplazarlo
+    o cuando la sesión termina. Las descargas corren en otro hilo: el lock evita que dos
+    clics seguidos borren el ZIP que el otro está leyendo.
 
-    nombre_completo = detectar_nombre_con_flexibilidad(texto)
-    if not nombre_completo:
-        return None, None, None, None, None, "ERROR: Sin nombre"
-    
-    primer_nombre, primer_apellido = extraer_primer_nombre_apellido(nombre_completo)
-    if not primer_nombre or not primer_apellido:
-        return None, None, None, None, None, "ERROR: Nombre inválido"
-    
-    base_ab = base_abrev.get(base, "XXX")
+    download_button solo acepta bytes (no hay una respuesta que lea del archivo), así que
+    cada descarga lee el ZIP entero: el disco evita retenerlo en la sesión entre clics, no
+    tenerlo en memoria mientras se envía.
+    """
+    estado = st.session_state.setdefault(
+        "zip_en_disco", {"firma": None, "archivo": None, "lock": threading.Lock()}
+    )
+    
+    def leer_zip():
+        with estado["lock"]:
+            if estado["firma"] != firma or estado["archivo"] is None or not os.path.exists(estado["archivo"]):
+                estado["archivo"] = None
+                estado["rendimiento"] = Rendimiento()
+                estado["archivo"] = ArchivoTemporal(escribir_zip_temporal(
+                    renombrados_info, comprimir, rendimiento=estado["rendimiento"],
+                    perfil=perfil, compartir_recursos=compartir_recursos
+                ))
+                estado["rendimiento"].cerrar()
+                estado["firma"] = firma
+            with open(estado["archivo"], "rb") as archivo:
+                return archivo.read()
+    
+    return leer_zip
 
-    if curso_detectado:
-        nuevo_nombre = f"{base_ab} {curso_detectado} {primer_nombre} {primer_apellido}".upper() + ".pdf"
-        tipo = ""
-        return base_ab, curso_detectado, tipo, f"{primer_nombre} {primer_apellido}", nuevo_nombre, "✅"
-    
-    curso = detectar_curso(texto)
-    tipo = detectar_tipo(texto)
-    nuevo_nombre = f"{base_ab} {curso} {tipo} {primer_nombre} {primer_apellido}".upper() + ".pdf"
-    return base_ab, curso, tipo, f"{primer_nombre} {primer_apellido}", nuevo_nombre, "✅"
+@st.cache_resource
+def obtener_cache_miniaturas():
+    """Una caché de miniaturas por servidor: la clave es el hash de la página."""
+    return CacheMiniaturas()
 
-def separar_paginas_pdf(pdf_bytes, nombre_origen):
-    paginas = []
+def mostrar_vista_previa(tabla, df_edit):
+    """
+    Miniatura de la página elegida entre las filas visibles del editor. Se renderiza al
+    pedirla (por defecto, la primera fila con error) y deja listas en segundo plano las
+    filas vecinas, para que pasar a la anterior o a la siguiente sea inmediato.
+    """
+    ids = df_edit["ID"].tolist()
+    if not ids:
+        st.caption("No hay filas para mostrar")
+        return
+    originales = dict(zip(ids, df_edit["Página original"]))
+    estados = dict(zip(ids, df_edit["Estado"]))
+    if st.session_state.get("vista_previa_id") not in originales:
+        st.session_state["vista_previa_id"] = next((i for i in ids if estados[i] != "✅"), ids[0])
+    
+    def mover(paso):
+        posicion = ids.index(st.session_state["vista_previa_id"]) + paso
+        st.session_state["vista_previa_id"] = ids[min(max(posicion, 0), len(ids) - 1)]
+    
+    id_elegido = st.selectbox(
+        "Página", ids, key="vista_previa_id",
+        format_func=lambda i: f"{originales[i]} · {estados[i]}"
+    )
+    col_ant, col_sig = st.columns(2)
+    with col_ant:
+        st.button("⬅️ Anterior", on_click=mover, args=(-1,), use_container_width=True)
+    with col_sig:
+        st.button("Siguiente ➡️", on_click=mover, args=(1,), use_container_width=True)
+    
+    cache = obtener_cache_miniaturas()
+    hash_pag, fuente, indice = tabla.pagina(id_elegido)
     try:
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-        for i in range(len(doc)):
-            nuevo_doc = fitz.open()
-            nuevo_doc.insert_pdf(doc, from_page=i, to_page=i)
-            buffer = BytesIO()
-            nuevo_doc.save(buffer, garbage=4, deflate=True, clean=True, incremental=False)
-            buffer.seek(0)
-            paginas.append((f"{nombre_origen}_pag_{i+1}", buffer.read()))
-            nuevo_doc.close()
-        doc.close()
-    except Exception as e:
-        st.warning(f"Error al procesar: {nombre_origen}")
-    return paginas
-
-def extraer_pdfs_de_archivos(uploaded_files):
-    pdfs = []
-    for uploaded in uploaded_files:
-        contenido = uploaded.read()
-        if uploaded.name.lower().endswith(".pdf"):
-            nombre_base = uploaded.name.replace(".pdf", "")
-            pdfs.extend(separar_paginas_pdf(contenido, nombre_base))
-        elif uploaded.name.lower().endswith(".zip"):
-            try:
-                with ZipFile(BytesIO(contenido)) as zipf:
-                    for nombre_archivo in zipf.namelist():
-                        if nombre_archivo.lower().endswith(".pdf"):
-                            pdf_bytes = zipf.read(nombre_archivo)
-                            nombre_base = nombre_archivo.replace(".pdf", "")
-                            pdfs.extend(separar_paginas_pdf(pdf_bytes, nombre_base))
-            except Exception as e:
-                st.warning(f"Error al leer ZIP: {uploaded.name}")
-    return pdfs
-
-def crear_zip_organizado(renombrados_info):
-    zip_buffer = BytesIO()
-    certificados_vistos = {}  # Dict para rastrear certificados únicos por clave
-    
-    with ZipFile(zip_buffer, "w") as zipf:
-        for info in renombrados_info:
-            nuevo_nombre = info["Nombre final"]
-            pdf_bytes = info["Contenido"]
-            tipo = info["Cargo"].upper() if info["Cargo"] else ""
-            base = info["Base"]
-            alumno = info.get("Alumno", "").strip().upper()
-            curso = info.get("Curso", "").strip().upper()
-            
-            # Crear clave única combinando: alumno + base + curso
-            # Esto detecta duplicados de la misma persona, ciudad y curso
-            clave_unica = f"{alumno}_{base}_{curso}"
-            
-            # Determinar carpeta base según tipo/curso
-            if "INSTRUCTOR" in tipo:
-                carpeta_base = "INSTRUCTORES"
-            elif "SEGURIDAD EN RAMPA PAX" in nuevo_nombre:
-                carpeta_base = "PAX"
-            elif "SEGURIDAD EN RAMPA OT" in nuevo_nombre:
-                carpeta_base = "RAMPA"
-            elif tipo == "OT":
-                carpeta_base = "RAMPA"
-            elif tipo == "SAP":
-                carpeta_base = "PAX"
-            else:
-                carpeta_base = "OTROS"
-            
-            # Primera aparición: guardar en carpeta normal
-            if clave_unica not in certificados_vistos:
-                certificados_vistos[clave_unica] = True
-                ruta_zip = f"{base}/{carpeta_base}/{nuevo_nombre}"
-                zipf.writestr(ruta_zip, pdf_bytes)
-            
-            # Segunda aparición en adelante: guardar en carpeta Repetidos
-            else:
-                ruta_zip = f"{base}/Repetidos/{nuevo_nombre}"
-                zipf.writestr(ruta_zip, pdf_bytes)
+        png = cache.obtener(hash_pag, fuente, indice)
+    except Exception:
+        st.warning("No se pudo generar la vista previa de esta página")
+        return
+    st.image(png, caption=f"{fuente.nombre} · página {indice + 1}", use_container_width=True)
+    
+    posicion = ids.index(id_elegido)
+    vecinos = ids[max(0, posicion - VECINOS_MINIATURAS):posicion + VECINOS_MINIATURAS + 1]
+    cache.prerenderizar(tabla.pagina(i) for i in vecinos if i != id_elegido)
 
-    zip_buffer.seek(0)
-    return zip_buffer
+def reporte_en_sesion(tabla, firma, formato):
+    """
+    Devuelve la función que usa el botón de descarga del reporte: lo genera solo cuando se
+    pide y guarda los bytes de cada formato mientras la firma (archivos, ediciones y
+    marcas de historial) no cambie.
+    """
+    estado = st.session_state.setdefault("reportes", {"firma": None, "datos": {}})
+    
+    def leer_reporte():
+        if estado["firma"] != firma:
+            estado.update(firma=firma, datos={})
+        if formato not in estado["datos"]:
+            estado["rendimiento"] = Rendimiento()
+            with estado["rendimiento"].etapa(f"Reporte {FORMATOS_REPORTE[formato][0]}", paginas=len(tabla)):
+                estado["datos"][formato] = crear_reporte(formato, tabla.log, tabla.resumen)
+            estado["rendimiento"].cerrar()
+        return estado["datos"][formato]
+    
+    return leer_reporte
 
 # =========================
 # STREAMLIT UI
@@ -501,201 +530,325 @@ with st.sidebar:
     with st.expander("👥 Cargos", expanded=False):
         st.markdown("• **OT** - Operaciones\n• **SAP** - Pasajeros\n• **INSTRUCTOR** - Docente")
     
+    with st.expander("⚡ Procesamiento", expanded=False):
+        workers = st.number_input(
+            "Procesos en paralelo",
+            min_value=1,
+            max_value=max(os.cpu_count() or 1, workers_por_defecto()),
+            value=workers_por_defecto(),
+            help="1 = secuencial"
+        )
+        comprimir_zip = st.checkbox("Comprimir ZIP", value=False, help="Más lento, descarga más pequeña")
+        perfil_pdf = st.selectbox(
+            "PDF de cada certificado",
+            list(PERFILES_PDF),
+            index=list(PERFILES_PDF).index(PERFIL_PDF),
+            format_func={"rapido": "Rápido", "equilibrado": "Equilibrado", "minimo": "Más pequeño"}.get,
+            help="Rápido: copia la página tal cual. Equilibrado: comprime lo que venga sin comprimir. "
+                 "Más pequeño: además recorta las fuentes incrustadas; es el más lento"
+        )
+        compartir_recursos = st.checkbox(
+            "Compartir recursos por alumno", value=COMPARTIR_RECURSOS,
+            help="Las páginas seguidas de un mismo PDF y alumno se extraen juntas, copiando fuentes e imágenes una vez"
+        )
+    
+    if historial_habilitado():
+        escritor = obtener_escritor_historial()
+        if escritor.pendientes:
+            st.caption(f"🗄️ Historial: {escritor.pendientes} registros pendientes de guardar")
+        if escritor.ultimo_error:
+            st.caption("⚠️ Base de datos no disponible, se reintentará")
+    
     st.markdown("---")
     st.markdown(f"**{datetime.now().strftime('%d/%m/%Y')}** · {datetime.now().strftime('%H:%M')}")
 
-# Zona de carga
-st.markdown("<div style='background: #1a1a1a; padding: 2rem; border-radius: 12px; border: 2px solid #2a2a2a;'>", unsafe_allow_html=True)
-uploaded_files = st.file_uploader(
-    "Cargar archivos",
-    accept_multiple_files=True,
-    type=["pdf", "zip"],
-    help="PDF o ZIP"
-)
-st.markdown("</div>", unsafe_allow_html=True)
+# Pestañas principales: el historial solo aparece si hay base de datos configurada
+if historial_habilitado():
+    tab_procesar, tab_historial = st.tabs(["📤 Procesar", "🗄️ Historial"])
+else:
+    tab_procesar, tab_historial = st.container(), None
 
-if uploaded_files:
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    with st.spinner("Procesando..."):
-        all_pdfs = extraer_pdfs_de_archivos(uploaded_files)
+# El historial se dibuja antes: la pestaña de procesar puede cortar el script con st.stop()
+if tab_historial is not None:
+    with tab_historial:
+        mostrar_historial()
+
+with tab_procesar:
+    # Zona de carga
+    st.markdown("<div style='background: #1a1a1a; padding: 2rem; border-radius: 12px; border: 2px solid #2a2a2a;'>", unsafe_allow_html=True)
+    uploaded_files = st.file_uploader(
+        "Cargar archivos",
+        accept_multiple_files=True,
+        type=["pdf", "zip"],
+        help="PDF o ZIP"
+    )
+    st.markdown("</div>", unsafe_allow_html=True)
+
+    gestor = obtener_gestor_trabajos()
+    mostrar_trabajos(gestor, expandido=not uploaded_files)
+
+    if uploaded_files:
+        st.markdown("<br>", unsafe_allow_html=True)
     
-    if not all_pdfs:
-        st.error("No se encontraron PDFs válidos")
-    else:
-        log, renombrados_info, errores = [], [], 0
-        
-        progress_container = st.container()
-        with progress_container:
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-        
-        for i, (nombre_original, pdf_bytes) in enumerate(all_pdfs):
-            progress_bar.progress((i+1)/len(all_pdfs))
-            status_text.markdown(f"**{i+1}/{len(all_pdfs)}** `{nombre_original}`")
-            
-            base, curso, tipo, alumno, nuevo_nombre, estado = extraer_info(pdf_bytes)
-            
-            if estado.startswith("ERROR"):
-                errores += 1
-                log.append({
-                    "ID": len(log)+1, 
-                    "Página original": nombre_original,
-                    "Estado": estado, 
-                    "Nombre final": "", 
-                    "Base": "", 
-                    "Curso": "", 
-                    "Tipo": "", 
-                    "Alumno": ""
-                })
+        cache = obtener_cache_procesamiento()
+        trabajo_por_archivo = st.session_state.setdefault("trabajo_por_archivo", {})
+        enviados_previos = st.session_state.setdefault("enviados_previos", (set(), set()))
+    
+        # Cada archivo se identifica por nombre y contenido (el nombre está en sus páginas y en
+        # sus IDs); la clave se calcula una vez por subida, no en cada recarga
+        claves_por_subida = st.session_state.setdefault("claves_por_subida", {})
+        ids_subidas = {uploaded.file_id for uploaded in uploaded_files}
+        for file_id in [f for f in claves_por_subida if f not in ids_subidas]:
+            del claves_por_subida[file_id]
+    
+        # Se calculan antes de recibir los lotes terminados para fijarlas en la caché: un archivo
+        # que sigue en el cargador no se expulsa (si no, cada recarga lo volvería a enviar)
+        with st.spinner("Preparando archivos..."):
+            claves_subidas = []
+            for uploaded in uploaded_files:
+                clave = claves_por_subida.get(uploaded.file_id)
+                if clave is None:
+                    clave = claves_por_subida[uploaded.file_id] = clave_archivo(uploaded.name, uploaded.getbuffer())
+                claves_subidas.append(clave)
+        cache.fijar(claves_subidas)
+    
+        # Un archivo que ya está en un trabajo del servidor (de esta sesión antes de recargar la
+        # página, o de otra) se toma de ese trabajo: procesarlo de nuevo lo compararía con el
+        # historial que ese mismo trabajo ya escribió y saldría entero como "Ya enviado"
+        for clave in claves_subidas:
+            if clave in trabajo_por_archivo or cache.obtener(clave) is not None:
                 continue
-            
-            renombrados_info.append({
-                "Nombre final": nuevo_nombre,
-                "Contenido": pdf_bytes,
-                "Cargo": tipo,
-                "Base": base,
-                "Alumno": alumno,
-                "Curso": curso
-            })
-            log.append({
-                "ID": len(log)+1, 
-                "Página original": nombre_original,
-                "Estado": estado,
-                "Nombre final": nuevo_nombre,
-                "Base": base,
-                "Curso": curso,
-                "Tipo": tipo,
-                "Alumno": alumno
-            })
+            existente = gestor.buscar(clave)
+            if existente is not None:
+                trabajo_por_archivo[clave] = existente.id
+                agregar_trabajo_a_sesion(existente.id)
+                # Si sigue en curso, se recarga para que el panel de trabajos lo siga
+                if existente.activo:
+                    st.rerun()
+    
+        # Lotes terminados: sus páginas pasan a la caché de la sesión y sus certificados ya
+        # enviados en lotes anteriores (buscados en historial por el trabajo) se marcan
+        recibidas = {}
+        for id_trabajo in set(trabajo_por_archivo.values()):
+            trabajo = gestor.obtener(id_trabajo)
+            if trabajo is not None and trabajo.estado != TERMINADO:
+                continue
+            if trabajo is not None:
+                # Un trabajo tomado de otra sesión puede traer más archivos: solo los de esta
+                claves_trabajo = {c for c, t in trabajo_por_archivo.items() if t == id_trabajo}
+                recibidas.update((c, p) for c, p in trabajo.entregar().items() if c in claves_trabajo)
+                enviados_previos[0].update(trabajo.enviados[0])
+                enviados_previos[1].update(trabajo.enviados[1])
+            # Si el trabajo caducó o el servidor se reinició, sus archivos se vuelven a procesar
+            for clave in [c for c, t in trabajo_por_archivo.items() if t == id_trabajo]:
+                del trabajo_por_archivo[clave]
+        for clave, paginas in recibidas.items():
+            cache.guardar(clave, paginas)
+    
+        # Archivos sin resultado ni trabajo en curso: van juntos en un lote nuevo en segundo
+        # plano; los que ya se procesaron en la sesión conservan sus páginas
+        nuevos = []
+        with st.spinner("Preparando archivos..."):
+            for uploaded, clave in zip(uploaded_files, claves_subidas):
+                if clave in recibidas or clave in trabajo_por_archivo or any(c == clave for c, _, _ in nuevos):
+                    continue
+                if cache.obtener(clave) is None:
+                    # Las subidas grandes se leen desde disco, miembro a miembro
+                    if uploaded.size > UMBRAL_DISCO:
+                        contenido = volcar_a_disco(uploaded, os.path.splitext(uploaded.name)[1])
+                    else:
+                        contenido = uploaded.getvalue()
+                    nuevos.append((clave, uploaded.name, contenido))
+        if nuevos:
+            trabajo = gestor.enviar(nuevos, int(workers), comprimir_zip, perfil_pdf, compartir_recursos)
+            for clave, _, _ in nuevos:
+                trabajo_por_archivo[clave] = trabajo.id
+            agregar_trabajo_a_sesion(trabajo.id)
+            st.rerun()
+    
+        # Mientras se procesan los archivos agregados, se muestran los resultados de los demás
+        en_proceso = {
+            c for c in claves_subidas
+            if c in trabajo_por_archivo and getattr(gestor.obtener(trabajo_por_archivo[c]), "activo", False)
+        }
+        claves_listas = [c for c in claves_subidas if c not in en_proceso]
+        if en_proceso and not claves_listas:
+            st.info("⏳ Procesando en segundo plano: puedes seguir usando la página, los resultados aparecen al terminar")
+            st.stop()
+        if en_proceso:
+            st.info(f"⏳ {len(en_proceso)} archivos en proceso: sus páginas se agregarán a los resultados al terminar")
+    
+        all_pdfs = []
+        for clave in claves_listas:
+            paginas = recibidas.get(clave)
+            if paginas is None:
+                paginas = cache.obtener(clave) or []
+            all_pdfs.extend(paginas)
+    
+        if not all_pdfs:
+            st.error("No se encontraron PDFs válidos")
+        else:
+            # Los nombres editados a mano se guardan por ID y sobreviven a las recargas
+            ediciones = st.session_state.setdefault("ediciones", {})
+            rendimiento_interfaz = Rendimiento()
+            with rendimiento_interfaz.etapa("Registros", paginas=len(all_pdfs)):
+                tabla = armar_registros(all_pdfs, enviados_previos, ediciones)
+            with rendimiento_interfaz.etapa("Tabla (DataFrame)", paginas=len(all_pdfs)):
+                tabla.log
+            renombrados_info = tabla.renombrados
         
-        progress_bar.empty()
-        status_text.empty()
+            # Métricas
+            st.markdown("<br>", unsafe_allow_html=True)
+            col1, col2, col3, col4 = st.columns(4)
         
-        # Métricas
-        st.markdown("<br>", unsafe_allow_html=True)
-        col1, col2, col3, col4 = st.columns(4)
+            with col1:
+                st.metric("TOTAL", len(tabla))
+            with col2:
+                st.metric("EXITOSOS", tabla.exitosos)
+            with col3:
+                st.metric("ERRORES", tabla.errores)
+            with col4:
+                tasa_exito = (tabla.exitosos/len(tabla)*100) if len(tabla) > 0 else 0
+                st.metric("TASA ÉXITO", f"{tasa_exito:.1f}%")
         
-        with col1:
-            st.metric("TOTAL", len(all_pdfs))
-        with col2:
-            st.metric("EXITOSOS", len(renombrados_info))
-        with col3:
-            st.metric("ERRORES", errores)
-        with col4:
-            tasa_exito = (len(renombrados_info)/len(all_pdfs)*100) if len(all_pdfs) > 0 else 0
-            st.metric("TASA ÉXITO", f"{tasa_exito:.1f}%")
+            st.markdown("<br>", unsafe_allow_html=True)
         
-        st.markdown("<br>", unsafe_allow_html=True)
+            # Tabs
+            tab1, tab2, tab3 = st.tabs(["📋 Registros", "📊 Estadísticas", "✏️ Editor"])
         
-        # Tabs
-        tab1, tab2, tab3 = st.tabs(["📋 Registros", "📊 Estadísticas", "✏️ Editor"])
+            with tab1:
+                st.dataframe(tabla.log, use_container_width=True, height=400, hide_index=True)
         
-        with tab1:
-            df_log = pd.DataFrame(log)
-            st.dataframe(df_log, use_container_width=True, height=400, hide_index=True)
+            with tab2:
+                if renombrados_info:
+                    resumen = tabla.resumen
+                    col_a, col_b = st.columns([2, 1])
+                    with col_a:
+                        st.bar_chart(resumen.set_index("Base")["Certificados"])
+                    with col_b:
+                        for base, count in zip(resumen["Base"], resumen["Certificados"]):
+                            st.metric(f"{base}", count)
         
-        with tab2:
-            if renombrados_info:
-                df_stats = pd.DataFrame(renombrados_info)
-                base_counts = df_stats['Base'].value_counts()
-                col_a, col_b = st.columns([2, 1])
-                with col_a:
-                    st.bar_chart(base_counts)
-                with col_b:
-                    for base, count in base_counts.items():
-                        st.metric(f"{base}", count)
-        
-        with tab3:
-            st.markdown("### Filtrar y Editar")
-            df_edit = pd.DataFrame(log)
+            with tab3:
+                st.markdown("### Filtrar y Editar")
+                df_edit = tabla.log
             
-            col_f1, col_f2 = st.columns(2)
-            with col_f1:
-                if 'Base' in df_edit.columns:
-                    bases_filter = st.multiselect("Base", df_edit['Base'].unique())
-                    if bases_filter:
-                        df_edit = df_edit[df_edit['Base'].isin(bases_filter)]
+                col_f1, col_f2 = st.columns(2)
+                with col_f1:
+                    if 'Base' in df_edit.columns:
+                        bases_filter = st.multiselect("Base", df_edit['Base'].unique())
+                        if bases_filter:
+                            df_edit = df_edit[df_edit['Base'].isin(bases_filter)]
             
-            with col_f2:
-                if 'Curso' in df_edit.columns:
-                    cursos_filter = st.multiselect("Curso", df_edit['Curso'].unique())
-                    if cursos_filter:
-                        df_edit = df_edit[df_edit['Curso'].isin(cursos_filter)]
+                with col_f2:
+                    if 'Curso' in df_edit.columns:
+                        cursos_filter = st.multiselect("Curso", df_edit['Curso'].unique())
+                        if cursos_filter:
+                            df_edit = df_edit[df_edit['Curso'].isin(cursos_filter)]
             
-            st.markdown("#### Editar Nombres")
-            st.info("💡 Haz clic en una celda de 'Nombre final' para editarla")
+                st.markdown("#### Editar Nombres")
+                st.info("💡 Haz clic en una celda de 'Nombre final' para editarla")
+                # Las ediciones de archivos quitados se conservan por si se vuelven a subir
+                editados = sum(1 for id_pagina in ediciones if tabla.pagina(id_pagina) is not None)
+                if editados:
+                    st.caption(f"✅ {editados} nombres editados")
             
-            # Editor de datos
-            edited_df = st.data_editor(
-                df_edit,
-                use_container_width=True,
-                height=350,
-                hide_index=True,
-                column_config={
-                    "ID": st.column_config.NumberColumn("ID", disabled=True, width="small"),
-                    "Página original": st.column_config.TextColumn("Original", disabled=True),
-                    "Estado": st.column_config.TextColumn("Estado", disabled=True, width="small"),
-                    "Nombre final": st.column_config.TextColumn("Nombre Final", width="large"),
-                    "Base": st.column_config.TextColumn("Base", disabled=True, width="small"),
-                    "Curso": st.column_config.TextColumn("Curso", disabled=True),
-                    "Tipo": st.column_config.TextColumn("Tipo", disabled=True, width="small"),
-                    "Alumno": st.column_config.TextColumn("Alumno", disabled=True)
-                },
-                disabled=["ID", "Página original", "Estado", "Base", "Curso", "Tipo", "Alumno"]
-            )
+                # La vista previa es opcional: sin ella no se rasteriza ninguna página
+                if st.toggle("👁 Vista previa de la página", key="mostrar_vista_previa"):
+                    col_editor, col_vista = st.columns([3, 2])
+                    with col_vista:
+                        mostrar_vista_previa(tabla, df_edit)
+                else:
+                    col_editor = st.container()
             
-            # Actualizar renombrados_info con los cambios
-            if not edited_df.equals(df_edit):
-                st.success("✅ Cambios detectados")
-                
-                # Actualizar los nombres en renombrados_info
-                for idx, row in edited_df.iterrows():
-                    if row["Estado"] == "✅":
-                        # Buscar el índice correspondiente en renombrados_info
-                        for i, info in enumerate(renombrados_info):
-                            # Comparar por alumno y base para identificar el registro correcto
-                            if (info["Base"] == row["Base"] and 
-                                row["Alumno"] in info["Nombre final"]):
-                                renombrados_info[i]["Nombre final"] = row["Nombre final"]
-                                break
+                # Editor de datos
+                with col_editor:
+                    edited_df = st.data_editor(
+                        df_edit,
+                        use_container_width=True,
+                        height=350,
+                        hide_index=True,
+                        column_config={
+                            "ID": st.column_config.TextColumn("ID", disabled=True, width="small"),
+                            "Página original": st.column_config.TextColumn("Original", disabled=True),
+                            "Estado": st.column_config.TextColumn("Estado", disabled=True, width="small"),
+                            "Nombre final": st.column_config.TextColumn("Nombre Final", width="large"),
+                            "Base": st.column_config.TextColumn("Base", disabled=True, width="small"),
+                            "Curso": st.column_config.TextColumn("Curso", disabled=True),
+                            "Tipo": st.column_config.TextColumn("Tipo", disabled=True, width="small"),
+                            "Alumno": st.column_config.TextColumn("Alumno", disabled=True),
+                            "Historial": st.column_config.TextColumn("Historial", disabled=True, width="small")
+                        },
+                        disabled=["ID", "Página original", "Estado", "Base", "Curso", "Tipo", "Alumno", "Historial"]
+                    )
+            
+                # Solo las filas cuyo nombre cambió; cada una se ubica por su ID. Una celda
+                # vaciada llega como None y no es un nombre: se ignora (el ZIP y el historial
+                # necesitan uno), igual que los espacios alrededor
+                nombres = edited_df["Nombre final"].fillna("").astype(str).str.strip()
+                cambiados = edited_df.assign(**{"Nombre final": nombres})
+                cambiados = cambiados[(nombres != "") & (nombres != df_edit["Nombre final"])]
+                cambiados = cambiados[cambiados["Estado"] == "✅"]
+                if not cambiados.empty:
+                    ediciones.update(zip(cambiados["ID"], cambiados["Nombre final"]))
+                    # El historial se registró con el nombre detectado: corregirlo, salvo en los
+                    # certificados que ya venían de lotes anteriores
+                    if historial_habilitado():
+                        obtener_escritor_historial().encolar_nombres(
+                            (nombre, tabla.pagina(id_pagina)[0])
+                            for id_pagina, nombre, historial in zip(
+                                cambiados["ID"], cambiados["Nombre final"], cambiados["Historial"]
+                            )
+                            if historial != "Ya enviado"
+                        )
+                    # Volver a armar los registros (ZIP, Excel y pestañas) con los nombres nuevos
+                    st.rerun()
         
-        st.markdown("<br>", unsafe_allow_html=True)
+            st.markdown("<br>", unsafe_allow_html=True)
         
-        # Botones de descarga
-        col1, col2 = st.columns(2)
+            # Botones de descarga
+            formatos = [f for f in FORMATOS_REPORTE if f != "parquet" or PARQUET_DISPONIBLE]
+            columnas = st.columns([2] + [1] * len(formatos))
+            marca = datetime.now().strftime('%Y%m%d_%H%M%S')
         
-        with col1:
-            zip_buffer = crear_zip_organizado(renombrados_info)
-            st.download_button(
-                "📦 Descargar ZIP",
-                zip_buffer,
-                file_name=f"certificados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                mime="application/zip",
-                use_container_width=True
-            )
+            with columnas[0]:
+                with rendimiento_interfaz.etapa("Firma del ZIP", paginas=tabla.exitosos):
+                    firma = firma_zip(renombrados_info, claves_listas, comprimir_zip, perfil_pdf, compartir_recursos)
+                st.download_button(
+                    "📦 Descargar ZIP",
+                    zip_en_disco(renombrados_info, firma, comprimir_zip, perfil_pdf, compartir_recursos),
+                    file_name=f"certificados_{marca}.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
         
-        with col2:
-            excel_buffer = BytesIO()
-            with pd.ExcelWriter(excel_buffer, engine="openpyxl") as writer:
-                # Usar edited_df si existe, sino df_log
-                final_df = edited_df if 'edited_df' in locals() else pd.DataFrame(log)
-                final_df.to_excel(writer, index=False, sheet_name="Reporte")
-            excel_buffer.seek(0)
-            st.download_button(
-                "📊 Descargar Excel",
-                excel_buffer,
-                file_name=f"reporte_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True
+            # El reporte es el log completo con las ediciones ya aplicadas; se genera al pulsar
+            # el botón. Las marcas de historial solo se agregan, así que basta con contarlas
+            firma_reporte = (
+                tuple(claves_listas), tuple(sorted(ediciones.items())),
+                len(enviados_previos[0]), len(enviados_previos[1])
             )
+            for columna, formato in zip(columnas[1:], formatos):
+                etiqueta, mime = FORMATOS_REPORTE[formato]
+                with columna:
+                    st.download_button(
+                        f"📊 {etiqueta}",
+                        reporte_en_sesion(tabla, firma_reporte, formato),
+                        file_name=f"reporte_{marca}.{formato}",
+                        mime=mime,
+                        use_container_width=True
+                    )
+        
+            rendimiento_interfaz.cerrar()
+            mostrar_rendimiento(rendimiento_interfaz)
+
+    else:
+        st.markdown("""
+        <div style='background: #1a1a1a; padding: 3rem; border-radius: 12px; text-align: center; margin-top: 2rem; border: 1px solid #2a2a2a;'>
+            <h2 style='color: white; margin-bottom: 1rem;'>Comienza aquí</h2>
+            <p style='font-size: 1rem; color: #888;'>
+                Sube archivos PDF o ZIP para procesarlos automáticamente
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
 
-else:
-    st.markdown("""
-    <div style='background: #1a1a1a; padding: 3rem; border-radius: 12px; text-align: center; margin-top: 2rem; border: 1px solid #2a2a2a;'>
-        <h2 style='color: white; margin-bottom: 1rem;'>Comienza aquí</h2>
-        <p style='font-size: 1rem; color: #888;'>
-            Sube archivos PDF o ZIP para procesarlos automáticamente
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import weakref
+from io import BytesIO
+from zipfile import ZipFile
+
+import fitz
+
+# Subidas más grandes que esto se vuelcan a disco en vez de quedarse en memoria
+UMBRAL_DISCO = 32 * 1024 * 1024
+
+def _borrar_si_existe(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+class ArchivoTemporal:
+    """
+    Copia en disco de una subida grande. El archivo se borra cuando ya nadie lo
+    referencia (ni la caché ni los registros del lote). Al enviarse a otro proceso
+    viaja como la ruta, para que el proceso hijo no lo borre al terminar.
+    """
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._finalizador = weakref.finalize(self, _borrar_si_existe, ruta)
+
+    def __reduce__(self):
+        return (str, (self.ruta,))
+
+    def __fspath__(self):
+        return self.ruta
+
+def volcar_a_disco(archivo, sufijo=""):
+    """Copia un archivo abierto (p. ej. un UploadedFile) a un ArchivoTemporal por bloques."""
+    descriptor, ruta = tempfile.mkstemp(prefix="certikeeper_", suffix=sufijo)
+    archivo.seek(0)
+    with os.fdopen(descriptor, "wb") as destino:
+        shutil.copyfileobj(archivo, destino, 1024 * 1024)
+    return ArchivoTemporal(ruta)
+
+class FuentePDF:
+    """
+    Referencia a un PDF de origen sin tener sus bytes cargados: `contenedor` son los bytes
+    del archivo subido (o de un ZIP anidado ya extraído) o su ruta en disco, y `miembros`
+    la cadena de nombres dentro de ZIP hasta llegar al PDF. Los bytes se leen solo al abrirlo.
+    """
+    __slots__ = ("nombre", "contenedor", "miembros", "tamano")
+
+    def __init__(self, nombre, contenedor, miembros=(), tamano=None):
+        self.nombre = nombre
+        self.contenedor = contenedor
+        self.miembros = tuple(miembros)
+        self.tamano = tamano
+
+    @property
+    def bytes_en_memoria(self):
+        return len(self.contenedor) if isinstance(self.contenedor, (bytes, bytearray)) else 0
+
+    def _abrir_contenedor(self):
+        if isinstance(self.contenedor, (bytes, bytearray)):
+            return BytesIO(self.contenedor)
+        return open(os.fspath(self.contenedor), "rb")
+
+    def leer(self):
+        if not self.miembros:
+            if isinstance(self.contenedor, (bytes, bytearray)):
+                return self.contenedor
+            with open(os.fspath(self.contenedor), "rb") as archivo:
+                return archivo.read()
+        with self._abrir_contenedor() as archivo:
+            return _leer_miembro(archivo, self.miembros)
+
+    def abrir(self):
+        """Documento fitz del PDF; si está suelto en disco, fitz lo lee de forma perezosa."""
+        if not self.miembros and not isinstance(self.contenedor, (bytes, bytearray)):
+            return fitz.open(os.fspath(self.contenedor), filetype="pdf")
+        return fitz.open(stream=self.leer(), filetype="pdf")
+
+def volcar_fuentes_a_disco(fuentes):
+    """
+    Pasa a disco los contenedores en memoria de `fuentes` (cada contenedor una sola vez,
+    aunque lo compartan varios PDF de un ZIP) y los cambia por su ArchivoTemporal. Sirve para
+    que lo que se conserva mucho tiempo después de clasificar no retenga los bytes subidos.
+    """
+    volcados = {}
+    for fuente in fuentes:
+        if not isinstance(fuente.contenedor, (bytes, bytearray)):
+            continue
+        if id(fuente.contenedor) not in volcados:
+            sufijo = ".zip" if fuente.miembros else ".pdf"
+            volcados[id(fuente.contenedor)] = volcar_a_disco(BytesIO(fuente.contenedor), sufijo)
+        fuente.contenedor = volcados[id(fuente.contenedor)]
+
+def _leer_miembro(archivo, miembros):
+    with ZipFile(archivo) as zipf:
+        if len(miembros) == 1:
+            return zipf.read(miembros[0])
+        with zipf.open(miembros[0]) as interno:
+            return _leer_miembro(interno, miembros[1:])
+
+def _extraer_zip_anidado(zipf, info):
+    """
+    Saca una vez un ZIP anidado de su contenedor: a memoria si es pequeño o a un
+    ArchivoTemporal si no. Leer sus miembros directamente dentro del ZIP exterior obligaría
+    a descomprimirlo entero de nuevo por cada PDF (cada salto atrás en un flujo deflate
+    vuelve a empezar desde el principio).
+    """
+    with zipf.open(info) as interno:
+        if info.file_size <= UMBRAL_DISCO:
+            return interno.read()
+        return volcar_a_disco(interno, ".zip")
+
+def _iterar_zip(archivo, contenedor):
+    with ZipFile(archivo) as zipf:
+        for info in zipf.infolist():
+            nombre_archivo = info.filename
+            if nombre_archivo.lower().endswith(".pdf"):
+                nombre_base = nombre_archivo.replace(".pdf", "")
+                yield FuentePDF(nombre_base, contenedor, (nombre_archivo,), info.file_size)
+            elif nombre_archivo.lower().endswith(".zip"):
+                # ZIP anidado: sus PDF apuntan a la copia extraída, no al ZIP exterior
+                anidado = _extraer_zip_anidado(zipf, info)
+                if isinstance(anidado, bytes):
+                    yield from _iterar_zip(BytesIO(anidado), anidado)
+                else:
+                    with open(anidado.ruta, "rb") as interno:
+                        yield from _iterar_zip(interno, anidado)
+
+def iterar_fuentes(nombre, contenedor):
+    """
+    Genera los PDF de origen (FuentePDF) de un PDF o ZIP subido, uno a uno y sin leer sus
+    bytes. `contenedor` son los bytes del archivo, su ruta o un ArchivoTemporal.
+    """
+    if nombre.lower().endswith(".pdf"):
+        nombre_base = nombre.replace(".pdf", "")
+        tamano = len(contenedor) if isinstance(contenedor, (bytes, bytearray)) else os.path.getsize(contenedor)
+        yield FuentePDF(nombre_base, contenedor, (), tamano)
+    elif nombre.lower().endswith(".zip"):
+        if isinstance(contenedor, (bytes, bytearray)):
+            yield from _iterar_zip(BytesIO(contenedor), contenedor)
+        else:
+            with open(os.fspath(contenedor), "rb") as archivo:
+                yield from _iterar_zip(archivo, contenedor)
+
+def extraer_pdfs_de_archivo(nombre, contenido):
+    """
+    Devuelve (pdfs, error): las referencias FuentePDF de un PDF o ZIP, sin separarlos ni
+    cargar sus bytes, y None o el mensaje si el ZIP no se pudo leer.
+    """
+    pdfs = []
+    try:
+        for fuente in iterar_fuentes(nombre, contenido):
+            pdfs.append(fuente)
+    except Exception as e:
+        return pdfs, str(e)
+    return pdfs, None
@@ -0,0 +1,240 @@
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from core.archivos import extraer_pdfs_de_archivo
+from core.empaquetado import COMPARTIR_RECURSOS, PERFIL_PDF, escribir_organizado_en_directorio
+from core.procesamiento import armar_registros, clasificar_fuentes, workers_por_defecto
+from core.rendimiento import Rendimiento
+from core.reporte import escribir_reporte_excel
+
+EXTENSIONES_BANDEJA = (".pdf", ".zip")
+# Un archivo se toma cuando su tamaño y su fecha no cambian durante este tiempo
+SEGUNDOS_ESTABLE = float(os.getenv("CERTIKEEPER_BANDEJA_ESTABLE", 5))
+# Archivos que se procesan juntos como un lote (comparten el pool y el reporte)
+MAX_ARCHIVOS_POR_LOTE = int(os.getenv("CERTIKEEPER_BANDEJA_LOTE", 50))
+
+class BandejaEntrada:
+    """
+    Servicio que vigila una carpeta de entrada y procesa los PDF y ZIP que van llegando,
+    sin interfaz: clasifica las páginas en un pool de procesos compartido y escribe los
+    certificados en `salida` con la estructura base/PAX|RAMPA|INSTRUCTORES|OTROS|Repetidos
+    del ZIP organizado, más un reporte Excel por lote en salida/reportes.
+
+    Un archivo se toma solo cuando lleva SEGUNDOS_ESTABLE sin cambiar de tamaño ni de fecha
+    (la copia terminó); los que empiezan por "." o terminan en .part/.tmp se ignoran. Al
+    terminar se mueve a entrada/procesados/AAAAMMDD o, si falló, a entrada/errores.
+
+    Los repetidos se detectan también entre lotes: las claves ya guardadas se conservan en
+    salida/.certificados_vistos. Las métricas (lotes, archivos, páginas, fallidos, cola y
+    páginas/s) se escriben en salida/estado_bandeja.json y como una línea JSON por lote.
+    al_clasificar(renombrados) es el mismo gancho que el de GestorTrabajos, para marcar los
+    certificados ya enviados según el historial.
+    """
+    def __init__(self, entrada, salida, workers=None, intervalo=2.0, al_clasificar=None,
+                 segundos_estable=SEGUNDOS_ESTABLE, max_archivos=MAX_ARCHIVOS_POR_LOTE,
+                 perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+        self.entrada = entrada
+        self.salida = salida
+        self.workers = max(1, workers or workers_por_defecto())
+        self.intervalo = intervalo
+        self.al_clasificar = al_clasificar
+        self.segundos_estable = segundos_estable
+        self.max_archivos = max(1, max_archivos)
+        self.perfil = perfil
+        self.compartir_recursos = compartir_recursos
+        self.ruta_vistos = os.path.join(salida, ".certificados_vistos")
+        self.ruta_estado = os.path.join(salida, "estado_bandeja.json")
+        self._vistos_en = {}  # ruta -> (tamaño, fecha de modificación, desde cuándo no cambia)
+        self._procesos = None
+        self.metricas = {
+            "inicio": datetime.now().isoformat(timespec="seconds"),
+            "lotes": 0, "archivos": 0, "paginas": 0, "exitosos": 0, "errores": 0,
+            "fallidos": 0, "cola": 0, "ultimo_lote": None
+        }
+        os.makedirs(entrada, exist_ok=True)
+        os.makedirs(salida, exist_ok=True)
+        self.certificados_vistos = self._leer_vistos()
+
+    def _leer_vistos(self):
+        if not os.path.exists(self.ruta_vistos):
+            return set()
+        with open(self.ruta_vistos, encoding="utf-8") as f:
+            return {linea.rstrip("\n") for linea in f if linea.strip()}
+
+    def _guardar_vistos(self, nuevos):
+        if nuevos:
+            with open(self.ruta_vistos, "a", encoding="utf-8") as f:
+                f.writelines(f"{clave}\n" for clave in sorted(nuevos))
+
+    def _guardar_estado(self):
+        temporal = self.ruta_estado + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(self.metricas, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self.ruta_estado)
+
+    def escanear(self):
+        """Archivos de la entrada listos para procesar (completos), del más antiguo al más nuevo."""
+        ahora = time.time()
+        listos, presentes = [], set()
+        for nombre in os.listdir(self.entrada):
+            ruta = os.path.join(self.entrada, nombre)
+            if (
+                nombre.startswith(".") or nombre.lower().endswith((".part", ".tmp"))
+                or not nombre.lower().endswith(EXTENSIONES_BANDEJA) or not os.path.isfile(ruta)
+            ):
+                continue
+            try:
+                estado = os.stat(ruta)
+            except OSError:
+                continue
+            presentes.add(ruta)
+            firma = (estado.st_size, estado.st_mtime)
+            anterior = self._vistos_en.get(ruta)
+            if anterior is None or anterior[:2] != firma:
+                # Nuevo o todavía creciendo: se vuelve a mirar en la próxima pasada
+                self._vistos_en[ruta] = (*firma, ahora)
+                continue
+            if ahora - anterior[2] >= self.segundos_estable:
+                listos.append((estado.st_mtime, ruta))
+        for ruta in [r for r in self._vistos_en if r not in presentes]:
+            del self._vistos_en[ruta]
+        self.metricas["cola"] = len(presentes)
+        return [ruta for _, ruta in sorted(listos)]
+
+    def _pool_procesos(self):
+        if self._procesos is None and self.workers > 1:
+            self._procesos = ProcessPoolExecutor(max_workers=self.workers)
+        return self._procesos
+
+    def _mover(self, ruta, carpeta):
+        destino_dir = os.path.join(self.entrada, carpeta)
+        os.makedirs(destino_dir, exist_ok=True)
+        destino = os.path.join(destino_dir, os.path.basename(ruta))
+        raiz, extension = os.path.splitext(destino)
+        n = 1
+        while os.path.exists(destino):
+            n += 1
+            destino = f"{raiz} ({n}){extension}"
+        shutil.move(ruta, destino)
+
+    def procesar_lote(self, rutas):
+        """Clasifica y organiza un lote de archivos de la entrada. Devuelve su Rendimiento."""
+        medicion = Rendimiento()
+        marca = datetime.now().strftime("%Y%m%d_%H%M%S")
+        fuentes, archivos_ok, fallidos = [], [], []
+        for ruta in rutas:
+            try:
+                with medicion.etapa("Lectura de archivos", tamano=os.path.getsize(ruta)):
+                    pdfs, error = extraer_pdfs_de_archivo(os.path.basename(ruta), ruta)
+            except OSError as e:
+                pdfs, error = [], e
+            if error is not None or not pdfs:
+                print(f"⚠️ No se pudo leer: {ruta}")
+                fallidos.append(ruta)
+                continue
+            fuentes.extend(pdfs)
+            archivos_ok.append(ruta)
+
+        paginas = []
+        if fuentes:
+            try:
+                with medicion.etapa("Clasificación (total)"):
+                    paginas_por_fuente, fuentes_con_error = clasificar_fuentes(
+                        fuentes, self.workers, pool=self._pool_procesos(), rendimiento=medicion
+                    )
+            except BrokenProcessPool:
+                # Un proceso hijo murió: el pool se recrea y el lote se reintenta en la próxima pasada
+                self._procesos = None
+                raise
+            for nombre_base in fuentes_con_error:
+                print(f"⚠️ Error al procesar: {nombre_base}")
+            paginas = [pagina for paginas_fuente in paginas_por_fuente for pagina in paginas_fuente]
+
+        enviados = None
+        if self.al_clasificar is not None and paginas:
+            try:
+                with medicion.etapa("Historial: consulta", paginas=len(paginas)):
+                    enviados = self.al_clasificar(armar_registros(paginas).renombrados)
+            except Exception as e:
+                print("⚠️ No se pudo consultar el historial:", e)
+
+        with medicion.etapa("Registros", paginas=len(paginas)):
+            tabla = armar_registros(paginas, enviados)
+        vistos_antes = set(self.certificados_vistos)
+        with medicion.etapa("Salida (total)", paginas=tabla.exitosos):
+            escribir_organizado_en_directorio(
+                tabla.renombrados, self.salida, self.certificados_vistos, medicion, self.perfil, self.compartir_recursos
+            )
+        self._guardar_vistos(self.certificados_vistos - vistos_antes)
+        if len(tabla):
+            os.makedirs(os.path.join(self.salida, "reportes"), exist_ok=True)
+            with medicion.etapa("Excel", paginas=len(tabla)):
+                escribir_reporte_excel(
+                    tabla.log, os.path.join(self.salida, "reportes", f"reporte_{marca}.xlsx"), tabla.resumen
+                )
+
+        for ruta in archivos_ok:
+            self._mover(ruta, os.path.join("procesados", marca[:8]))
+        for ruta in fallidos:
+            self._mover(ruta, "errores")
+        medicion.cerrar()
+
+        m = self.metricas
+        m["lotes"] += 1
+        m["archivos"] += len(archivos_ok)
+        m["paginas"] += len(tabla)
+        m["exitosos"] += tabla.exitosos
+        m["errores"] += tabla.errores
+        m["fallidos"] += len(fallidos)
+        m["cola"] = max(0, m["cola"] - len(rutas))
+        m["ultimo_lote"] = {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "archivos": len(rutas),
+            "paginas": len(tabla),
+            "segundos": round(medicion.total, 3),
+            "paginas_s": round(len(tabla) / medicion.total, 1) if medicion.total else 0.0
+        }
+        self._guardar_estado()
+        medicion.registrar(
+            lote=marca, origen="bandeja", archivos=len(rutas), paginas=len(tabla), fallidos=len(fallidos),
+            cola=m["cola"], workers=self.workers
+        )
+        return medicion
+
+    def ejecutar(self, una_vez=False):
+        """
+        Bucle del servicio: escanea, procesa lo que esté listo y espera `intervalo` segundos.
+        Con una_vez=True procesa lo que haya (esperando a que termine de copiarse) y termina.
+        """
+        print(f"📥 Vigilando {os.path.abspath(self.entrada)} → {os.path.abspath(self.salida)} (workers: {self.workers})")
+        self._guardar_estado()
+        try:
+            while True:
+                listos = self.escanear()
+                if listos:
+                    lote = listos[:self.max_archivos]
+                    try:
+                        medicion = self.procesar_lote(lote)
+                        print(f"✅ {len(lote)} archivos en {medicion.total:.1f} s · cola: {self.metricas['cola']}")
+                    except BrokenProcessPool:
+                        print("⚠️ Se perdió un proceso del pool: el lote se reintenta")
+                    except Exception as e:
+                        # Para no reintentar sin fin un lote que siempre falla, sus archivos se apartan
+                        print("❌ Error al procesar el lote:", e)
+                        self.metricas["fallidos"] += len(lote)
+                        for ruta in lote:
+                            if os.path.exists(ruta):
+                                self._mover(ruta, "errores")
+                        self._guardar_estado()
+                    continue
+                if una_vez and not self._vistos_en:
+                    return
+                time.sleep(self.intervalo)
+        finally:
+            if self._procesos is not None:
+                self._procesos.shutdown(cancel_futures=True)
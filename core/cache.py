@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ARCHIVOS_CACHE = 64
+MAX_BYTES_CACHE = 1024 * 1024 * 1024  # 1 GB de archivos subidos retenidos en memoria
+
+# Caché de texto por página en disco, compartida por todas las sesiones y por el CLI.
+# CERTIKEEPER_CACHE_TEXTO vacío la desactiva. Por defecto está en la carpeta del proyecto y
+# una ruta relativa se resuelve al importar, así el CLI o un cron lanzados desde otro
+# directorio usan el mismo archivo que la interfaz
+RUTA_CACHE_TEXTO = os.getenv(
+    "CERTIKEEPER_CACHE_TEXTO",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache_texto.sqlite3")
+)
+if RUTA_CACHE_TEXTO:
+    RUTA_CACHE_TEXTO = os.path.abspath(RUTA_CACHE_TEXTO)
+MAX_BYTES_CACHE_TEXTO = int(os.getenv("CERTIKEEPER_CACHE_TEXTO_MB", 256)) * 1024 * 1024
+
+def clave_archivo(nombre, contenido):
+    """
+    Identidad de un archivo subido: su nombre y su contenido. El mismo contenido con otro
+    nombre es otro archivo, porque el nombre va en el de sus páginas y en sus IDs.
+    """
+    h = hashlib.sha256(nombre.encode("utf-8") + b"\0")
+    h.update(contenido)
+    return h.hexdigest()
+
+class CacheProcesamiento:
+    """
+    Caché LRU acotada: clave del archivo subido (clave_archivo) -> páginas ya separadas y clasificadas.
+    Cada entrada es una lista de (nombre_original, FuentePDF, indice, resultado de extraer_info, hash_pagina).
+    Se expulsa el archivo usado hace más tiempo al superar el número de archivos o de bytes,
+    salvo los fijados con fijar() (los que siguen en el cargador): si se expulsaran, cada
+    recarga los volvería a enviar a procesar. Los fijados pueden superar los límites.
+    """
+    def __init__(self, max_archivos=MAX_ARCHIVOS_CACHE, max_bytes=MAX_BYTES_CACHE):
+        self.max_archivos = max_archivos
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._tamanos = {}
+        self._fijadas = set()
+        self.bytes_totales = 0
+
+    def fijar(self, claves):
+        """Las entradas de `claves` (y las que se guarden con esas claves) no se expulsan; el resto sí."""
+        self._fijadas = set(claves)
+
+    def obtener(self, clave):
+        if clave not in self._entradas:
+            return None
+        self._entradas.move_to_end(clave)
+        return self._entradas[clave]
+
+    def guardar(self, clave, paginas):
+        if clave in self._entradas:
+            self.bytes_totales -= self._tamanos.pop(clave)
+            del self._entradas[clave]
+        # Solo cuentan los bytes retenidos en memoria, una vez por contenedor compartido
+        contenedores = {id(fuente.contenedor): fuente.bytes_en_memoria for _, fuente, _, _, _ in paginas}
+        tamano = sum(contenedores.values())
+        self._entradas[clave] = paginas
+        self._tamanos[clave] = tamano
+        self.bytes_totales += tamano
+        # Expulsar los menos usados, conservando siempre el recién guardado y los fijados
+        expulsables = [c for c in self._entradas if c != clave and c not in self._fijadas]
+        for antigua in expulsables:
+            if len(self._entradas) <= self.max_archivos and self.bytes_totales <= self.max_bytes:
+                break
+            del self._entradas[antigua]
+            self.bytes_totales -= self._tamanos.pop(antigua)
+
+    def __len__(self):
+        return len(self._entradas)
+
+
+class CacheTextoPaginas:
+    """
+    Caché persistente en SQLite: hash de página -> texto extraído (en mayúsculas) y
+    resultado de extraer_info. La usan a la vez varios hilos y procesos (WAL), así que
+    cada hilo abre su propia conexión. Una conexión heredada al hacer fork (un proceso hijo
+    del pool creado desde un hilo que ya la usaba) no se toca: el hijo abre la suya.
+
+    Cada resultado lleva la versión de las reglas con que se calculó: si las reglas
+    cambiaron, obtener() devuelve solo el texto y el resultado hay que recalcularlo.
+    Al superar max_bytes se expulsan las páginas usadas hace más tiempo.
+    Un error de SQLite nunca corta el procesamiento: la página se trata como no cacheada.
+    """
+    def __init__(self, ruta=RUTA_CACHE_TEXTO, max_bytes=MAX_BYTES_CACHE_TEXTO, version=""):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.version = version
+        self._local = threading.local()
+
+    def __reduce__(self):
+        # Al pasar a otro proceso viaja la configuración, no las conexiones abiertas
+        return (type(self), (self.ruta, self.max_bytes, self.version))
+
+    def _conexion(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            # Todo el esquema en una transacción: el total de meta se calcula una sola vez
+            # (al crearla sobre una caché anterior) y desde ahí lo llevan los triggers
+            conn.execute("BEGIN IMMEDIATE;")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS paginas (
+                    hash TEXT PRIMARY KEY,
+                    texto TEXT NOT NULL,
+                    resultado TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    tamano INTEGER NOT NULL,
+                    usado REAL NOT NULL
+                );
+            """)
+            conn.execute("DROP INDEX IF EXISTS paginas_usado;")
+            conn.execute("CREATE INDEX IF NOT EXISTS paginas_usado_tamano ON paginas (usado, tamano);")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL);")
+            conn.execute("INSERT OR IGNORE INTO meta VALUES (0, (SELECT COALESCE(SUM(tamano), 0) FROM paginas));")
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS paginas_insertar AFTER INSERT ON paginas BEGIN
+                    UPDATE meta SET bytes = bytes + new.tamano WHERE id = 0;
+                END;
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS paginas_borrar AFTER DELETE ON paginas BEGIN
+                    UPDATE meta SET bytes = bytes - old.tamano WHERE id = 0;
+                END;
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS paginas_tamano AFTER UPDATE OF tamano ON paginas BEGIN
+                    UPDATE meta SET bytes = bytes + new.tamano - old.tamano WHERE id = 0;
+                END;
+            """)
+            conn.commit()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def obtener(self, hashes):
+        """
+        Devuelve {hash: (texto, resultado)} de las páginas cacheadas; resultado es None si se
+        calculó con otra versión de las reglas.
+        """
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        try:
+            conn = self._conexion()
+            marcas = ",".join("?" * len(hashes))
+            filas = conn.execute(
+                f"SELECT hash, texto, resultado, version FROM paginas WHERE hash IN ({marcas});", hashes
+            ).fetchall()
+            if filas:
+                with conn:
+                    conn.execute(
+                        f"UPDATE paginas SET usado = ? WHERE hash IN ({','.join('?' * len(filas))});",
+                        [time.time()] + [fila[0] for fila in filas]
+                    )
+        except sqlite3.Error as e:
+            print("⚠️ Caché de texto no disponible:", e)
+            return {}
+        return {
+            hash_pag: (texto, tuple(json.loads(resultado)) if version == self.version else None)
+            for hash_pag, texto, resultado, version in filas
+        }
+
+    def guardar(self, paginas):
+        """Guarda una lista de (hash, texto, resultado) y expulsa lo más antiguo si hace falta."""
+        if not paginas:
+            return
+        ahora = time.time()
+        filas = []
+        for hash_pag, texto, resultado in paginas:
+            resultado = json.dumps(resultado, ensure_ascii=False)
+            tamano = len(texto.encode("utf-8")) + len(resultado.encode("utf-8"))
+            filas.append((hash_pag, texto, resultado, self.version, tamano, ahora))
+        try:
+            conn = self._conexion()
+            with conn:
+                # Un upsert y no INSERT OR REPLACE: el borrado implícito de REPLACE no dispara
+                # los triggers que llevan el total de bytes
+                conn.executemany("""
+                    INSERT INTO paginas VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (hash) DO UPDATE SET texto = excluded.texto, resultado = excluded.resultado,
+                        version = excluded.version, tamano = excluded.tamano, usado = excluded.usado;
+                """, filas)
+                self._expulsar(conn)
+        except sqlite3.Error as e:
+            print("⚠️ Caché de texto no disponible:", e)
+
+    def _expulsar(self, conn):
+        # El total lo mantienen los triggers en meta: sumar la tabla en cada guardado leería
+        # también las páginas de desbordamiento del texto
+        total = conn.execute("SELECT bytes FROM meta WHERE id = 0;").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Se conservan las más recientes hasta llenar el 90% del límite, para no expulsar en cada
+        # guardado; el recorrido usa solo el índice (usado, tamano)
+        conn.execute("""
+            DELETE FROM paginas WHERE rowid IN (
+                SELECT rowid FROM (
+                    SELECT rowid, SUM(tamano) OVER (ORDER BY usado DESC, rowid) AS acumulado FROM paginas
+                ) WHERE acumulado > ?
+            );
+        """, (int(self.max_bytes * 0.9),))
+
+_caches_texto = {}
+
+def obtener_cache_texto(version):
+    """CacheTextoPaginas del proceso para esta versión de reglas, o None si está desactivada."""
+    if not RUTA_CACHE_TEXTO:
+        return None
+    if version not in _caches_texto:
+        _caches_texto[version] = CacheTextoPaginas(RUTA_CACHE_TEXTO, MAX_BYTES_CACHE_TEXTO, version)
+    return _caches_texto[version]
@@ -0,0 +1,260 @@
+import fitz
+import hashlib
+import os
+import re
+
+from core.cache import obtener_cache_texto
+from core.nombres import MOTOR_NOMBRES
+from core.rendimiento import Rendimiento
+from core.reglas import MOTOR_REGLAS, VERSION_REGLAS, base_abrev
+
+# Modo de extracción del texto: "completa" lee la página entera; "encabezado" lee primero
+# los bloques de REGION_ENCABEZADO (fracciones x0,y0,x1,y1 de la página) y solo pasa a la
+# página entera si ahí no están el nombre, la base, el curso y el cargo
+MODO_EXTRACCION = os.getenv("CERTIKEEPER_EXTRACCION", "completa")
+REGION_ENCABEZADO = tuple(float(v) for v in os.getenv("CERTIKEEPER_REGION_ENCABEZADO", "0,0,1,0.5").split(","))
+
+# =========================
+# FUNCIONES DE PROCESAMIENTO
+# =========================
+def obtener_texto_con_ocr(pdf_bytes):
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    texto = "".join([page.get_text() for page in doc])
+    doc.close()
+    return texto.upper()
+
+# Las versiones anteriores de estas tres funciones están en benchmarks/reglas.py, que
+# comprueba que MOTOR_REGLAS da exactamente lo mismo
+def detectar_curso(texto):
+    return MOTOR_REGLAS.clasificar(texto)[2]
+
+def detectar_base(texto):
+    return MOTOR_REGLAS.clasificar(texto)[0]
+
+def detectar_tipo(texto):
+    return MOTOR_REGLAS.clasificar(texto.upper())[3]
+
+def detectar_nombre_con_flexibilidad(texto):
+    return MOTOR_NOMBRES.detectar(texto)
+
+def extraer_primer_nombre_apellido(nombre_completo):
+    """
+    Extrae el primer nombre y primer apellido de un nombre completo.
+    REGLA PRINCIPAL: En nombres de 4 palabras, el apellido SIEMPRE es la 3ra palabra.
+    Para otros casos, detecta partículas y nombres compuestos (ver core/lexico_nombres.json).
+    """
+    return MOTOR_NOMBRES.analizar(nombre_completo)
+
+def extraer_info(pdf_bytes):
+    return extraer_info_de_texto(obtener_texto_con_ocr(pdf_bytes))
+
+def extraer_info_de_texto(texto, rendimiento=None):
+    rendimiento = rendimiento or Rendimiento()
+    # Base, curso y cargo salen de una sola pasada del motor de reglas
+    with rendimiento.etapa("Reglas (base, curso, cargo)", paginas=1):
+        base, curso_detectado, curso, tipo = MOTOR_REGLAS.clasificar(texto)
+
+    with rendimiento.etapa("Detección de nombre", paginas=1):
+        nombre_completo = MOTOR_NOMBRES.detectar(texto)
+        if nombre_completo:
+            primer_nombre, primer_apellido = MOTOR_NOMBRES.analizar(nombre_completo)
+    if not nombre_completo:
+        return None, None, None, None, None, "ERROR: Sin nombre"
+    
+    if not primer_nombre or not primer_apellido:
+        return None, None, None, None, None, "ERROR: Nombre inválido"
+    
+    base_ab = base_abrev.get(base, "XXX")
+
+    if curso_detectado:
+        nuevo_nombre = f"{base_ab} {curso_detectado} {primer_nombre} {primer_apellido}".upper() + ".pdf"
+        tipo = ""
+        return base_ab, curso_detectado, tipo, f"{primer_nombre} {primer_apellido}", nuevo_nombre, "✅"
+    
+    nuevo_nombre = f"{base_ab} {curso} {tipo} {primer_nombre} {primer_apellido}".upper() + ".pdf"
+    return base_ab, curso, tipo, f"{primer_nombre} {primer_apellido}", nuevo_nombre, "✅"
+
+def texto_por_bloques(page, region=None):
+    """
+    Texto de la página en mayúsculas, bloque por bloque en orden de lectura (de arriba
+    abajo y de izquierda a derecha). Con `region` (x0, y0, x1, y1 en fracciones de la
+    página) solo se leen los bloques de esa zona.
+    """
+    clip = None
+    if region:
+        r = page.rect
+        x0, y0, x1, y1 = region
+        clip = fitz.Rect(r.x0 + r.width * x0, r.y0 + r.height * y0, r.x0 + r.width * x1, r.y0 + r.height * y1)
+    # Cada bloque es (x0, y0, x1, y1, texto, n, tipo); tipo 1 son imágenes
+    bloques = page.get_text("blocks", clip=clip, sort=True)
+    return "".join(b[4] if b[4].endswith("\n") else b[4] + "\n" for b in bloques if b[6] == 0).upper()
+
+def encabezado_completo(texto, info):
+    """
+    Si el texto del encabezado ya basta: hay nombre, base y curso, y el cargo no depende de
+    lo que quede fuera: curso de rampa, que no lo usa, u OT, que gana sobre SAP en cualquier
+    parte de la página. Un SAP del encabezado (que puede venir del propio nombre del curso)
+    aún puede cambiar a OT con el resto de la página.
+    """
+    base, curso, tipo, _, _, estado = info
+    if estado != "✅" or base == "XXX" or curso == "CURSO":
+        return False
+    return tipo in ("", "OT")
+
+def extraer_info_de_pagina(page, rendimiento=None, texto=None):
+    """
+    (texto, resultado de extraer_info) de una página según MODO_EXTRACCION. En modo
+    "encabezado" se clasifica primero el texto de REGION_ENCABEZADO y solo si falta algún
+    dato se extrae y clasifica la página entera. Si se pasa `texto` (de la caché) se
+    clasifica ese y solo se vuelve a extraer si en modo encabezado no alcanza.
+    """
+    rendimiento = rendimiento or Rendimiento()
+    if MODO_EXTRACCION != "encabezado":
+        if texto is None:
+            with rendimiento.etapa("Extracción de texto", paginas=1):
+                texto = page.get_text().upper()
+        return texto, extraer_info_de_texto(texto, rendimiento)
+    
+    if texto is None:
+        with rendimiento.etapa("Extracción de texto: encabezado", paginas=1):
+            texto = texto_por_bloques(page, REGION_ENCABEZADO)
+    info = extraer_info_de_texto(texto, rendimiento)
+    if encabezado_completo(texto, info):
+        return texto, info
+    with rendimiento.etapa("Extracción de texto", paginas=1):
+        texto = texto_por_bloques(page)
+    return texto, extraer_info_de_texto(texto, rendimiento)
+
+# Recursos de una página que pueden llevar contenido propio: formularios e imágenes, fuentes,
+# patrones y sombreados
+CLASES_RECURSOS = ("XObject", "Font", "Pattern", "Shading")
+_REFERENCIA = re.compile(r"/([^\s/<>\[\]()]+)\s*(\d+)\s+\d+\s+R")
+_NUMERO_REFERENCIA = re.compile(r"\d+\s+\d+\s+R")
+
+def _recursos_de(doc, xref):
+    """xrefs de los recursos de un objeto (página, formulario, patrón...), en orden de nombre."""
+    referencias = []
+    for clase in CLASES_RECURSOS:
+        tipo, valor = doc.xref_get_key(xref, f"Resources/{clase}")
+        if tipo == "xref":
+            tipo, valor = "dict", doc.xref_object(int(valor.split()[0]), compressed=True)
+        if tipo == "dict":
+            referencias.extend(int(x) for _, x in sorted(_REFERENCIA.findall(valor)))
+    return referencias
+
+def _digesto_objeto(doc, xref):
+    """(sha256 del diccionario sin números de objeto y de los datos crudos, recursos a los que apunta)."""
+    h = hashlib.sha256(_NUMERO_REFERENCIA.sub("R", doc.xref_object(xref, compressed=True)).encode())
+    if doc.xref_is_stream(xref):
+        h.update(doc.xref_stream_raw(xref) or b"")
+    return h.digest(), _recursos_de(doc, xref)
+
+def hash_pagina(doc, page, digestos=None):
+    """
+    Huella del contenido de una página: su flujo de contenido y todo lo que alcanza desde sus
+    recursos, recorriendo los formularios (XObject) recursivamente. Cada objeto aporta su
+    diccionario (sin los números de objeto, que cambian de un archivo a otro) y sus datos
+    crudos, así que dos páginas que solo dibujan "/fzFrm0 Do" (sellos, imposición,
+    show_pdf_page) se distinguen por lo que hay dentro del formulario, y en los
+    certificados escaneados por la imagen.
+    `digestos` es un dict por documento abierto (xref -> resultado de _digesto_objeto, y los
+    recursos de cada diccionario Resources): las fuentes e imágenes que comparten todas las
+    páginas se leen y se hashean una sola vez.
+    """
+    digestos = {} if digestos is None else digestos
+    h = hashlib.sha256(page.read_contents())
+    # Los recursos se pueden heredar del árbol de páginas
+    xref = page.xref
+    tipo, recursos = doc.xref_get_key(xref, "Resources")
+    while tipo == "null":
+        tipo_padre, padre = doc.xref_get_key(xref, "Parent")
+        if tipo_padre != "xref":
+            break
+        xref = int(padre.split()[0])
+        tipo, recursos = doc.xref_get_key(xref, "Resources")
+    # Las páginas con el mismo diccionario de recursos (el mismo objeto, o el mismo texto si
+    # va dentro de la página) comparten la lista de lo que referencian
+    clave = ("Resources", recursos)
+    if clave not in digestos:
+        digestos[clave] = _recursos_de(doc, xref)
+    pendientes, vistos = list(digestos[clave]), set()
+    while pendientes:
+        xref = pendientes.pop(0)
+        if xref in vistos:
+            continue
+        vistos.add(xref)
+        if xref not in digestos:
+            digestos[xref] = _digesto_objeto(doc, xref)
+        digesto, hijos = digestos[xref]
+        h.update(digesto)
+        pendientes.extend(hijos)
+    return h.hexdigest()
+
+# Versión de los resultados guardados en la caché de texto: reglas y léxico de nombres
+VERSION_CLASIFICACION = f"{VERSION_REGLAS}-{MOTOR_NOMBRES.version}"
+
+# Páginas cuyo hash se consulta de una vez en la caché de texto
+PAGINAS_POR_CONSULTA = 64
+# El texto de un modo no sirve para el otro: en modo "encabezado" las entradas de la caché
+# llevan el modo, la versión de encabezado_completo y la región en la clave
+VERSION_ENCABEZADO = "2"
+SUFIJO_CACHE = "" if MODO_EXTRACCION != "encabezado" else (
+    f":encabezado{VERSION_ENCABEZADO}:" + ",".join(map(str, REGION_ENCABEZADO))
+)
+
+def clasificar_rango_paginas(fuente, desde=0, hasta=None, al_avanzar=None, rendimiento=None):
+    """
+    Abre el PDF de origen (FuentePDF) una sola vez y clasifica las páginas [desde, hasta)
+    con su propio texto; los bytes se liberan al cerrar el documento.
+    El texto de las páginas ya vistas (mismo hash, en esta u otra sesión) sale de la caché
+    de texto en vez de volver a extraerse; en modo "encabezado" la caché guarda aparte el
+    texto que se usó (el del encabezado o el de la página entera si no alcanzó).
+    Los tiempos de cada etapa se suman a `rendimiento`.
+    Devuelve (paginas, error): paginas es una lista de (nombre_pagina, indice, resultado de extraer_info, hash_pagina)
+    y error es None o el mensaje de la excepción que cortó el procesamiento.
+    El PDF de una sola página no se genera aquí, solo al armar el ZIP.
+    """
+    rendimiento = rendimiento or Rendimiento()
+    paginas = []
+    cache = obtener_cache_texto(VERSION_CLASIFICACION)
+    try:
+        with rendimiento.etapa("Abrir PDF", tamano=fuente.tamano or 0):
+            doc = fuente.abrir()
+        # El documento se cierra aunque falle una página: si no, el proceso hijo lo
+        # conservaría abierto (con su mmap) hasta terminar
+        with doc:
+            total = len(doc)
+            if hasta is None or hasta > total:
+                hasta = total
+            digestos = {}
+            for inicio in range(desde, hasta, PAGINAS_POR_CONSULTA):
+                indices = range(inicio, min(inicio + PAGINAS_POR_CONSULTA, hasta))
+                with rendimiento.etapa("Hash de página", paginas=len(indices)):
+                    hashes = [hash_pagina(doc, doc[i], digestos) for i in indices]
+                claves = [hash_pag + SUFIJO_CACHE for hash_pag in hashes]
+                with rendimiento.etapa("Caché de texto"):
+                    cacheadas = cache.obtener(claves) if cache else {}
+                rendimiento.contar("Caché de texto", paginas=len(cacheadas))
+                nuevas = []
+                for i, hash_pag, clave in zip(indices, hashes, claves):
+                    nombre_pagina = f"{fuente.nombre}_pag_{i+1}"
+                    if al_avanzar:
+                        al_avanzar(nombre_pagina, i + 1 - desde, hasta - desde)
+                    texto, info = cacheadas.get(clave, (None, None))
+                    if info is None:
+                        # Página nueva o calculada con reglas anteriores
+                        texto, info = extraer_info_de_pagina(doc[i], rendimiento, texto)
+                        nuevas.append((clave, texto, info))
+                    paginas.append((nombre_pagina, i, info, hash_pag))
+                if cache:
+                    with rendimiento.etapa("Caché de texto"):
+                        cache.guardar(nuevas)
+    except Exception as e:
+        return paginas, str(e)
+    return paginas, None
+
+def clasificar_rango_medido(fuente, desde=0, hasta=None):
+    """clasificar_rango_paginas para un proceso hijo: devuelve además sus mediciones (paginas, error, etapas)."""
+    rendimiento = Rendimiento()
+    paginas, error = clasificar_rango_paginas(fuente, desde, hasta, rendimiento=rendimiento)
+    return paginas, error, rendimiento.etapas
@@ -0,0 +1,227 @@
+import fitz
+import hashlib
+import json
+import os
+import tempfile
+import unicodedata
+from io import BytesIO
+from itertools import groupby
+from zipfile import ZIP_STORED, ZipFile
+
+from core.rendimiento import Rendimiento
+from core.zip_paralelo import escribir_zip_paralelo
+
+# Perfiles de guardado de los PDF de una página (python -m benchmarks.perfiles mide cada uno):
+# - rapido: copia los objetos de la página tal como vienen, sin limpiar ni comprimir nada.
+# - equilibrado: además comprime los flujos que vengan sin comprimir y quita objetos repetidos.
+# - minimo: además reescribe el contenido (clean) y recorta las fuentes incrustadas a los
+#   glifos usados. Es el más lento (el recorte de fuentes se lleva la mayor parte), pero con
+#   fuentes completas incrustadas reduce bastante el tamaño.
+# Los tres agrupan los objetos pequeños en flujos de objetos, que también se escribe más rápido.
+PERFILES_PDF = {
+    "rapido": {"guardar": dict(garbage=0, use_objstms=1), "recortar_fuentes": False},
+    "equilibrado": {"guardar": dict(garbage=3, deflate=True, use_objstms=1), "recortar_fuentes": False},
+    "minimo": {"guardar": dict(garbage=4, deflate=True, clean=True, use_objstms=1), "recortar_fuentes": True},
+}
+PERFIL_PDF = os.getenv("CERTIKEEPER_PERFIL_PDF", "equilibrado")
+if PERFIL_PDF not in PERFILES_PDF:
+    print(f"⚠️ Perfil de PDF desconocido: {PERFIL_PDF}; se usa 'equilibrado'")
+    PERFIL_PDF = "equilibrado"
+# Varias páginas seguidas de un mismo PDF para el mismo alumno se extraen juntas y sus fuentes
+# se recortan una sola vez (solo cambia algo con perfiles que recortan fuentes)
+COMPARTIR_RECURSOS = os.getenv("CERTIKEEPER_COMPARTIR_RECURSOS", "0") == "1"
+
+def recortar_fuentes(doc):
+    """Deja en las fuentes incrustadas solo los glifos usados; si MuPDF no puede, se dejan enteras."""
+    try:
+        doc.subset_fonts()
+    except Exception as e:
+        print("⚠️ No se pudieron recortar las fuentes:", e)
+
+def generar_pdf_pagina(doc_origen, indice, perfil=PERFIL_PDF, recortar=True):
+    """PDF de una sola página de `doc_origen`, guardado con el perfil indicado."""
+    opciones = PERFILES_PDF[perfil]
+    nuevo_doc = fitz.open()
+    nuevo_doc.insert_pdf(doc_origen, from_page=indice, to_page=indice)
+    if recortar and opciones["recortar_fuentes"]:
+        recortar_fuentes(nuevo_doc)
+    buffer = BytesIO()
+    nuevo_doc.save(buffer, **opciones["guardar"])
+    nuevo_doc.close()
+    return buffer.getvalue()
+
+def generar_pdfs_paginas(doc_origen, indices, perfil=PERFIL_PDF):
+    """
+    PDF de una página para cada uno de `indices`. Si el perfil recorta fuentes, las páginas
+    se extraen antes a un documento intermedio: las fuentes e imágenes que comparten se
+    copian una vez y el recorte (lo más caro) se hace una sola vez para todas. Sin recorte,
+    el intermedio solo agregaría una copia más, así que cada página sale directo del origen.
+    """
+    if len(indices) == 1 or not PERFILES_PDF[perfil]["recortar_fuentes"]:
+        return [generar_pdf_pagina(doc_origen, indice, perfil) for indice in indices]
+    intermedio = fitz.open()
+    try:
+        for indice in indices:
+            # Insertar en el mismo documento reutiliza los objetos ya copiados del origen
+            intermedio.insert_pdf(doc_origen, from_page=indice, to_page=indice)
+        recortar_fuentes(intermedio)
+        return [generar_pdf_pagina(intermedio, i, perfil, recortar=False) for i in range(len(indices))]
+    finally:
+        intermedio.close()
+
+def clave_certificado(alumno, base, curso):
+    """Clave alumno + base + curso normalizada (mayúsculas, sin tildes ni espacios repetidos) para detectar duplicados."""
+    texto = unicodedata.normalize("NFKD", f"{alumno}_{base}_{curso}".upper())
+    return " ".join("".join(c for c in texto if not unicodedata.combining(c)).split())
+
+def pdfs_de_certificados(renombrados_info, rendimiento=None, perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+    """
+    Recorre los certificados y devuelve (info, pdf_bytes) de cada uno, generando el PDF de
+    la página solo en ese momento y abriendo cada origen una vez. Con compartir_recursos,
+    las páginas seguidas de un mismo origen y alumno se generan juntas (generar_pdfs_paginas).
+    """
+    rendimiento = rendimiento or Rendimiento()
+    if compartir_recursos:
+        grupos = (
+            list(grupo) for _, grupo in
+            groupby(renombrados_info, key=lambda info: (id(info["Origen"]), info.get("Alumno", "")))
+        )
+    else:
+        grupos = ([info] for info in renombrados_info)
+    origen_abierto, doc_origen = None, None
+    try:
+        for grupo in grupos:
+            if grupo[0]["Origen"] is not origen_abierto:
+                if doc_origen is not None:
+                    doc_origen.close()
+                origen_abierto = grupo[0]["Origen"]
+                with rendimiento.etapa("ZIP: abrir PDF", tamano=origen_abierto.tamano or 0):
+                    doc_origen = origen_abierto.abrir()
+            with rendimiento.etapa("ZIP: PDF por página", paginas=len(grupo)):
+                pdfs = generar_pdfs_paginas(doc_origen, [info["Página"] for info in grupo], perfil)
+            yield from zip(grupo, pdfs)
+    finally:
+        if doc_origen is not None:
+            doc_origen.close()
+
+def ruta_organizada(info, certificados_vistos):
+    """
+    Ruta base/carpeta/nombre de un certificado en la estructura organizada (PAX, RAMPA,
+    INSTRUCTORES u OTROS, o Repetidos). `certificados_vistos` es el set de claves ya
+    guardadas en esta estructura y se actualiza.
+    """
+    nuevo_nombre = info["Nombre final"]
+    tipo = info["Cargo"].upper() if info["Cargo"] else ""
+    base = info["Base"]
+    alumno = info.get("Alumno", "").strip().upper()
+    curso = info.get("Curso", "").strip().upper()
+    
+    # Crear clave única combinando: alumno + base + curso
+    # Esto detecta duplicados de la misma persona, ciudad y curso
+    clave_unica = clave_certificado(alumno, base, curso)
+    
+    # Determinar carpeta base según tipo/curso
+    if "INSTRUCTOR" in tipo:
+        carpeta_base = "INSTRUCTORES"
+    elif "SEGURIDAD EN RAMPA PAX" in nuevo_nombre:
+        carpeta_base = "PAX"
+    elif "SEGURIDAD EN RAMPA OT" in nuevo_nombre:
+        carpeta_base = "RAMPA"
+    elif tipo == "OT":
+        carpeta_base = "RAMPA"
+    elif tipo == "SAP":
+        carpeta_base = "PAX"
+    else:
+        carpeta_base = "OTROS"
+    
+    # Primera aparición (y no enviado en un lote anterior): guardar en carpeta normal
+    if clave_unica not in certificados_vistos and not info.get("Ya enviado"):
+        certificados_vistos.add(clave_unica)
+        return f"{base}/{carpeta_base}/{nuevo_nombre}"
+    
+    # Segunda aparición en adelante, o ya registrado en historial: guardar en carpeta Repetidos
+    return f"{base}/Repetidos/{nuevo_nombre}"
+
+def crear_zip_organizado(renombrados_info, destino=None, comprimir=False, rendimiento=None,
+                         perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+    """
+    Escribe el ZIP organizado por base/carpeta entrada por entrada en `destino`
+    (ruta o archivo abierto); sin destino lo arma en memoria y devuelve el BytesIO.
+    Con comprimir=True las entradas se comprimen en varios hilos (escribir_zip_paralelo),
+    en el mismo orden, y los PDF que ya vienen comprimidos se guardan tal cual.
+    `perfil` y `compartir_recursos` definen cómo se guarda cada PDF (pdfs_de_certificados).
+    Los tiempos de abrir los orígenes, generar cada PDF y escribirlo se suman a `rendimiento`.
+    """
+    rendimiento = rendimiento or Rendimiento()
+    zip_buffer = BytesIO() if destino is None else destino
+    certificados_vistos = set()  # Claves de certificados únicos ya guardados
+    
+    if comprimir:
+        entradas = (
+            (ruta_organizada(info, certificados_vistos), pdf_bytes)
+            for info, pdf_bytes in pdfs_de_certificados(renombrados_info, rendimiento, perfil, compartir_recursos)
+        )
+        escribir_zip_paralelo(entradas, zip_buffer, rendimiento=rendimiento)
+    else:
+        with ZipFile(zip_buffer, "w", compression=ZIP_STORED) as zipf:
+            for info, pdf_bytes in pdfs_de_certificados(renombrados_info, rendimiento, perfil, compartir_recursos):
+                ruta_zip = ruta_organizada(info, certificados_vistos)
+                with rendimiento.etapa("ZIP: escritura", paginas=1, tamano=len(pdf_bytes)):
+                    zipf.writestr(ruta_zip, pdf_bytes)
+
+    if destino is None:
+        zip_buffer.seek(0)
+    return zip_buffer
+
+def escribir_organizado_en_directorio(renombrados_info, directorio, certificados_vistos=None, rendimiento=None,
+                                      perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+    """
+    Escribe los certificados como archivos sueltos en directorio/base/carpeta/nombre, con la
+    misma estructura que crear_zip_organizado. `certificados_vistos` permite seguir
+    detectando repetidos entre varias llamadas sobre el mismo directorio. Un nombre que ya
+    existe no se sobrescribe: se le agrega " (2)", " (3)"... Cada archivo se escribe aparte
+    y se renombra al terminar, así nunca queda uno a medias. Devuelve las rutas escritas.
+    """
+    rendimiento = rendimiento or Rendimiento()
+    certificados_vistos = set() if certificados_vistos is None else certificados_vistos
+    rutas = []
+    for info, pdf_bytes in pdfs_de_certificados(renombrados_info, rendimiento, perfil, compartir_recursos):
+        ruta = os.path.join(directorio, *ruta_organizada(info, certificados_vistos).split("/"))
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        raiz, extension = os.path.splitext(ruta)
+        n = 1
+        while os.path.exists(ruta):
+            n += 1
+            ruta = f"{raiz} ({n}){extension}"
+        with rendimiento.etapa("Escritura en disco", paginas=1, tamano=len(pdf_bytes)):
+            temporal = ruta + ".tmp"
+            with open(temporal, "wb") as f:
+                f.write(pdf_bytes)
+            os.replace(temporal, ruta)
+        rutas.append(ruta)
+    return rutas
+
+def firma_zip(renombrados_info, claves_contenido, comprimir=False, perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+    """
+    Huella del ZIP que produciría crear_zip_organizado: nombres y datos de cada certificado,
+    página de origen, hashes de los archivos de los que salen, modo de compresión y perfil de PDF.
+    Si no cambia, el ZIP ya generado sigue siendo válido.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps([list(claves_contenido), bool(comprimir), perfil, bool(compartir_recursos)]).encode())
+    for info in renombrados_info:
+        datos = [info["Nombre final"], info["Página"], info["Cargo"], info["Base"], info.get("Alumno", ""), info.get("Curso", ""), info.get("Ya enviado", False)]
+        h.update(json.dumps(datos, ensure_ascii=False).encode())
+    return h.hexdigest()
+
+def escribir_zip_temporal(renombrados_info, comprimir=False, directorio=None, rendimiento=None,
+                          perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+    """Escribe el ZIP organizado en un archivo temporal en disco y devuelve su ruta."""
+    descriptor, ruta = tempfile.mkstemp(prefix="certikeeper_", suffix=".zip", dir=directorio)
+    try:
+        with os.fdopen(descriptor, "wb") as archivo:
+            crear_zip_organizado(renombrados_info, archivo, comprimir, rendimiento, perfil, compartir_recursos)
+    except Exception:
+        os.remove(ruta)
+        raise
+    return ruta
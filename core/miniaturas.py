@@ -0,0 +1,108 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+
+# Ancho en píxeles de la vista previa: alcanza para leer el nombre sin rasterizar la página entera
+ANCHO_MINIATURA = int(os.getenv("CERTIKEEPER_MINIATURA_ANCHO", 480))
+MAX_BYTES_MINIATURAS = int(os.getenv("CERTIKEEPER_MINIATURAS_MB", 64)) * 1024 * 1024
+# Filas vecinas (antes y después de la elegida) que se dejan renderizadas de antemano
+VECINOS_MINIATURAS = 2
+
+def renderizar_miniatura(doc, indice, ancho=ANCHO_MINIATURA):
+    """PNG de una página de un documento fitz ya abierto, escalada a `ancho` píxeles."""
+    page = doc[indice]
+    zoom = ancho / page.rect.width if page.rect.width else 1
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return pix.tobytes("png")
+
+class CacheMiniaturas:
+    """
+    Caché LRU de miniaturas: hash de página -> PNG. Nada se rasteriza por adelantado: una
+    página se renderiza la primera vez que se pide, y prerenderizar() deja listas en un hilo
+    aparte las vecinas de la fila elegida. Como la clave es el hash del contenido, las
+    sesiones que suben el mismo certificado comparten la miniatura.
+    """
+    def __init__(self, max_bytes=MAX_BYTES_MINIATURAS, ancho=ANCHO_MINIATURA):
+        self.max_bytes = max_bytes
+        self.ancho = ancho
+        self.bytes_totales = 0
+        self._entradas = OrderedDict()
+        self._en_curso = {}  # hash -> Future de las páginas encoladas para prerenderizar
+        self._lock = threading.Lock()
+        self._hilo = ThreadPoolExecutor(max_workers=1, thread_name_prefix="miniaturas")
+
+    def __len__(self):
+        return len(self._entradas)
+
+    def _buscar(self, hash_pag):
+        with self._lock:
+            png = self._entradas.get(hash_pag)
+            if png is not None:
+                self._entradas.move_to_end(hash_pag)
+            return png
+
+    def _guardar(self, hash_pag, png):
+        with self._lock:
+            if hash_pag in self._entradas:
+                return
+            self._entradas[hash_pag] = png
+            self.bytes_totales += len(png)
+            while len(self._entradas) > 1 and self.bytes_totales > self.max_bytes:
+                _, antigua = self._entradas.popitem(last=False)
+                self.bytes_totales -= len(antigua)
+
+    def obtener(self, hash_pag, fuente, indice):
+        """PNG de la página; si no está, la renderiza ahora (o espera a que termine el prerenderizado)."""
+        png = self._buscar(hash_pag)
+        if png is not None:
+            return png
+        with self._lock:
+            futuro = self._en_curso.get(hash_pag)
+        if futuro is not None:
+            futuro.result()
+            png = self._buscar(hash_pag)
+            if png is not None:
+                return png
+        doc = fuente.abrir()
+        try:
+            png = renderizar_miniatura(doc, indice, self.ancho)
+        finally:
+            doc.close()
+        self._guardar(hash_pag, png)
+        return png
+
+    def prerenderizar(self, paginas):
+        """
+        Encola [(hash, fuente, indice)] para renderizarlas en segundo plano, saltando las que
+        ya están o ya se encolaron. Las de un mismo PDF se renderizan abriéndolo una sola vez.
+        """
+        por_fuente = {}
+        with self._lock:
+            for hash_pag, fuente, indice in paginas:
+                if hash_pag in self._entradas or hash_pag in self._en_curso:
+                    continue
+                por_fuente.setdefault(id(fuente), (fuente, []))[1].append((hash_pag, indice))
+            for fuente, pendientes in por_fuente.values():
+                futuro = self._hilo.submit(self._renderizar_fuente, fuente, pendientes)
+                for hash_pag, _ in pendientes:
+                    self._en_curso[hash_pag] = futuro
+
+    def _renderizar_fuente(self, fuente, pendientes):
+        try:
+            doc = fuente.abrir()
+            try:
+                for hash_pag, indice in pendientes:
+                    if self._buscar(hash_pag) is None:
+                        self._guardar(hash_pag, renderizar_miniatura(doc, indice, self.ancho))
+            finally:
+                doc.close()
+        except Exception as e:
+            # Una vista previa que falla no debe afectar a nada más: se reintenta al pedirla
+            print("⚠️ No se pudo prerenderizar la vista previa:", e)
+        finally:
+            with self._lock:
+                for hash_pag, _ in pendientes:
+                    self._en_curso.pop(hash_pag, None)
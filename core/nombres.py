@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+# Partículas de apellido y nombres que suelen ir de segundo nombre, editables sin tocar el código
+RUTA_LEXICO = os.getenv(
+    "CERTIKEEPER_LEXICO_NOMBRES", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexico_nombres.json")
+)
+# Nombres completos distintos cuyo análisis se recuerda (el mismo alumno aparece en varios cursos)
+MAX_NOMBRES_MEMORIZADOS = 8192
+
+# En orden de preferencia: con IDENTIFICACIÓN detrás el nombre queda bien delimitado
+PATRONES_NOMBRE = [
+    r"NOMBRE\s+DEL\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})\s+IDENTIFICACIÓN",
+    r"NOMBRE\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})\s+IDENTIFICACIÓN",
+    r"NOMBRE\s+DEL\s+ALUMNO\s*:?[\s]*([A-Z\s]{5,})"
+]
+
+def cargar_lexico(ruta=RUTA_LEXICO):
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+class MotorNombres:
+    """
+    Detección del nombre del alumno y de su primer nombre y primer apellido. Los patrones y
+    los léxicos se compilan una vez; el análisis de cada nombre completo se memoriza en una
+    caché acotada, así un alumno con varios certificados en el lote se analiza una sola vez.
+
+    `version` cambia con los patrones o el léxico: forma parte de la versión de los
+    resultados guardados en la caché de texto.
+    """
+    def __init__(self, lexico, max_memorizados=MAX_NOMBRES_MEMORIZADOS):
+        self.particulas = frozenset(lexico["particulas"])
+        self.nombres_compuestos = frozenset(lexico["nombres_compuestos"])
+        self.patrones = [re.compile(patron) for patron in PATRONES_NOMBRE]
+        self.version = hashlib.sha256(json.dumps(
+            [PATRONES_NOMBRE, sorted(self.particulas), sorted(self.nombres_compuestos)], ensure_ascii=False
+        ).encode("utf-8")).hexdigest()[:16]
+        self.analizar = lru_cache(maxsize=max_memorizados)(self._analizar)
+
+    def detectar(self, texto):
+        """Nombre completo tras "NOMBRE (DEL) ALUMNO" (de al menos 2 palabras) o "" si no hay."""
+        # Todos los patrones empiezan por NOMBRE: ninguna coincidencia puede empezar antes
+        inicio = texto.find("NOMBRE")
+        if inicio < 0:
+            return ""
+        # Los dos primeros exigen IDENTIFICACIÓN detrás del nombre
+        patrones = self.patrones if "IDENTIFICACIÓN" in texto else self.patrones[2:]
+        for patron in patrones:
+            for match in patron.finditer(texto, inicio):
+                posible = match.group(1).strip()
+                if len(posible.split()) >= 2:
+                    return posible
+        return ""
+
+    def _analizar(self, nombre_completo):
+        """
+        (primer_nombre, primer_apellido) de un nombre completo, o (None, None).
+        REGLA PRINCIPAL: En nombres de 4 palabras, el apellido SIEMPRE es la 3ra palabra.
+        Para otros casos, se saltan partículas, segundos nombres e iniciales.
+        """
+        if not nombre_completo:
+            return None, None
+        partes = nombre_completo.replace("\n", " ").replace("-", " ").split()
+        if len(partes) < 2:
+            return None, None
+        if len(partes) == 4:
+            return partes[0], partes[2]
+
+        i = 1
+        while i < len(partes):
+            palabra_actual = partes[i]
+            # Partículas de 2 palabras primero
+            if i < len(partes) - 1 and f"{palabra_actual} {partes[i+1]}" in self.particulas:
+                i += 2
+                continue
+            if (
+                palabra_actual in self.particulas
+                or palabra_actual in self.nombres_compuestos
+                or len(palabra_actual) < 2
+            ):
+                i += 1
+                continue
+            return partes[0], palabra_actual
+
+        # Si no se encontró apellido, se usa la segunda palabra
+        return partes[0], partes[1]
+
+    def analizar_lote(self, nombres):
+        """analizar() de una lista de nombres completos: cada nombre distinto se analiza una vez."""
+        distintos = {nombre: self.analizar(nombre) for nombre in dict.fromkeys(nombres)}
+        return [distintos[nombre] for nombre in nombres]
+
+    def extraer_lote(self, textos):
+        """(nombre_completo, primer_nombre, primer_apellido) del texto de cada página de un lote."""
+        completos = [self.detectar(texto) for texto in textos]
+        return [
+            (completo, primer_nombre, primer_apellido)
+            for completo, (primer_nombre, primer_apellido) in zip(completos, self.analizar_lote(completos))
+        ]
+
+MOTOR_NOMBRES = MotorNombres(cargar_lexico())
@@ -0,0 +1,169 @@
+import hashlib
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from core.archivos import FuentePDF
+from core.clasificacion import clasificar_rango_medido, clasificar_rango_paginas
+from core.empaquetado import clave_certificado
+from core.registros import TablaRegistros
+from core.rendimiento import Rendimiento
+
+# Páginas mínimas por tarea: por debajo de esto no compensa repartir un PDF entre procesos
+MIN_PAGINAS_POR_TAREA = 20
+# Solo se cuentan las páginas (leyendo el PDF) de los orígenes a partir de este tamaño
+UMBRAL_DIVISION = 4 * 1024 * 1024
+
+def workers_por_defecto():
+    """Número de procesos: variable CERTIKEEPER_WORKERS o, si no existe, los núcleos disponibles."""
+    try:
+        return max(1, int(os.getenv("CERTIKEEPER_WORKERS", "")))
+    except ValueError:
+        return os.cpu_count() or 1
+
+def dividir_en_tareas(fuentes, workers):
+    """
+    Arma las tareas (n_fuente, desde, hasta). Un PDF grande se reparte en rangos de páginas
+    entre todos los procesos; el resto va en una sola tarea, sin leerlo aquí.
+    """
+    tareas = []
+    for n, fuente in enumerate(fuentes):
+        if workers > 1 and (fuente.tamano or 0) >= UMBRAL_DIVISION:
+            try:
+                doc = fuente.abrir()
+                total = len(doc)
+                doc.close()
+            except Exception:
+                # El error se reporta al clasificar, igual que en el modo secuencial
+                total = 0
+            partes = max(1, min(workers, total // MIN_PAGINAS_POR_TAREA))
+            if partes > 1:
+                tamano = -(-total // partes)
+                for desde in range(0, total, tamano):
+                    tareas.append((n, desde, min(desde + tamano, total)))
+                continue
+        tareas.append((n, 0, None))
+    return tareas
+
+def _fuente_para_proceso(fuente):
+    """Si el PDF está dentro de un ZIP en memoria, al proceso hijo solo se le mandan sus bytes, no el ZIP entero."""
+    if fuente.miembros and fuente.bytes_en_memoria:
+        return FuentePDF(fuente.nombre, fuente.leer(), (), fuente.tamano)
+    return fuente
+
+def clasificar_fuentes(fuentes, workers=1, al_avanzar=None, pool=None, rendimiento=None):
+    """
+    Clasifica todas las páginas de una lista de PDF de origen (FuentePDF), leyendo los
+    bytes de cada uno solo mientras se procesa. Con workers > 1 reparte las tareas en un
+    ProcessPoolExecutor, con un número acotado de tareas en vuelo; el resultado es el
+    mismo y en el mismo orden que el modo secuencial. Si se pasa `pool`, las tareas van a ese
+    ProcessPoolExecutor compartido (con hasta workers * 2 en vuelo) en vez de crear uno propio.
+    Las mediciones por etapa, también las de los procesos hijos, se suman a `rendimiento`.
+
+    Devuelve (paginas_por_fuente, errores): para cada fuente, la lista de
+    (nombre_pagina, fuente, indice, resultado, hash_pagina), y los nombres de las fuentes con error.
+    al_avanzar(fraccion, paginas_hechas, nombre_pagina) se llama a medida que llegan resultados.
+    """
+    fuentes = list(fuentes)
+    rendimiento = rendimiento or Rendimiento()
+    with rendimiento.etapa("Dividir en tareas"):
+        tareas = dividir_en_tareas(fuentes, workers)
+    partes_por_fuente = [0] * len(fuentes)
+    for n, _, _ in tareas:
+        partes_por_fuente[n] += 1
+    # El avance se mide en bytes de origen: es lo único que se conoce sin abrir cada PDF
+    pesos = [max(fuentes[n].tamano or 1, 1) / partes_por_fuente[n] for n, _, _ in tareas]
+    peso_total = sum(pesos) or 1
+    resultados = [None] * len(tareas)
+    peso_hecho = 0
+    paginas_hechas = 0
+
+    if workers <= 1 or len(tareas) <= 1:
+        for t, (n, desde, hasta) in enumerate(tareas):
+            def avance(nombre_pagina, i, total):
+                nonlocal paginas_hechas
+                paginas_hechas += 1
+                if al_avanzar:
+                    al_avanzar(min((peso_hecho + pesos[t] * i / total) / peso_total, 1.0), paginas_hechas, nombre_pagina)
+            resultados[t] = clasificar_rango_paginas(fuentes[n], desde, hasta, avance, rendimiento)
+            peso_hecho += pesos[t]
+    else:
+        def repartir(pool):
+            nonlocal peso_hecho, paginas_hechas
+            pendientes = iter(enumerate(tareas))
+            en_curso = {}
+
+            def enviar():
+                for t, (n, desde, hasta) in pendientes:
+                    futuro = pool.submit(clasificar_rango_medido, _fuente_para_proceso(fuentes[n]), desde, hasta)
+                    en_curso[futuro] = t
+                    if len(en_curso) >= workers * 2:
+                        break
+
+            enviar()
+            while en_curso:
+                listos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+                for futuro in listos:
+                    t = en_curso.pop(futuro)
+                    paginas, error, etapas = futuro.result()
+                    resultados[t] = (paginas, error)
+                    rendimiento.combinar(etapas)
+                    peso_hecho += pesos[t]
+                    paginas_hechas += len(paginas)
+                    if al_avanzar:
+                        nombre = paginas[-1][0] if paginas else fuentes[tareas[t][0]].nombre
+                        al_avanzar(min(peso_hecho / peso_total, 1.0), paginas_hechas, nombre)
+                enviar()
+
+        if pool is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                repartir(pool)
+        else:
+            repartir(pool)
+
+    paginas_por_fuente = [[] for _ in fuentes]
+    errores = []
+    for (n, _, _), (paginas, error) in zip(tareas, resultados):
+        fuente = fuentes[n]
+        paginas_por_fuente[n].extend(
+            (nombre_pagina, fuente, indice, info, hash_pag) for nombre_pagina, indice, info, hash_pag in paginas
+        )
+        if error is not None and fuente.nombre not in errores:
+            errores.append(fuente.nombre)
+    return paginas_por_fuente, errores
+
+def id_registro(nombre_pagina, hash_pag):
+    """ID de una página que no depende de su posición en el lote: se mantiene al agregar o quitar archivos."""
+    return hashlib.sha1(f"{nombre_pagina}\n{hash_pag}".encode("utf-8")).hexdigest()[:10]
+
+def armar_registros(paginas, enviados=None, ediciones=None):
+    """
+    A partir de las páginas clasificadas (nombre_pagina, fuente, indice, resultado, hash_pagina)
+    arma la TablaRegistros del lote: el log de todas las páginas y los certificados renombrados
+    para el ZIP. Cada página lleva un ID estable (id_registro).
+    enviados es un par (claves, hashes) de certificados ya registrados en historial en lotes
+    anteriores: los que coinciden quedan marcados como "Ya enviado".
+    ediciones es un dict {ID: nombre final} con los nombres cambiados a mano en el editor.
+    """
+    claves_enviadas, hashes_enviados = enviados or (set(), set())
+    ediciones = ediciones or {}
+    tabla = TablaRegistros()
+    vistos = {}
+    for nombre_original, fuente, indice, info, hash_pag in paginas:
+        base, curso, tipo, alumno, nuevo_nombre, estado = info
+        # El mismo archivo subido dos veces: sus páginas se distinguen por orden de aparición
+        id_pagina = id_registro(nombre_original, hash_pag)
+        vistos[id_pagina] = vistos.get(id_pagina, 0) + 1
+        if vistos[id_pagina] > 1:
+            id_pagina = f"{id_pagina}-{vistos[id_pagina]}"
+        
+        if estado.startswith("ERROR"):
+            tabla.agregar_error(id_pagina, nombre_original, estado, fuente, indice, hash_pag)
+            continue
+        
+        clave = clave_certificado(alumno, base, curso)
+        ya_enviado = clave in claves_enviadas or hash_pag in hashes_enviados
+        tabla.agregar_exitosa(
+            id_pagina, nombre_original, estado, ediciones.get(id_pagina, nuevo_nombre), base, curso, tipo, alumno,
+            fuente, indice, clave, hash_pag, ya_enviado
+        )
+    return tabla
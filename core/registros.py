@@ -0,0 +1,179 @@
+from collections import Counter
+
+import pandas as pd
+
+# Columnas del log por página, en el orden en que se muestran y se exportan
+COLUMNAS_LOG = ["ID", "Página original", "Estado", "Nombre final", "Base", "Curso", "Tipo", "Alumno", "Historial"]
+# Columnas de la hoja "Resumen por base" del reporte
+COLUMNAS_RESUMEN = ["Base", "Certificados", "Ya enviados", "Cursos"]
+
+class Categorias:
+    """Valores que se repiten mucho (base, curso, cargo, estado): se guardan una vez y cada fila lleva su código."""
+    def __init__(self):
+        self.valores = []
+        self.codigos = []
+        self._por_valor = {}
+
+    def agregar(self, valor):
+        codigo = self._por_valor.get(valor)
+        if codigo is None:
+            codigo = self._por_valor[valor] = len(self.valores)
+            self.valores.append(valor)
+        self.codigos.append(codigo)
+
+    def __getitem__(self, fila):
+        return self.valores[self.codigos[fila]]
+
+    def serie(self):
+        return pd.Categorical.from_codes(self.codigos, categories=self.valores)
+
+class TablaRegistros:
+    """
+    Resultado de todas las páginas de un lote en columnas: una lista por campo en vez de un
+    dict por fila, con base, curso, cargo y estado como códigos de Categorias. Los PDF no se
+    copian: cada página (también las de error) guarda la referencia a su FuentePDF, su
+    índice y su hash.
+
+    Es la única copia de los resultados: `log` es el DataFrame que usan las pestañas y el
+    Excel (se arma una vez y se reutiliza), `resumen` el conteo por base de las
+    estadísticas y del reporte, y `renombrados` la vista de los certificados exitosos que
+    recorren el ZIP y el historial.
+    """
+    def __init__(self):
+        self.ids = []
+        self.paginas_originales = []
+        self.nombres_finales = []
+        self.alumnos = []
+        self.estados = Categorias()
+        self.bases = Categorias()
+        self.cursos = Categorias()
+        self.tipos = Categorias()
+        self.ya_enviado = []
+        self.origenes = []
+        self.indices = []
+        self.hashes = []
+        # Solo de las filas exitosas, en el mismo orden que `exitosas`
+        self.exitosas = []
+        self.claves = []
+        self.errores = 0
+        self._log = None
+        self._resumen = None
+        self._filas_por_id = None
+
+    def agregar_error(self, id_pagina, pagina_original, estado, origen, indice, hash_pag):
+        self._agregar(id_pagina, pagina_original, estado, "", "", "", "", "", False, origen, indice, hash_pag)
+        self.errores += 1
+
+    def agregar_exitosa(self, id_pagina, pagina_original, estado, nombre_final, base, curso, tipo, alumno,
+                        origen, indice, clave, hash_pag, ya_enviado):
+        self.exitosas.append(len(self.ids))
+        self.claves.append(clave)
+        self._agregar(
+            id_pagina, pagina_original, estado, nombre_final, base, curso, tipo, alumno, ya_enviado,
+            origen, indice, hash_pag
+        )
+
+    def _agregar(self, id_pagina, pagina_original, estado, nombre_final, base, curso, tipo, alumno, ya_enviado,
+                 origen, indice, hash_pag):
+        self.ids.append(id_pagina)
+        self.paginas_originales.append(pagina_original)
+        self.estados.agregar(estado)
+        self.nombres_finales.append(nombre_final)
+        self.bases.agregar(base)
+        self.cursos.agregar(curso)
+        self.tipos.agregar(tipo)
+        self.alumnos.append(alumno)
+        self.ya_enviado.append(ya_enviado)
+        self.origenes.append(origen)
+        self.indices.append(indice)
+        self.hashes.append(hash_pag)
+        self._log = None
+        self._resumen = None
+        self._filas_por_id = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def exitosos(self):
+        return len(self.exitosas)
+
+    @property
+    def log(self):
+        """DataFrame con COLUMNAS_LOG, una fila por página; se arma en el primer uso."""
+        if self._log is None:
+            self._log = pd.DataFrame({
+                "ID": self.ids,
+                "Página original": self.paginas_originales,
+                "Estado": self.estados.serie(),
+                "Nombre final": self.nombres_finales,
+                "Base": self.bases.serie(),
+                "Curso": self.cursos.serie(),
+                "Tipo": self.tipos.serie(),
+                "Alumno": self.alumnos,
+                "Historial": pd.Categorical.from_codes([int(e) for e in self.ya_enviado], categories=["", "Ya enviado"])
+            }, columns=COLUMNAS_LOG)
+        return self._log
+
+    def pagina(self, id_pagina):
+        """(hash, FuentePDF, índice) de la página con ese ID, o None si no está en la tabla."""
+        if self._filas_por_id is None:
+            self._filas_por_id = {id_pagina: fila for fila, id_pagina in enumerate(self.ids)}
+        fila = self._filas_por_id.get(id_pagina)
+        if fila is None:
+            return None
+        return self.hashes[fila], self.origenes[fila], self.indices[fila]
+
+    @property
+    def renombrados(self):
+        return VistaRenombrados(self)
+
+    @property
+    def resumen(self):
+        """
+        DataFrame con COLUMNAS_RESUMEN: certificados exitosos de cada base, cuántos ya se
+        habían enviado y cuántos cursos distintos, de mayor a menor; se arma en el primer uso.
+        """
+        if self._resumen is None:
+            certificados, ya_enviados, cursos = Counter(), Counter(), {}
+            for fila in self.exitosas:
+                codigo = self.bases.codigos[fila]
+                certificados[codigo] += 1
+                ya_enviados[codigo] += self.ya_enviado[fila]
+                cursos.setdefault(codigo, set()).add(self.cursos.codigos[fila])
+            self._resumen = pd.DataFrame(
+                [
+                    (self.bases.valores[codigo], n, ya_enviados[codigo], len(cursos[codigo]))
+                    for codigo, n in certificados.most_common()
+                ],
+                columns=COLUMNAS_RESUMEN
+            )
+        return self._resumen
+
+class VistaRenombrados:
+    """
+    Los certificados exitosos como los dicts que esperan crear_zip_organizado, firma_zip y el
+    historial. Cada dict se arma al recorrer la vista y no se guarda.
+    """
+    def __init__(self, tabla):
+        self.tabla = tabla
+
+    def __len__(self):
+        return self.tabla.exitosos
+
+    def __iter__(self):
+        t = self.tabla
+        for n, fila in enumerate(t.exitosas):
+            yield {
+                "ID": t.ids[fila],
+                "Nombre final": t.nombres_finales[fila],
+                "Origen": t.origenes[fila],
+                "Página": t.indices[fila],
+                "Cargo": t.tipos[fila],
+                "Base": t.bases[fila],
+                "Alumno": t.alumnos[fila],
+                "Curso": t.cursos[fila],
+                "Clave": t.claves[n],
+                "Hash página": t.hashes[fila],
+                "Ya enviado": t.ya_enviado[fila]
+            }
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import re
+
+# =========================
+# DICCIONARIOS BASE
+# =========================
+base_abrev = {
+    "SAN ANDRES": "ADZ",
+    "ARMENIA": "AXM",
+    "CALI": "CLO",
+    "BARRANQUILLA": "BAQ",
+    "BUCARAMANGA": "BGA",
+    "SANTA MARTA": "SMR",
+    "CARTAGENA": "CTG",
+    "PEREIRA": "PEI"
+}
+
+cursos_validos = {
+    "SMS ESP": "SMS ESP",
+    "SEGURIDAD EN RAMPA PAX": "SEGURIDAD EN RAMPA",
+    "SEGURIDAD EN RAMPA OT": "SEGURIDAD EN RAMPA",
+    "FACTORES HUMANOS": "FACTORES HUMANOS",
+    "ER 201": "ER 201",
+    "EQUIPAJES": "EQUIPAJES",
+    "DESPACHO CENTRALIZADO": "DESPACHO",
+
+    # ATENCIÓN A PASAJEROS (todas las variantes posibles)
+    "ATENCIÓN A PASAJEROS": "ATENCIÓN A PASAJEROS",
+    "ATENCION A PASAJEROS": "ATENCIÓN A PASAJEROS",
+    "ATENCIÓN A PASAJERO": "ATENCIÓN A PASAJEROS",
+    "ATENCION A PASAJERO": "ATENCIÓN A PASAJEROS",
+    "ATENCION PASAJEROS": "ATENCIÓN A PASAJEROS",
+    "ATENCIÓN PASAJEROS": "ATENCIÓN A PASAJEROS",
+
+    "BRS": "BRS",
+    "MODELO DE EXPERIENCIA": "MODELO DE EXPERIENCIA",
+    "PROCESOS PARA LA ATENCION DE AERONAVE": "PROCESOS PARA LA ATENCION DE AERONAVE"
+}
+
+# Cursos de rampa que van completos en el nombre final, sin cargo
+cursos_rampa = ["SEGURIDAD EN RAMPA PAX", "SEGURIDAD EN RAMPA OT"]
+
+claves_ot = ["OT", "OPERACIONES TERRESTRES", "AGENTE DE RAMPA", "OPERADOR DE RAMPA", "OPERARIO", "OPERACIÓN TERRESTRE"]
+claves_sap = ["SAP", "PAX", "PASAJEROS", "SERVICIO AL PASAJERO", "ATENCIÓN A PASAJEROS", "CHECK IN", "PASAJERO"]
+
+# Huella de las tablas de reglas (el orden importa: define las prioridades). Los
+# resultados guardados con otra versión en la caché de texto se recalculan.
+VERSION_REGLAS = hashlib.sha256(
+    json.dumps([base_abrev, cursos_validos, cursos_rampa, claves_ot, claves_sap], ensure_ascii=False).encode("utf-8")
+).hexdigest()[:16]
+
+
+# =========================
+# MOTOR DE REGLAS
+# =========================
+# Los mismos separadores de línea que usa str.splitlines()
+FIN_DE_LINEA = re.compile(r"[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+def regex_trie(claves):
+    """
+    Compila las claves como un trie: las que comparten prefijo comparten ramas, así en
+    cada posición el motor solo sigue el carácter que coincide en vez de probar cada
+    clave. Los sufijos opcionales son codiciosos, de modo que gana la clave más larga.
+    """
+    raiz = {}
+    for clave in claves:
+        nodo = raiz
+        for caracter in clave:
+            nodo = nodo.setdefault(caracter, {})
+        nodo[""] = {}
+
+    def construir(nodo):
+        ramas = [re.escape(c) + construir(hijo) for c, hijo in sorted(nodo.items()) if c]
+        if not ramas:
+            return ""
+        cuerpo = ramas[0] if len(ramas) == 1 else "(?:" + "|".join(ramas) + ")"
+        return f"(?:{cuerpo})?" if "" in nodo else cuerpo
+
+    return construir(raiz)
+
+# Con pocas claves, buscar cada una con `in` (en C y cortando en la primera que aparece) es
+# más rápido que recorrer el texto con la expresión del trie: con las tablas actuales (36
+# claves) el recorrido tarda unas tres veces más. El trie gana con tablas mucho más grandes
+# y el curso lejos del principio de la página (`python -m benchmarks.reglas`)
+MAX_CLAVES_BUSQUEDA_DIRECTA = 100
+
+class MotorReglas:
+    """
+    Busca todas las claves de base, curso y cargo en una sola pasada sobre el texto.
+    Mientras las tablas tengan como mucho `max_claves_directa` claves, clasificar() las
+    busca una a una, que con tablas pequeñas es más rápido y da el mismo resultado.
+
+    Se compila una única expresión (ver regex_trie) dentro de un lookahead, así que en
+    cada posición se obtiene la clave más larga que empieza ahí; las claves que son
+    prefijo de ella se agregan desde una tabla precalculada. El resultado es el conjunto
+    completo de coincidencias (incluso las solapadas), sobre el que se aplican las mismas
+    prioridades que las funciones detectar_* anteriores y la detección de cursos de rampa.
+    `python -m benchmarks.reglas` comprueba que el resultado es idéntico.
+    """
+    def __init__(self, bases, cursos, rampa, ot, sap, max_claves_directa=MAX_CLAVES_BUSQUEDA_DIRECTA):
+        self.bases = list(bases)
+        self.cursos = dict(cursos)
+        self.rampa = list(rampa)
+        self.ot = set(ot)
+        # Las claves SAP no cambian el resultado (el cargo por defecto ya es SAP),
+        # pero se buscan igual para que queden en el conjunto de coincidencias
+        claves = set(self.bases) | set(self.cursos) | set(self.rampa) | self.ot | set(sap)
+        self.directa = len(claves) <= max_claves_directa
+        self._patron = re.compile("(?=(" + regex_trie(claves) + "))")
+        self._prefijos = {c: [k for k in claves if c.startswith(k)] for c in claves}
+        self._orden_bases = {b: i for i, b in enumerate(self.bases)}
+        self._orden_cursos = {c: i for i, c in enumerate(self.cursos)}
+
+    def coincidencias(self, texto):
+        """Lista de (posición, clave) en orden de aparición, incluidas las solapadas."""
+        encontradas = []
+        for m in self._patron.finditer(texto):
+            inicio = m.start()
+            for clave in self._prefijos[m.group(1)]:
+                encontradas.append((inicio, clave))
+        return encontradas
+
+    def clasificar(self, texto):
+        """
+        Devuelve (base, curso_rampa, curso, tipo) con la semántica de las funciones detectar_*:
+        base es la primera de base_abrev presente o "XXX"; curso_rampa el primero de
+        cursos_rampa presente o None; curso el valor de cursos_validos para la primera
+        línea con alguna clave (y dentro de ella, la primera clave del diccionario) o
+        "CURSO"; tipo "OT" si aparece alguna clave OT y si no "SAP".
+        """
+        if self.directa:
+            return self._clasificar_directa(texto)
+        encontradas = self.coincidencias(texto)
+        claves = {clave for _, clave in encontradas}
+
+        base = min(
+            (b for b in claves if b in self._orden_bases),
+            key=self._orden_bases.get,
+            default="XXX"
+        )
+        curso_rampa = next((c for c in self.rampa if c in claves), None)
+        tipo = "OT" if claves & self.ot else "SAP"
+
+        curso = "CURSO"
+        primera = next((pos for pos, clave in encontradas if clave in self._orden_cursos), None)
+        if primera is not None:
+            fin = FIN_DE_LINEA.search(texto, primera)
+            fin = fin.start() if fin else len(texto)
+            en_linea = [clave for pos, clave in encontradas if primera <= pos < fin and clave in self._orden_cursos]
+            curso = self.cursos[min(en_linea, key=self._orden_cursos.get)]
+        return base, curso_rampa, curso, tipo
+
+    def _clasificar_directa(self, texto):
+        """clasificar() buscando cada clave por separado, en el orden de prioridad de las tablas."""
+        base = next((b for b in self.bases if b in texto), "XXX")
+        curso_rampa = next((c for c in self.rampa if c in texto), None)
+        tipo = "OT" if any(c in texto for c in self.ot) else "SAP"
+        curso = "CURSO"
+        for linea in texto.splitlines():
+            clave = next((c for c in self.cursos if c in linea), None)
+            if clave is not None:
+                curso = self.cursos[clave]
+                break
+        return base, curso_rampa, curso, tipo
+
+MOTOR_REGLAS = MotorReglas(base_abrev, cursos_validos, cursos_rampa, claves_ot, claves_sap)
@@ -0,0 +1,116 @@
+import cProfile
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Si se define, la primera ejecución (un lote en la web o una corrida del CLI) guarda
+# un perfil de cProfile en esta ruta; solo se perfila el hilo que coordina el lote
+RUTA_PERFIL = os.getenv("CERTIKEEPER_PERFIL", "")
+
+# Una línea JSON por lote en stderr, para los logs del servidor
+logger = logging.getLogger("certikeeper.rendimiento")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+class Rendimiento:
+    """
+    Mediciones por etapa de un lote: llamadas, tiempo de reloj, tiempo de CPU (del hilo que
+    la ejecuta), páginas y bytes. Las etapas se acumulan, así que una etapa que corre por
+    página suma el total del lote; con varios procesos, los tiempos son la suma de todos.
+    Las mediciones de un proceso hijo viajan como dict (etapas) y se juntan con combinar().
+    """
+    def __init__(self):
+        self.etapas = {}  # nombre -> [llamadas, segundos, cpu, paginas, bytes]
+        self.inicio = time.perf_counter()
+        self.fin = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def etapa(self, nombre, paginas=0, tamano=0):
+        inicio, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, 1, time.perf_counter() - inicio, time.thread_time() - cpu, paginas, tamano)
+
+    def sumar(self, nombre, llamadas, segundos, cpu, paginas=0, tamano=0):
+        with self._lock:
+            medicion = self.etapas.setdefault(nombre, [0, 0.0, 0.0, 0, 0])
+            medicion[0] += llamadas
+            medicion[1] += segundos
+            medicion[2] += cpu
+            medicion[3] += paginas
+            medicion[4] += tamano
+
+    def contar(self, nombre, paginas=0, tamano=0):
+        """Suma páginas o bytes a una etapa sin medir tiempo."""
+        self.sumar(nombre, 0, 0.0, 0.0, paginas, tamano)
+
+    def combinar(self, etapas):
+        for nombre, medicion in etapas.items():
+            self.sumar(nombre, *medicion)
+
+    def cerrar(self):
+        self.fin = time.perf_counter()
+
+    @property
+    def total(self):
+        return (self.fin or time.perf_counter()) - self.inicio
+
+    def filas(self):
+        """Una fila por etapa, en el orden en que se midieron, para mostrar como tabla."""
+        with self._lock:
+            etapas = list(self.etapas.items())
+        return [
+            {
+                "Etapa": nombre,
+                "Llamadas": llamadas,
+                "Tiempo (s)": round(segundos, 3),
+                "CPU (s)": round(cpu, 3),
+                "Páginas": paginas,
+                "MB": round(tamano / 1024 / 1024, 2),
+                "Páginas/s": round(paginas / segundos, 1) if paginas and segundos else None
+            }
+            for nombre, (llamadas, segundos, cpu, paginas, tamano) in etapas
+        ]
+
+    def registrar(self, **datos):
+        """Emite las mediciones como una línea JSON, junto con los datos del lote (id, páginas...)."""
+        with self._lock:
+            etapas = {
+                nombre: dict(llamadas=m[0], segundos=round(m[1], 4), cpu=round(m[2], 4), paginas=m[3], bytes=m[4])
+                for nombre, m in self.etapas.items()
+            }
+        logger.info(json.dumps(
+            dict(evento="rendimiento", **datos, total_segundos=round(self.total, 4), etapas=etapas),
+            ensure_ascii=False, default=str
+        ))
+
+_perfil_lock = threading.Lock()
+_perfil_usado = False
+
+@contextmanager
+def perfil_opcional():
+    """Con CERTIKEEPER_PERFIL definido, perfila el bloque con cProfile (solo la primera vez)."""
+    global _perfil_usado
+    with _perfil_lock:
+        activar = bool(RUTA_PERFIL) and not _perfil_usado
+        _perfil_usado = _perfil_usado or activar
+    if not activar:
+        yield
+        return
+    perfil = cProfile.Profile()
+    perfil.enable()
+    try:
+        yield
+    finally:
+        perfil.disable()
+        perfil.dump_stats(RUTA_PERFIL)
+        print(f"📈 Perfil guardado en {RUTA_PERFIL}")
@@ -0,0 +1,73 @@
+import importlib.util
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+
+# Parquet necesita pyarrow (o fastparquet); sin ninguno, la exportación no se ofrece
+PARQUET_DISPONIBLE = any(importlib.util.find_spec(m) is not None for m in ("pyarrow", "fastparquet"))
+
+# extensión -> (etiqueta, tipo MIME) de cada formato de reporte
+FORMATOS_REPORTE = {
+    "xlsx": ("Excel", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": ("CSV", "text/csv"),
+    "parquet": ("Parquet", "application/vnd.apache.parquet")
+}
+
+def _como_dataframe(registros):
+    return registros if isinstance(registros, pd.DataFrame) else pd.DataFrame(registros)
+
+def _escribir_hoja(libro, nombre, df):
+    """Escribe el DataFrame fila a fila en una hoja de un libro en modo write-only."""
+    hoja = libro.create_sheet(nombre)
+    encabezado = []
+    for columna in df.columns:
+        celda = WriteOnlyCell(hoja, value=str(columna))
+        celda.font = Font(bold=True)
+        encabezado.append(celda)
+    hoja.append(encabezado)
+    if df.isna().any().any():
+        # openpyxl no sabe escribir NaN: las celdas vacías quedan vacías
+        df = df.astype(object).where(df.notna(), None)
+    for fila in df.itertuples(index=False, name=None):
+        hoja.append(fila)
+
+def escribir_reporte_excel(registros, destino, resumen=None):
+    """
+    Escribe el reporte Excel (hoja "Reporte" y, si se indica, "Resumen por base") en
+    `destino` (ruta o archivo abierto). El libro es write-only: las filas se van volcando al
+    archivo en vez de armar todas las celdas en memoria.
+    """
+    libro = Workbook(write_only=True)
+    _escribir_hoja(libro, "Reporte", _como_dataframe(registros))
+    if resumen is not None:
+        _escribir_hoja(libro, "Resumen por base", _como_dataframe(resumen))
+    libro.save(destino)
+
+def crear_reporte_excel(registros, resumen=None):
+    """Genera el reporte Excel a partir de un DataFrame o una lista de registros y lo devuelve en un BytesIO."""
+    excel_buffer = BytesIO()
+    escribir_reporte_excel(registros, excel_buffer, resumen)
+    excel_buffer.seek(0)
+    return excel_buffer
+
+def crear_reporte_csv(registros):
+    """CSV en UTF-8 con BOM, para que Excel respete las tildes al abrirlo."""
+    return _como_dataframe(registros).to_csv(index=False).encode("utf-8-sig")
+
+def crear_reporte_parquet(registros):
+    buffer = BytesIO()
+    _como_dataframe(registros).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+def crear_reporte(formato, registros, resumen=None):
+    """Bytes del reporte en el formato indicado (una clave de FORMATOS_REPORTE)."""
+    if formato == "xlsx":
+        return crear_reporte_excel(registros, resumen).getvalue()
+    if formato == "csv":
+        return crear_reporte_csv(registros)
+    if formato == "parquet":
+        return crear_reporte_parquet(registros)
+    raise ValueError(f"Formato de reporte desconocido: {formato}")
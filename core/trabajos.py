@@ -0,0 +1,273 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core.archivos import extraer_pdfs_de_archivo, volcar_fuentes_a_disco
+from core.empaquetado import COMPARTIR_RECURSOS, PERFIL_PDF, escribir_zip_temporal
+from core.procesamiento import armar_registros, clasificar_fuentes, workers_por_defecto
+from core.rendimiento import Rendimiento, perfil_opcional
+from core.reporte import escribir_reporte_excel
+
+# Lotes que se procesan a la vez en todo el servidor; el resto espera en cola
+MAX_TRABAJOS_SIMULTANEOS = int(os.getenv("CERTIKEEPER_TRABAJOS_SIMULTANEOS", 2))
+# Los trabajos terminados y sus archivos se borran pasado este tiempo
+HORAS_CADUCIDAD_TRABAJOS = float(os.getenv("CERTIKEEPER_TRABAJOS_HORAS", 24))
+# Los procesos del pool no se crean con fork: el pool se crea desde un hilo de un servidor
+# con muchos hilos, y un fork ahí hereda locks tomados (logging, SQLite, el pool de la base)
+METODO_PROCESOS = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+EN_COLA = "En cola"
+PROCESANDO = "Procesando"
+TERMINADO = "Terminado"
+FALLIDO = "Error"
+
+class Trabajo:
+    """
+    Estado de un lote procesado en segundo plano. Vive en el GestorTrabajos, fuera de la
+    sesión, así que sobrevive a las recargas del script y a las desconexiones; la interfaz
+    solo lee estos campos para mostrar el avance.
+    """
+    def __init__(self, archivos, workers, comprimir, perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+        self.id = uuid.uuid4().hex[:12]
+        # (clave, nombre, contenido) de cada archivo subido: bytes, ruta o ArchivoTemporal
+        self.archivos = archivos
+        self.claves = [clave for clave, _, _ in archivos]
+        self.nombres = [nombre for _, nombre, _ in archivos]
+        self.workers = workers
+        self.comprimir = comprimir
+        self.perfil = perfil
+        self.compartir_recursos = compartir_recursos
+        self.estado = EN_COLA
+        self.creado = time.time()
+        self.terminado = None
+        self.fraccion = 0.0
+        self.paginas_hechas = 0
+        self.pagina_actual = ""
+        self.avisos = []
+        self.error = None
+        # Resultado: páginas clasificadas de cada archivo, log por página y archivos generados
+        self.paginas_por_archivo = {}
+        self.enviados = (set(), set())
+        self.log = None
+        self.exitosos = 0
+        self.errores = 0
+        self.directorio = None
+        self.ruta_zip = None
+        self.ruta_excel = None
+        self.rendimiento = Rendimiento()
+        # El ZIP y el Excel del trabajo se escriben solo si se descargan
+        self.renombrados = []
+        self.resumen = None
+        self._lock_archivos = threading.Lock()
+
+    @property
+    def activo(self):
+        return self.estado in (EN_COLA, PROCESANDO)
+
+    def entregar(self):
+        """
+        Devuelve {clave: paginas}. El trabajo las conserva hasta caducar, para entregarlas a
+        otra sesión (o a la misma tras una recarga) que suba los mismos archivos: sus PDF de
+        origen ya están en disco, así que solo ocupan los resultados de cada página.
+        """
+        return dict(self.paginas_por_archivo)
+
+    def leer_zip(self):
+        """
+        Bytes del ZIP del trabajo; se escribe en su directorio la primera vez que se pide. Se
+        leen enteros porque download_button solo acepta bytes: solo ocupan memoria durante
+        la descarga.
+        """
+        with self._lock_archivos:
+            if self.ruta_zip is None:
+                self.ruta_zip = escribir_zip_temporal(
+                    self.renombrados, self.comprimir, self.directorio,
+                    perfil=self.perfil, compartir_recursos=self.compartir_recursos
+                )
+        with open(self.ruta_zip, "rb") as archivo:
+            return archivo.read()
+
+    def leer_excel(self):
+        """Bytes del reporte Excel del trabajo; se escribe la primera vez que se pide (ver leer_zip)."""
+        with self._lock_archivos:
+            if self.ruta_excel is None:
+                ruta = os.path.join(self.directorio, "reporte.xlsx")
+                escribir_reporte_excel(self.log, ruta, self.resumen)
+                self.ruta_excel = ruta
+        with open(self.ruta_excel, "rb") as archivo:
+            return archivo.read()
+
+class GestorTrabajos:
+    """
+    Cola de trabajos compartida por todas las sesiones del servidor.
+
+    Los lotes corren en hilos (como mucho max_trabajos a la vez) y todos reparten sus
+    páginas en un único ProcessPoolExecutor de `workers` procesos, así varios usuarios no
+    lanzan cada uno su propio pool. al_clasificar(renombrados_info), si se indica, se llama
+    con los certificados de cada lote y devuelve el par (claves, hashes) ya enviados antes;
+    al_medir(trabajo), al terminar cada lote, para guardar sus mediciones.
+
+    Los trabajos se indexan también por la clave de cada archivo subido (buscar): un archivo
+    que ya está en un trabajo en curso o terminado no se vuelve a procesar ni a comparar con
+    el historial (donde ese mismo trabajo ya lo registró) tras una recarga de la página.
+    """
+    def __init__(self, workers=None, max_trabajos=MAX_TRABAJOS_SIMULTANEOS,
+                 horas_caducidad=HORAS_CADUCIDAD_TRABAJOS, al_clasificar=None, al_medir=None):
+        self.workers = max(1, workers or workers_por_defecto())
+        self.caducidad = horas_caducidad * 3600
+        self.al_clasificar = al_clasificar
+        self.al_medir = al_medir
+        self._hilos = ThreadPoolExecutor(max_workers=max(1, max_trabajos), thread_name_prefix="trabajo")
+        self._procesos = None
+        self._trabajos = {}
+        self._por_clave = {}
+        self._lock = threading.Lock()
+
+    def enviar(self, archivos, workers=1, comprimir=False, perfil=PERFIL_PDF, compartir_recursos=COMPARTIR_RECURSOS):
+        """Encola un lote de archivos subidos [(clave, nombre, contenido)] y devuelve su Trabajo."""
+        self.purgar()
+        trabajo = Trabajo(
+            list(archivos), max(1, min(workers, self.workers)), comprimir, perfil, compartir_recursos
+        )
+        with self._lock:
+            self._trabajos[trabajo.id] = trabajo
+            for clave in trabajo.claves:
+                self._por_clave[clave] = trabajo.id
+        self._hilos.submit(self._ejecutar, trabajo)
+        return trabajo
+
+    def obtener(self, id_trabajo):
+        # Se purga aquí también: las sesiones abiertas consultan sus trabajos en cada recarga,
+        # aunque nadie envíe lotes nuevos
+        self.purgar()
+        with self._lock:
+            return self._trabajos.get(id_trabajo)
+
+    def buscar(self, clave):
+        """Trabajo en curso o terminado que contiene el archivo subido con esa clave, o None."""
+        with self._lock:
+            trabajo = self._trabajos.get(self._por_clave.get(clave))
+        if trabajo is None or trabajo.estado == FALLIDO:
+            return None
+        return trabajo
+
+    def purgar(self):
+        """Olvida los trabajos caducados y borra sus archivos."""
+        limite = time.time() - self.caducidad
+        with self._lock:
+            caducados = [t for t in self._trabajos.values() if t.terminado and t.terminado < limite]
+            for trabajo in caducados:
+                del self._trabajos[trabajo.id]
+                for clave in trabajo.claves:
+                    if self._por_clave.get(clave) == trabajo.id:
+                        del self._por_clave[clave]
+        for trabajo in caducados:
+            if trabajo.directorio:
+                shutil.rmtree(trabajo.directorio, ignore_errors=True)
+
+    def _pool_procesos(self):
+        with self._lock:
+            if self._procesos is None:
+                self._procesos = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context(METODO_PROCESOS)
+                )
+            return self._procesos
+
+    def _reiniciar_pool(self):
+        # Un proceso hijo murió (p. ej. por memoria): el pool queda inservible y se crea otro
+        with self._lock:
+            if self._procesos is not None:
+                self._procesos.shutdown(wait=False, cancel_futures=True)
+                self._procesos = None
+
+    def _ejecutar(self, trabajo):
+        trabajo.estado = PROCESANDO
+        try:
+            with perfil_opcional():
+                self._procesar(trabajo)
+            trabajo.estado = TERMINADO
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._reiniciar_pool()
+            trabajo.error = str(e)
+            trabajo.estado = FALLIDO
+        finally:
+            # Los archivos subidos ya no hacen falta: que se liberen (o se borren del disco)
+            trabajo.archivos = []
+            trabajo.terminado = time.time()
+            self._medir(trabajo)
+
+    def _medir(self, trabajo):
+        medicion = trabajo.rendimiento
+        medicion.cerrar()
+        medicion.registrar(
+            lote=trabajo.id, estado=trabajo.estado, archivos=len(trabajo.nombres),
+            paginas=len(trabajo.log) if trabajo.log is not None else 0, workers=trabajo.workers
+        )
+        if self.al_medir is not None:
+            try:
+                self.al_medir(trabajo)
+            except Exception as e:
+                print("⚠️ No se pudieron guardar las mediciones del lote:", e)
+
+    def _procesar(self, trabajo):
+        medicion = trabajo.rendimiento
+        fuentes_por_archivo = []
+        for clave, nombre, contenido in trabajo.archivos:
+            tamano = len(contenido) if isinstance(contenido, (bytes, bytearray)) else os.path.getsize(contenido)
+            with medicion.etapa("Lectura de archivos", tamano=tamano):
+                fuentes, error = extraer_pdfs_de_archivo(nombre, contenido)
+            if error is not None:
+                trabajo.avisos.append(f"Error al leer ZIP: {nombre}")
+            fuentes_por_archivo.append((clave, fuentes))
+
+        def al_avanzar(fraccion, paginas_hechas, nombre_pagina):
+            trabajo.fraccion = fraccion
+            trabajo.paginas_hechas = paginas_hechas
+            trabajo.pagina_actual = nombre_pagina
+
+        fuentes = [fuente for _, fuentes_archivo in fuentes_por_archivo for fuente in fuentes_archivo]
+        pool = self._pool_procesos() if trabajo.workers > 1 else None
+        with medicion.etapa("Clasificación (total)"):
+            paginas_por_fuente, fuentes_con_error = clasificar_fuentes(
+                fuentes, trabajo.workers, al_avanzar, pool, medicion
+            )
+        trabajo.avisos.extend(f"Error al procesar: {nombre_base}" for nombre_base in fuentes_con_error)
+
+        paginas_por_archivo = {}
+        siguiente = 0
+        for clave, fuentes_archivo in fuentes_por_archivo:
+            paginas = []
+            for paginas_fuente in paginas_por_fuente[siguiente:siguiente + len(fuentes_archivo)]:
+                paginas.extend(paginas_fuente)
+            siguiente += len(fuentes_archivo)
+            paginas_por_archivo[clave] = paginas
+        todas = [pagina for paginas in paginas_por_archivo.values() for pagina in paginas]
+
+        if self.al_clasificar is not None and todas:
+            try:
+                with medicion.etapa("Historial: consulta", paginas=len(todas)):
+                    trabajo.enviados = self.al_clasificar(armar_registros(todas).renombrados)
+            except Exception:
+                trabajo.avisos.append("No se pudo consultar el historial: no se marcarán los certificados ya enviados")
+
+        # Archivos del lote con los nombres detectados, descargables hasta que caduque; el ZIP
+        # y el Excel no se escriben aquí (la sesión arma los suyos con las ediciones), solo al
+        # descargarlos desde el panel de trabajos
+        with medicion.etapa("Registros", paginas=len(todas)):
+            tabla = armar_registros(todas, trabajo.enviados)
+        trabajo.directorio = tempfile.mkdtemp(prefix="certikeeper_trabajo_")
+        trabajo.renombrados, trabajo.resumen = tabla.renombrados, tabla.resumen
+        trabajo.log, trabajo.exitosos, trabajo.errores = tabla.log, tabla.exitosos, tabla.errores
+        # El trabajo (y con él cada FuentePDF, para el ZIP) vive hasta caducar: los PDF subidos
+        # que estaban en memoria pasan a disco para no retener sus bytes todo ese tiempo
+        with medicion.etapa("Volcar a disco"):
+            volcar_fuentes_a_disco(fuentes)
+        trabajo.paginas_por_archivo = paginas_por_archivo
+        trabajo.fraccion = 1.0
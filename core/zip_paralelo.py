@@ -0,0 +1,159 @@
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZIP_DEFLATED, ZIP_STORED
+
+# Hilos que comprimen entradas a la vez (zlib suelta el GIL mientras comprime)
+HILOS_ZIP = max(1, int(os.getenv("CERTIKEEPER_HILOS_ZIP", os.cpu_count() or 1)))
+NIVEL_COMPRESION = 6  # el mismo por defecto que zipfile
+
+# Filtros de flujo que ya dejan los datos comprimidos: volver a pasarlos por deflate casi no reduce nada
+FILTROS_COMPRIMIDOS = (b"/FlateDecode", b"/DCTDecode", b"/JPXDecode", b"/JBIG2Decode", b"/CCITTFaxDecode", b"/LZWDecode")
+# Una entrada se comprime solo si gana al menos un 10%; en las grandes cuyos flujos ya están
+# comprimidos se decide antes con una muestra, sin pasar por deflate el archivo entero
+UMBRAL_COMPRESION = 0.9
+MUESTRA_COMPRESION = 64 * 1024
+
+_MAX_32 = 0xFFFFFFFF
+_MAX_16 = 0xFFFF
+
+def conviene_comprimir(pdf_bytes):
+    """
+    Regla por entrada: un PDF con algún flujo sin comprimir se intenta comprimir siempre; uno
+    grande con todos sus flujos ya comprimidos (deflate, JPEG...), solo si una muestra rinde.
+    """
+    if len(pdf_bytes) <= MUESTRA_COMPRESION:
+        # Comprimir la muestra costaría lo mismo que comprimirlo entero
+        return True
+    flujos = pdf_bytes.count(b"endstream")
+    # Todos los filtros terminan en "Decode": si no hay ni uno por flujo, no hace falta contarlos
+    if flujos == 0 or pdf_bytes.count(b"Decode") < flujos:
+        return True
+    comprimidos = sum(pdf_bytes.count(filtro) for filtro in FILTROS_COMPRIMIDOS)
+    if comprimidos < flujos:
+        return True
+    muestra = pdf_bytes[:MUESTRA_COMPRESION]
+    return len(zlib.compress(muestra, 1)) < len(muestra) * UMBRAL_COMPRESION
+
+def comprimir_entrada(datos, nivel=NIVEL_COMPRESION, rendimiento=None):
+    """(datos a escribir, método, crc) de una entrada; se guarda sin comprimir si no compensa."""
+    inicio, cpu = time.perf_counter(), time.thread_time()
+    crc = zlib.crc32(datos)
+    metodo = ZIP_STORED
+    if conviene_comprimir(datos):
+        compresor = zlib.compressobj(nivel, zlib.DEFLATED, -15)
+        comprimidos = compresor.compress(datos) + compresor.flush()
+        if len(comprimidos) < len(datos) * UMBRAL_COMPRESION:
+            datos, metodo = comprimidos, ZIP_DEFLATED
+    if rendimiento is not None:
+        rendimiento.sumar("ZIP: compresión", 1, time.perf_counter() - inicio, time.thread_time() - cpu, 1, len(datos))
+    return datos, metodo, crc
+
+def _fecha_dos(momento):
+    anio, mes, dia, hora, minuto, segundo = momento[:6]
+    return (hora << 11) | (minuto << 5) | (segundo // 2), ((max(anio, 1980) - 1980) << 9) | (mes << 5) | dia
+
+class EscritorZip:
+    """
+    Escritor de ZIP para entradas ya comprimidas (o guardadas) fuera de él: zipfile solo
+    sabe comprimir al escribir, en el mismo hilo. Como el CRC y los tamaños se conocen antes
+    de escribir cada entrada, el destino no necesita poder posicionarse (sirve un archivo
+    abierto, una ruta o un BytesIO). Los nombres van en UTF-8 y se usa ZIP64 cuando hay más
+    de 65535 entradas o el archivo pasa de 4 GB.
+    """
+    def __init__(self, destino):
+        self._propio = isinstance(destino, (str, os.PathLike))
+        self._fp = open(destino, "wb") if self._propio else destino
+        self._posicion = 0
+        self._central = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.cerrar()
+
+    def _escribir(self, datos):
+        self._fp.write(datos)
+        self._posicion += len(datos)
+
+    def agregar(self, nombre, datos, metodo, crc, tamano):
+        """Agrega una entrada: `datos` ya comprimidos con deflate crudo (ZIP_DEFLATED) o tal cual (ZIP_STORED)."""
+        if tamano > _MAX_32 or len(datos) > _MAX_32:
+            raise ValueError(f"Entrada de más de 4 GB: {nombre}")
+        nombre_bytes = nombre.encode("utf-8")
+        banderas = 0 if nombre.isascii() else 0x800
+        hora, fecha = _fecha_dos(time.localtime())
+        desplazamiento = self._posicion
+        self._escribir(struct.pack(
+            "<I5H3I2H", 0x04034B50, 20, banderas, metodo, hora, fecha, crc, len(datos), tamano, len(nombre_bytes), 0
+        ))
+        self._escribir(nombre_bytes)
+        self._escribir(datos)
+        self._central.append((nombre_bytes, banderas, metodo, hora, fecha, crc, len(datos), tamano, desplazamiento))
+
+    def cerrar(self):
+        if self._fp is None:
+            return
+        inicio_central = self._posicion
+        for nombre_bytes, banderas, metodo, hora, fecha, crc, comprimido, tamano, desplazamiento in self._central:
+            extra, version = b"", 20
+            if desplazamiento > _MAX_32:
+                extra, version, desplazamiento = struct.pack("<HHQ", 0x0001, 8, desplazamiento), 45, _MAX_32
+            self._escribir(struct.pack(
+                "<I6H3I5H2I", 0x02014B50, (3 << 8) | version, version, banderas, metodo, hora, fecha, crc,
+                comprimido, tamano, len(nombre_bytes), len(extra), 0, 0, 0, 0o644 << 16, desplazamiento
+            ))
+            self._escribir(nombre_bytes)
+            self._escribir(extra)
+        tamano_central = self._posicion - inicio_central
+        entradas = len(self._central)
+        if entradas > _MAX_16 or inicio_central > _MAX_32 or tamano_central > _MAX_32:
+            inicio_zip64 = self._posicion
+            self._escribir(struct.pack(
+                "<IQ2H2I4Q", 0x06064B50, 44, 45, 45, 0, 0, entradas, entradas, tamano_central, inicio_central
+            ))
+            self._escribir(struct.pack("<2IQI", 0x07064B50, 0, inicio_zip64, 1))
+        self._escribir(struct.pack(
+            "<I4H2IH", 0x06054B50, 0, 0, min(entradas, _MAX_16), min(entradas, _MAX_16),
+            min(tamano_central, _MAX_32), min(inicio_central, _MAX_32), 0
+        ))
+        if self._propio:
+            self._fp.close()
+        self._fp = None
+
+def escribir_zip_paralelo(entradas, destino, hilos=HILOS_ZIP, nivel=NIVEL_COMPRESION, rendimiento=None):
+    """
+    Escribe en `destino` las entradas [(nombre, bytes)], comprimiendo en `hilos` hilos a la
+    vez y escribiendo en el mismo orden en que llegan. Solo hay unas pocas entradas en vuelo
+    a la vez, así que la memoria no crece con el lote. Con un hilo se comprime sin pool.
+    """
+    en_vuelo = deque()
+    pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="zip") if hilos > 1 else None
+    try:
+        with EscritorZip(destino) as zipf:
+            def escribir(nombre, tamano, comprimida):
+                datos, metodo, crc = comprimida
+                if rendimiento is not None:
+                    with rendimiento.etapa("ZIP: escritura", paginas=1, tamano=len(datos)):
+                        zipf.agregar(nombre, datos, metodo, crc, tamano)
+                else:
+                    zipf.agregar(nombre, datos, metodo, crc, tamano)
+
+            for nombre, datos in entradas:
+                if pool is None:
+                    escribir(nombre, len(datos), comprimir_entrada(datos, nivel, rendimiento))
+                    continue
+                en_vuelo.append((nombre, len(datos), pool.submit(comprimir_entrada, datos, nivel, rendimiento)))
+                if len(en_vuelo) >= hilos * 4:
+                    nombre, tamano, futuro = en_vuelo.popleft()
+                    escribir(nombre, tamano, futuro.result())
+            while en_vuelo:
+                nombre, tamano, futuro = en_vuelo.popleft()
+                escribir(nombre, tamano, futuro.result())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
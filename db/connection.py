@@ -1,24 +1,125 @@
 # db/connection.py
 import os
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import PoolError, ThreadedConnectionPool
+
+# Una conexión que lleva más de esto sin usarse se verifica con SELECT 1 antes de prestarla
+SEGUNDOS_VERIFICACION = 30
+# Segundos que conexion() espera a que se libere una conexión cuando todas están prestadas
+# (ThreadedConnectionPool lanza PoolError en vez de esperar)
+ESPERA_POOL = float(os.getenv("DB_POOL_ESPERA", 30))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Un cupo por conexión del pool: quien no consigue uno espera hasta ESPERA_POOL
+_cupos = None
+_ultimo_uso = {}
+
+def _parametros_conexion():
+    return dict(
+        host=os.getenv("DB_HOST"),        # Ej: 'ep-wispy-sky-123456.us-east-1.aws.neon.tech'
+        dbname=os.getenv("DB_NAME"),      # Nombre de la base de datos
+        user=os.getenv("DB_USER"),        # Usuario
+        password=os.getenv("DB_PASSWORD"),# Contraseña
+        port=os.getenv("DB_PORT", 5432),  # Puerto (por defecto 5432)
+        sslmode=os.getenv("DB_SSLMODE", "require"),  # Neon y otros requieren SSL; 'disable' para un Postgres local
+        cursor_factory=RealDictCursor     # Para que los SELECT devuelvan diccionarios
+    )
 
 def get_connection():
     """
     Devuelve una conexión a la base de datos PostgreSQL.
     Compatible con Neon / Heroku / cualquier PostgreSQL remoto.
+    Es una conexión nueva y propia; para uso repetido preferir conexion(), que usa el pool.
     """
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),        # Ej: 'ep-wispy-sky-123456.us-east-1.aws.neon.tech'
-            dbname=os.getenv("DB_NAME"),      # Nombre de la base de datos
-            user=os.getenv("DB_USER"),        # Usuario
-            password=os.getenv("DB_PASSWORD"),# Contraseña
-            port=os.getenv("DB_PORT", 5432),  # Puerto (por defecto 5432)
-            sslmode='require',                # IMPORTANTE: Neon y otros requieren SSL
-            cursor_factory=RealDictCursor     # Para que los SELECT devuelvan diccionarios
-        )
+        conn = psycopg2.connect(**_parametros_conexion())
         return conn
     except Exception as e:
         print("❌ Error al conectar a la base de datos:", e)
         raise e
+
+def get_pool():
+    """
+    Pool de conexiones compartido por todos los hilos del proceso, creado en el primer uso.
+    Tamaño configurable con DB_POOL_MIN y DB_POOL_MAX. Lo usan a la vez el escritor de
+    historial, los hilos de los trabajos y la pestaña de historial de cada sesión; si todas
+    las conexiones están prestadas, conexion() espera a que se libere una.
+    """
+    global _pool, _cupos
+    with _pool_lock:
+        if _pool is None or _pool.closed:
+            try:
+                _pool = ThreadedConnectionPool(
+                    int(os.getenv("DB_POOL_MIN", 1)),
+                    int(os.getenv("DB_POOL_MAX", 5)),
+                    **_parametros_conexion()
+                )
+                _cupos = threading.BoundedSemaphore(_pool.maxconn)
+            except Exception as e:
+                print("❌ Error al conectar a la base de datos:", e)
+                raise e
+        return _pool
+
+def cerrar_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and not _pool.closed:
+            _pool.closeall()
+        _pool = None
+        _ultimo_uso.clear()
+
+def _conexion_sana(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _ultimo_uso.get(id(conn), 0) < SEGUNDOS_VERIFICACION:
+        return True
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+@contextmanager
+def conexion():
+    """
+    Presta una conexión del pool, verificando antes que siga viva, y la devuelve al salir.
+    Si todas están prestadas espera hasta ESPERA_POOL segundos y luego lanza PoolError.
+    Hace commit si el bloque termina bien y rollback si lanza una excepción.
+    """
+    pool = get_pool()
+    cupos = _cupos
+    if not cupos.acquire(timeout=ESPERA_POOL):
+        raise PoolError(
+            f"No se liberó ninguna conexión del pool en {ESPERA_POOL:g} s (DB_POOL_MAX={pool.maxconn})"
+        )
+    try:
+        conn = pool.getconn()
+        # Conexiones cortadas por el servidor (p. ej. Neon suspendido): descartar y pedir otra
+        intentos = 0
+        while not _conexion_sana(conn) and intentos < pool.maxconn:
+            _ultimo_uso.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+            intentos += 1
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            _ultimo_uso[id(conn)] = time.monotonic()
+            if conn.closed:
+                _ultimo_uso.pop(id(conn), None)
+            pool.putconn(conn, close=bool(conn.closed))
+    finally:
+        cupos.release()
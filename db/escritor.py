@@ -0,0 +1,241 @@
+import atexit
+import glob
+import itertools
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from db.models import create_tables
+from db.queries import actualizar_nombres, buscar_certificados_enviados, registrar_envios
+
+# Envíos que no se pudieron guardar quedan en archivos junto a esta ruta hasta que la base
+# vuelva a responder. Como la caché de texto, por defecto está en la carpeta del proyecto y
+# una ruta relativa se resuelve al importar: la web y la bandeja usan la misma aunque se
+# lancen desde otro directorio
+RUTA_PENDIENTES = os.path.abspath(os.getenv(
+    "CERTIKEEPER_PENDIENTES",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "historial_pendiente.jsonl")
+))
+
+# Cada EscritorHistorial escribe solo su propio archivo, marcado con "<pid>-<n>"
+_instancias = itertools.count()
+_marcas_activas = set()
+
+def _proceso_vivo(pid):
+    if os.name == "nt":
+        # En Windows os.kill(pid, 0) terminaría el proceso: los archivos de otro pid no se adoptan
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+def historial_habilitado():
+    """El registro en historial solo se activa si hay una base de datos configurada."""
+    return bool(os.getenv("DB_HOST"))
+
+def registrar_en_historial(escritor, renombrados_info):
+    """
+    Busca en historial los certificados del lote ya enviados antes (una sola consulta) y
+    encola el lote para registrarlo, sin esperar a la base. Devuelve (claves, hashes) enviados.
+    Se registra con los nombres detectados; los que luego se corrigen en el editor se
+    actualizan con EscritorHistorial.encolar_nombres.
+    """
+    try:
+        return buscar_certificados_enviados(
+            [info["Clave"] for info in renombrados_info],
+            [info["Hash página"] for info in renombrados_info]
+        )
+    finally:
+        fecha_envio = datetime.now()
+        escritor.encolar(
+            (info["Nombre final"], info["Base"], info["Curso"], fecha_envio, info["Clave"], info["Hash página"])
+            for info in renombrados_info
+        )
+
+class EscritorHistorial:
+    """
+    Hilo en segundo plano que registra envíos en historial sin que la interfaz espere a la base.
+
+    encolar() solo deja las filas (nombre_archivo, base, curso, fecha_envio, clave_certificado,
+    hash_pagina) en una cola; el hilo las agrupa durante unos segundos y las inserta con
+    registrar_envios en lotes. encolar_nombres() deja correcciones (nombre_archivo,
+    hash_pagina) en la misma cola, así que se aplican después del registro al que corrigen.
+    Si la base no responde, reintenta con espera exponencial y
+    guarda las filas en un archivo JSONL local, que se vuelve a cargar al iniciar para no
+    perder nada entre reinicios.
+
+    La web y la bandeja pueden tener cada una su escritor a la vez, así que cada escritor
+    tiene su archivo (ruta_pendientes con "<pid>-<n>" antes de la extensión) y solo
+    reescribe o borra ese. Al iniciar adopta los de procesos que ya terminaron (y el
+    archivo único de versiones anteriores): los renombra como suyos antes de leerlos, de
+    modo que dos procesos que arrancan a la vez no se quedan con las mismas filas.
+    """
+    def __init__(self, ruta_pendientes=RUTA_PENDIENTES, tamano_lote=500, espera_agrupar=2.0,
+                 reintento_inicial=1.0, reintento_max=300.0):
+        self.ruta_pendientes = ruta_pendientes
+        self._marca = f"{os.getpid()}-{next(_instancias)}"
+        _marcas_activas.add(self._marca)
+        raiz, extension = os.path.splitext(ruta_pendientes)
+        self.ruta_propia = f"{raiz}.{self._marca}{extension}"
+        self.tamano_lote = tamano_lote
+        self.espera_agrupar = espera_agrupar
+        self.reintento_inicial = reintento_inicial
+        self.reintento_max = reintento_max
+        self.ultimo_error = None
+        self.registrados = 0
+        self._cola = queue.Queue()
+        self._lock = threading.Lock()
+        self._pendientes = self._adoptar_pendientes()
+        self._tablas_listas = False
+        self._hilo = threading.Thread(target=self._bucle, name="escritor-historial", daemon=True)
+        self._hilo.start()
+        atexit.register(self._guardar_al_salir)
+
+    def encolar(self, rows):
+        for row in rows:
+            self._cola.put(tuple(row))
+
+    def encolar_nombres(self, rows):
+        """Encola correcciones (nombre_archivo, hash_pagina) del nombre final de certificados ya encolados."""
+        for nombre_archivo, hash_pagina in rows:
+            self._cola.put((nombre_archivo, hash_pagina))
+
+    @property
+    def pendientes(self):
+        with self._lock:
+            return len(self._pendientes) + self._cola.qsize()
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que no quede nada por escribir o venza el timeout. Devuelve True si se vació."""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while self.pendientes:
+            if limite is not None and time.monotonic() >= limite:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # -------------------------
+    # Hilo de escritura
+    # -------------------------
+    def _recibir(self, timeout):
+        """Pasa a pendientes lo que haya en la cola, esperando como mucho `timeout` por la primera fila."""
+        try:
+            fila = self._cola.get(timeout=timeout)
+        except queue.Empty:
+            return
+        with self._lock:
+            self._pendientes.append(fila)
+            while True:
+                try:
+                    self._pendientes.append(self._cola.get_nowait())
+                except queue.Empty:
+                    break
+
+    def _bucle(self):
+        reintento = self.reintento_inicial
+        while True:
+            if not self.pendientes:
+                self._recibir(timeout=None)
+            # Dar unos segundos para que el resto del lote llegue y vaya en el mismo INSERT
+            limite = time.monotonic() + self.espera_agrupar
+            while time.monotonic() < limite and self.pendientes < self.tamano_lote:
+                self._recibir(timeout=max(limite - time.monotonic(), 0.01))
+            try:
+                self._escribir_pendientes()
+                reintento = self.reintento_inicial
+                self.ultimo_error = None
+            except Exception as e:
+                self.ultimo_error = str(e)
+                self._guardar_pendientes()
+                # Esperar antes de reintentar, sin dejar de recibir filas nuevas
+                limite = time.monotonic() + reintento
+                while time.monotonic() < limite:
+                    self._recibir(timeout=max(limite - time.monotonic(), 0.01))
+                reintento = min(reintento * 2, self.reintento_max)
+
+    def _escribir_pendientes(self):
+        if not self._tablas_listas:
+            create_tables()
+            self._tablas_listas = True
+        while True:
+            with self._lock:
+                lote = self._pendientes[:self.tamano_lote]
+            if not lote:
+                break
+            # Un registro y su corrección pueden caer en el mismo lote: primero los registros
+            registrar_envios([fila for fila in lote if len(fila) != 2])
+            actualizar_nombres([fila for fila in lote if len(fila) == 2])
+            with self._lock:
+                del self._pendientes[:len(lote)]
+            self.registrados += len(lote)
+        self._guardar_pendientes()
+
+    # -------------------------
+    # Respaldo local
+    # -------------------------
+    def _huerfanos(self):
+        """Archivos de pendientes sin escritor vivo: de procesos terminados o de versiones anteriores."""
+        raiz, extension = os.path.splitext(self.ruta_pendientes)
+        huerfanos = [self.ruta_pendientes] if os.path.exists(self.ruta_pendientes) else []
+        for ruta in glob.glob(glob.escape(raiz) + ".*" + glob.escape(extension)):
+            marca = ruta[len(raiz) + 1:len(ruta) - len(extension)].split(".")[0]
+            pid = marca.split("-")[0]
+            if not pid.isdigit() or marca in _marcas_activas:
+                continue
+            if int(pid) == os.getpid() or not _proceso_vivo(int(pid)):
+                huerfanos.append(ruta)
+        return huerfanos
+
+    def _adoptar_pendientes(self):
+        raiz, extension = os.path.splitext(self.ruta_pendientes)
+        pendientes = []
+        adoptados = []
+        for i, ruta in enumerate(self._huerfanos()):
+            # Renombrarlo lo hace de este escritor; si otro lo renombró antes, ya no existe
+            propia = f"{raiz}.{self._marca}.{i}{extension}"
+            try:
+                os.rename(ruta, propia)
+            except OSError:
+                continue
+            adoptados.append(propia)
+            with open(propia, encoding="utf-8") as archivo:
+                for linea in archivo:
+                    if linea.strip():
+                        fila = json.loads(linea)
+                        if len(fila) != 2:
+                            fila[3] = datetime.fromisoformat(fila[3])
+                        pendientes.append(tuple(fila))
+        if adoptados:
+            # Las filas adoptadas pasan al archivo propio antes de borrar los renombrados
+            self._pendientes = pendientes
+            self._guardar_pendientes()
+            for ruta in adoptados:
+                os.remove(ruta)
+        return pendientes
+
+    def _guardar_pendientes(self):
+        with self._lock:
+            pendientes = list(self._pendientes)
+        if not pendientes:
+            if os.path.exists(self.ruta_propia):
+                os.remove(self.ruta_propia)
+            return
+        temporal = self.ruta_propia + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as archivo:
+            for fila in pendientes:
+                fila = list(fila)
+                if len(fila) != 2:
+                    fila[3] = fila[3].isoformat()
+                archivo.write(json.dumps(fila, ensure_ascii=False) + "\n")
+        os.replace(temporal, self.ruta_propia)
+
+    def _guardar_al_salir(self):
+        self._recibir(timeout=0.01)
+        self._guardar_pendientes()
@@ -1,9 +1,8 @@
-from db.connection import get_connection
+from db.connection import conexion
 
-def create_tables():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
+# Migraciones del esquema, en orden. Cada una se aplica una sola vez y queda anotada en schema_version.
+MIGRACIONES = [
+    (1, """
         CREATE TABLE IF NOT EXISTS historial (
             id SERIAL PRIMARY KEY,
             nombre_archivo TEXT,
@@ -11,7 +10,50 @@ def create_tables():
             curso TEXT,
             fecha_envio TIMESTAMP
         );
-    """)
-    conn.commit()
-    cursor.close()
-    conn.close()
+    """),
+    # Índices para la paginación por clave (fecha_envio, id) y los filtros por base y curso
+    (2, """
+        CREATE INDEX IF NOT EXISTS historial_fecha_id_idx ON historial (fecha_envio DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS historial_base_fecha_id_idx ON historial (base, fecha_envio DESC, id DESC);
+        CREATE INDEX IF NOT EXISTS historial_curso_fecha_id_idx ON historial (curso, fecha_envio DESC, id DESC);
+    """),
+    # Duplicados entre lotes: clave normalizada alumno/base/curso y huella del contenido de la página
+    (3, """
+        ALTER TABLE historial ADD COLUMN IF NOT EXISTS clave_certificado TEXT;
+        ALTER TABLE historial ADD COLUMN IF NOT EXISTS hash_pagina TEXT;
+        CREATE UNIQUE INDEX IF NOT EXISTS historial_clave_certificado_uq ON historial (clave_certificado);
+        CREATE UNIQUE INDEX IF NOT EXISTS historial_hash_pagina_uq ON historial (hash_pagina);
+    """),
+    # Mediciones por etapa de cada lote, para seguir el rendimiento en el tiempo
+    (4, """
+        CREATE TABLE IF NOT EXISTS rendimiento_lotes (
+            id SERIAL PRIMARY KEY,
+            lote TEXT,
+            fecha TIMESTAMP,
+            paginas INTEGER,
+            bytes BIGINT,
+            segundos REAL,
+            etapas JSONB
+        );
+        CREATE INDEX IF NOT EXISTS rendimiento_lotes_fecha_idx ON rendimiento_lotes (fecha DESC);
+    """),
+]
+
+def create_tables():
+    """Crea las tablas y aplica las migraciones pendientes."""
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            # Evitar que dos procesos migren a la vez
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext('certikeeper_schema'));")
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    aplicada TIMESTAMP DEFAULT now()
+                );
+            """)
+            cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version;")
+            actual = cursor.fetchone()["version"]
+            for version, sql in MIGRACIONES:
+                if version > actual:
+                    cursor.execute(sql)
+                    cursor.execute("INSERT INTO schema_version (version) VALUES (%s);", (version,))
@@ -1,21 +1,121 @@
-from db.connection import get_connection
-
-def registrar_envio(nombre_archivo, base, curso, fecha_envio):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO historial (nombre_archivo, base, curso, fecha_envio)
-        VALUES (%s, %s, %s, %s);
-    """, (nombre_archivo, base, curso, fecha_envio))
-    conn.commit()
-    cursor.close()
-    conn.close()
+from psycopg2.extras import Json, execute_values
+
+from db.connection import conexion
+
+def registrar_envio(nombre_archivo, base, curso, fecha_envio, clave_certificado=None, hash_pagina=None):
+    registrar_envios([(nombre_archivo, base, curso, fecha_envio, clave_certificado, hash_pagina)])
+
+def registrar_envios(rows, tamano_pagina=500):
+    """
+    Inserta muchos envíos en historial en una sola transacción.
+    rows: iterable de (nombre_archivo, base, curso, fecha_envio[, clave_certificado, hash_pagina]).
+    Los certificados cuya clave o huella ya están registradas se omiten. Devuelve cuántas filas se enviaron.
+    """
+    rows = [tuple(row) + (None,) * (6 - len(row)) for row in rows]
+    if not rows:
+        return 0
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            execute_values(cursor, """
+                INSERT INTO historial (nombre_archivo, base, curso, fecha_envio, clave_certificado, hash_pagina)
+                VALUES %s
+                ON CONFLICT DO NOTHING;
+            """, rows, page_size=tamano_pagina)
+    return len(rows)
+
+def actualizar_nombres(rows, tamano_pagina=500):
+    """
+    Corrige el nombre final de certificados ya registrados, en una sola sentencia.
+    rows: iterable de (nombre_archivo, hash_pagina); las huellas que no están en historial se ignoran.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            execute_values(cursor, """
+                UPDATE historial AS h SET nombre_archivo = v.nombre_archivo
+                FROM (VALUES %s) AS v (nombre_archivo, hash_pagina)
+                WHERE h.hash_pagina = v.hash_pagina;
+            """, rows, page_size=tamano_pagina)
+    return len(rows)
+
+def buscar_certificados_enviados(claves, hashes):
+    """
+    Consulta en una sola sentencia cuáles de las claves de certificado y huellas de página
+    de un lote ya están en historial. Devuelve (claves_enviadas, hashes_enviados).
+    """
+    claves, hashes = list(set(claves)), list(set(hashes))
+    if not claves and not hashes:
+        return set(), set()
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                SELECT clave_certificado, hash_pagina
+                FROM historial
+                WHERE clave_certificado = ANY(%s) OR hash_pagina = ANY(%s);
+            """, (claves, hashes))
+            rows = cursor.fetchall()
+    claves_consultadas, hashes_consultados = set(claves), set(hashes)
+    return (
+        {row["clave_certificado"] for row in rows if row["clave_certificado"] in claves_consultadas},
+        {row["hash_pagina"] for row in rows if row["hash_pagina"] in hashes_consultados},
+    )
+
+def registrar_rendimiento(lote, fecha, paginas, bytes_leidos, segundos, etapas):
+    """Guarda las mediciones de un lote; etapas es un dict {etapa: [llamadas, segundos, cpu, paginas, bytes]}."""
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO rendimiento_lotes (lote, fecha, paginas, bytes, segundos, etapas)
+                VALUES (%s, %s, %s, %s, %s, %s);
+            """, (lote, fecha, paginas, bytes_leidos, segundos, Json(etapas)))
 
 def obtener_historial():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM historial ORDER BY fecha_envio DESC;")
-    rows = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT * FROM historial ORDER BY fecha_envio DESC;")
+            rows = cursor.fetchall()
     return rows
+
+def obtener_historial_pagina(limite=50, despues_de=None, base=None, curso=None, desde=None, hasta=None):
+    """
+    Una página del historial, del envío más reciente al más antiguo, paginada por la clave
+    (fecha_envio, id): despues_de es el cursor que devolvió la página anterior.
+    base y curso aceptan un valor o una lista; desde es inclusivo y hasta exclusivo.
+    Devuelve (filas, cursor_siguiente); cursor_siguiente es None en la última página.
+    """
+    condiciones, parametros = ["fecha_envio IS NOT NULL"], []
+    if despues_de is not None:
+        condiciones.append("(fecha_envio, id) < (%s, %s)")
+        parametros.extend(despues_de)
+    if base:
+        condiciones.append("base = ANY(%s)")
+        parametros.append([base] if isinstance(base, str) else list(base))
+    if curso:
+        condiciones.append("curso = ANY(%s)")
+        parametros.append([curso] if isinstance(curso, str) else list(curso))
+    if desde is not None:
+        condiciones.append("fecha_envio >= %s")
+        parametros.append(desde)
+    if hasta is not None:
+        condiciones.append("fecha_envio < %s")
+        parametros.append(hasta)
+    parametros.append(limite + 1)
+
+    with conexion() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(f"""
+                SELECT id, nombre_archivo, base, curso, fecha_envio
+                FROM historial
+                WHERE {" AND ".join(condiciones)}
+                ORDER BY fecha_envio DESC, id DESC
+                LIMIT %s;
+            """, parametros)
+            rows = cursor.fetchall()
+
+    # Se pide una fila de más solo para saber si hay otra página
+    if len(rows) > limite:
+        rows = rows[:limite]
+        return rows, (rows[-1]["fecha_envio"], rows[-1]["id"])
+    return rows, None